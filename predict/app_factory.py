@@ -9,8 +9,11 @@ from flask import Flask
 from predict import db, mgmt, api
 from predict.configurations import config
 from predict.resources.v1.model_ids_api import ModelIDsApi
-from predict.resources.v1.models_api import ModelsApi
-from predict.resources.v1.predict_api import PredictApi
+from predict.resources.v1.models_api import ModelsApi, ModelStatsApi
+from predict.resources.v1.jobs_api import JobsApi
+from predict.resources.v1.bulk_api import BulkModelsApi
+from predict.resources.v1.predict_api import PredictApi, PredictStreamApi, PredictManyApi
+from predict.resources.v1.fast_predict import fast_predict_app
 from docs.views import doc_app
 
 
@@ -49,11 +52,17 @@ def create_app(env='stage'):
     # add api resources
     api.add_resource(ModelIDsApi, '/v1/models', endpoint='model_ids')
     api.add_resource(ModelsApi, '/v1/models/<model_id>', endpoint='models')
+    api.add_resource(ModelStatsApi, '/v1/models/<model_id>/stats', endpoint='model_stats')
+    api.add_resource(JobsApi, '/v1/jobs/<job_id>', endpoint='jobs')
+    api.add_resource(BulkModelsApi, '/v1/bulk/models', endpoint='bulk_models')
+    api.add_resource(PredictManyApi, '/v1/predict', endpoint='predict_many')
     api.add_resource(PredictApi, '/v1/predict/<model_id>', endpoint='predict')
+    api.add_resource(PredictStreamApi, '/v1/predict/<model_id>/stream', endpoint='predict_stream')
     api.init_app(app)
 
     app.logger.debug('creating predict app with %s configuration', env)
 
+    app.register_blueprint(fast_predict_app)
     app.register_blueprint(doc_app)
 
     return app
@@ -19,9 +19,74 @@ class Default(object):
     SKLEARN_SEPARATOR = ','
     MODEL_DIR = '/tmp/ml-agent_models'
 
+    # sklearn model arrays are memory-mapped from sidecars kept here, by the sha1 of the model file, so processes and
+    # restarts loading the same model file share them, None loads private copies of models. a sidecar is removed with
+    # its model file from STORE_DIR (or at startup once no model uses its file if STORE_DIR is None)
+    WEIGHTS_DIR = '/tmp/ml-agent_weights'
+
+    # copied model files are kept here by content (on the same file system as MODEL_DIR, model files are hard links),
+    # files no model uses are removed, least recently used first, to keep it under STORE_BYTES (0 for no limit)
+    STORE_DIR = '/tmp/ml-agent_store'
+    STORE_BYTES = 10 * 1024 ** 3
+
+    # model files are copied this many bytes at a time, interrupted http and ftp copies are resumed up to
+    # TRANSFER_RETRIES times, network operations time out after TRANSFER_TIMEOUT seconds
+    TRANSFER_CHUNK_BYTES = 1024 * 1024
+    TRANSFER_RETRIES = 3
+    TRANSFER_TIMEOUT = 60
+
+    # number of examples scored at a time by the streaming predict api
+    STREAM_CHUNK_SIZE = 1000
+
+    # concurrent requests for a model are queued for up to this many seconds (or examples) and scored together
+    # a window of 0 disables batching, both can be set per model with --agent_batch_window and --agent_batch_size
+    PREDICT_BATCH_WINDOW = 0
+    PREDICT_BATCH_SIZE = 256
+
+    # native threads available for scoring thread safe predictors concurrently
+    PREDICT_THREADS = 4
+
+    # maximum number of predictions cached per model (0 disables caching), approximate byte limit and expiry seconds
+    # (0 for no limit), can be set per model with --agent_cache_size, --agent_cache_bytes and --agent_cache_ttl
+    PREDICT_CACHE_SIZE = 0
+    PREDICT_CACHE_BYTES = 0
+    PREDICT_CACHE_TTL = 0
+
+    # number of host processes that score each model out of process (0 scores in the server), can be set per model
+    # with --agent_hosts. batches are exchanged through shared memory slots, this many per host of this many bytes
+    PREDICT_HOSTS = 0
+    PREDICT_HOST_SLOTS = 4
+    PREDICT_HOST_SLOT_BYTES = 4 * 1024 * 1024
+
+    # with LAZY_PAUSED paused models are registered without copying, loading or verifying them until they are made
+    # active, their files can be copied ahead of time in the background (on the PREDICT_THREADS pool) with
+    # PREFETCH_PAUSED. a broken paused model is then only rejected when it is made active
+    LAZY_PAUSED = False
+    PREFETCH_PAUSED = False
+
+    # models created or replaced asynchronously (?async=true) are copied and loaded by background jobs on this many
+    # native threads, the last JOB_HISTORY finished jobs are kept in the database
+    JOB_THREADS = 2
+    JOB_HISTORY = 1000
+
+    # models replaced together (PUT /v1/bulk/models) are copied and loaded concurrently, at most this many downloading
+    # and this many loading at a time
+    BULK_DOWNLOADS = 8
+    BULK_LOADS = 4
+
+    # models are loaded concurrently at startup, at most this many downloading and this many loading at a time
+    STARTUP_DOWNLOADS = 8
+    STARTUP_LOADS = 4
+
     os.environ['JAVA_HOME'] = '/usr/java/latest'
     HADOOP = '/usr/local/hadoop/bin/hadoop'
 
+    # hdfs model files are downloaded from the WebHDFS api of this namenode (e.g. 'http://namenode:50070') as
+    # WEBHDFS_USER, WEBHDFS_PARTS blocks at a time. they are copied with HADOOP if it is None or the download fails
+    WEBHDFS_URL = None
+    WEBHDFS_USER = None
+    WEBHDFS_PARTS = 4
+
     DEBUG = False
 
     # log options
@@ -64,6 +129,8 @@ class Test(Default):
     SQLALCHEMY_ECHO = 'True'
     SQLALCHEMY_DATABASE_URI = 'sqlite:///{}'.format(TMP_DB)
     MODEL_DIR = '/tmp/test_ml-agent_models'
+    WEIGHTS_DIR = '/tmp/test_ml-agent_weights'
+    STORE_DIR = '/tmp/test_ml-agent_store'
 
 
 config = {'prod': Production,
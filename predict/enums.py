@@ -31,3 +31,12 @@ class ModelStatus(BaseEnum):
 
     active = 'active'
     paused = 'paused'
+
+
+class JobStatus(BaseEnum):
+    """ all states of background model jobs """
+
+    pending = 'pending'
+    running = 'running'
+    done = 'done'
+    failed = 'failed'
@@ -108,3 +108,14 @@ class ModelNotActive(ApiException):
         name = 'Model Not Active'
         message = 'model {} is not active'.format(model_id)
         super(self.__class__, self).__init__(name=name, message=message)
+
+
+class JobNotFoundException(ApiException):
+    """
+    Exception class to use when a job resource is not found
+    """
+
+    def __init__(self, job_id):
+        name = 'Job Not Found'
+        message = 'job {} could not be found'.format(job_id)
+        super(self.__class__, self).__init__(name=name, message=message, status_code=404)
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=no-init
+"""
+SQLAlchemy object-relational mapping of model_jobs to ModelJob object
+"""
+
+from sqlalchemy.types import FLOAT, TEXT, VARCHAR
+from sqlalchemy import Column
+from predict import db
+import json
+
+
+class ModelJob(db.Model):
+    """
+    ModelJob class is a object-relational mapping of the model_jobs MySQL table
+    ModelJob objects record the state of background model jobs (see predictors/jobs.py), so any worker process can
+    report a job
+
+    Args:
+        job_id (str): unique id of the job
+        model_id (str): model id
+        action (str): create, update or patch
+        status (str): status of job must be member of JobStatus enum
+        error (str): error of a failed job
+        model (str): json of the model loaded by a successful job
+        created (float): epoch time the job was submitted
+        timings (str): json of the seconds spent in each phase of the job
+        creates (str): model id reserved by an unfinished create job, unique so only one job creates a model
+        worker (str): 'host:pid' of the worker process running the job
+    """
+
+    __tablename__ = 'model_jobs'
+    __table_args__ = {'extend_existing': True}
+
+    job_id = Column('job_id', VARCHAR(32), primary_key=True, autoincrement=False)
+    model_id = Column('model_id', VARCHAR(100), nullable=False, index=True)
+    action = Column('action', VARCHAR(10), nullable=False)
+    status = Column('status', VARCHAR(10), nullable=False)
+    error = Column('error', TEXT, nullable=True)
+    model = Column('model', TEXT, nullable=True)
+    created = Column('created', FLOAT, nullable=False)
+    timings = Column('timings', TEXT, nullable=False, default='{}')
+    creates = Column('creates', VARCHAR(100), nullable=True, unique=True)
+    worker = Column('worker', VARCHAR(100), nullable=False, default='')
+
+    def to_dict(self):
+        """
+        generate a dictionary representation of the job as reported by the jobs api
+
+        Returns:
+            dict: job attributes, with the model and timings decoded
+        """
+
+        return dict(job_id=self.job_id, model_id=self.model_id, action=self.action, status=self.status,
+                    error=self.error, model=json.loads(self.model) if self.model else None, created=self.created,
+                    timings=json.loads(self.timings))
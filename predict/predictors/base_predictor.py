@@ -10,13 +10,23 @@ Predictors must:
     - generate numerical predictions on demand given one or more features
     - parse and return prediction outputs
     - allow the local model file to be modified during operation to ensure high availability of predictions
-    - stop and clear any objects or processes used during prediction
+    - stop and clear any objects or processes used during prediction\n
+Options for ml-agent itself (rather than for the model) can be given per model in extras as --agent_<name>=<value>,
+or --agent_<name> for flags. they are removed from extras before the model sees them
 """
 
 from abc import ABCMeta, abstractmethod
 from predict.enums import ModelStatus
 from tools.general import precision_compare
 from numpy import ndarray
+from scipy.sparse import issparse
+from itertools import count
+
+
+AGENT_OPTION_PREFIX = '--agent_'
+
+# every predictor instance gets a new version so results from a replaced predictor are never mistaken for its own
+versions = count(1)
 
 
 class BasePredictor(object):
@@ -26,15 +36,22 @@ class BasePredictor(object):
 
     Attributes
         model (DeployedModel): model object
+        options (dict): ml-agent options for this model parsed from extras
+        version (int): unique number identifying this predictor instance
+        thread_safe (bool): True if predict_parsed can run in a native thread concurrently with other predictors
     """
 
     __metaclass__ = ABCMeta
 
     model = None
+    options = None
+    version = None
 
     model_type = None
     process = None
 
+    thread_safe = False
+
     def __init__(self, model):
         """
         parent method for initializing a predictor with a given model object
@@ -49,6 +66,8 @@ class BasePredictor(object):
 
         # clone this object to avoid external manipulation of references
         self.model = model.clone()
+        self.options = split_extras(self.model.extras)[0]
+        self.version = next(versions)
 
         # these need to be set in the child class init method
         self.model_type = None
@@ -88,17 +107,59 @@ class BasePredictor(object):
 
         raise Exception('cannot call abstract predict method in base predictor class')
 
-    def verify(self):
+    def parse_examples(self, example):
+        """
+        convert example feature vector(s) into the input used by predict_parsed
+        child classes override this when parsing can be shared between predictors with the same parse_key
+
+        Args:
+            example (arraylike(str)): example feature vector(s)
+
+        Returns:
+            arraylike: parsed example(s)
+        """
+
+        return example
+
+    def predict_parsed(self, example):
+        """
+        generate prediction(s) from example(s) already converted by parse_examples
+
+        Args:
+            example (arraylike): parsed example(s)
+
+        Returns:
+            arraylike(float): prediction(s)
+        """
+
+        return self.predict(example)
+
+    def parse_key(self):
+        """
+        predictors with equal keys parse examples the same way, so parsed examples can be shared between them
+
+        Returns:
+            object: hashable key
+        """
+
+        return self.model_type
+
+    def verify(self, predict=None):
         """
         verify that the output generated by predict method matches what is expected
 
+        Args:
+            predict (function): function generating predictions to verify, defaults to the predict method
+
         Returns:
             bool: True if output matches, False otherwise
         """
 
+        predict = self.predict if predict is None else predict
+
         result = None
         try:
-            result = self.predict([self.model.example])[0]
+            result = predict([self.model.example])[0]
             if not precision_compare(self.model.output, result):
                 raise
         except Exception:
@@ -132,11 +193,33 @@ class BasePredictor(object):
         if self.process is None:
             raise Exception('model process is not active')
 
-        if not isinstance(example, (frozenset, list, set, tuple, ndarray)):
+        if not isinstance(example, (frozenset, list, set, tuple, ndarray)) and not issparse(example):
             raise Exception('invalid input: {} expected arraylike object'.format(example))
 
         return True
 
+    def get_option(self, name, default=None, cast=str):
+        """
+        get an ml-agent option for this model
+
+        Args:
+            name (str): option name (without the --agent_ prefix)
+            default (object): value to use if the option is not set
+            cast (type): type to convert the option value to
+
+        Returns:
+            object: option value
+        """
+
+        if not self.options or name not in self.options:
+            return default
+
+        value = self.options[name]
+        if cast is bool:
+            return value.lower() not in ['0', 'false', 'no']
+
+        return cast(value)
+
     def get_model(self):
         """
         return predictor model
@@ -146,3 +229,26 @@ class BasePredictor(object):
         """
 
         return self.model
+
+
+def split_extras(extras):
+    """
+    separate ml-agent options from the model arguments in extras
+
+    Args:
+        extras (str): extras string of a model
+
+    Returns:
+        (dict, str): ml-agent option values by name (empty string for flags), remaining extras
+    """
+
+    options = dict()
+    remaining = []
+    for arg in (extras or '').split():
+        if arg.startswith(AGENT_OPTION_PREFIX):
+            name, _, value = arg[len(AGENT_OPTION_PREFIX):].partition('=')
+            options[name] = value
+        else:
+            remaining.append(arg)
+
+    return options, ' '.join(remaining)
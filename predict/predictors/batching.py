@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""
+Micro-batching of concurrent prediction requests\n
+Requests for the same model that arrive within a short window are queued and scored together with one predict call,
+then each caller receives its own slice of the predictions. This amortizes the fixed cost of a predict call across
+requests, at the price of waiting up to the window for more requests to arrive.\n
+Batching relies on requests being served concurrently by gevent greenlets (see run_server.py)
+"""
+
+from gevent import spawn_later, getcurrent
+from gevent.event import AsyncResult
+
+
+class MicroBatcher(object):
+    """
+    Queues examples submitted for one model and scores them in batches
+
+    Attributes:
+        predict (function): generates predictions for a list of examples
+        window (float): maximum number of seconds a request waits for others to join its batch
+        max_size (int): number of queued examples that triggers scoring without waiting for the window
+    """
+
+    def __init__(self, predict, window, max_size):
+        """
+        init for micro-batcher
+
+        Args:
+            predict (function): generates predictions for a list of examples
+            window (float): maximum number of seconds a request waits for others to join its batch
+            max_size (int): number of queued examples that triggers scoring without waiting for the window
+
+        Returns:
+            MicroBatcher: MicroBatcher object
+        """
+
+        self.predict = predict
+        self.window = window
+        self.max_size = max_size
+
+        self.pending = []
+        self.size = 0
+        self.timer = None
+
+    def submit(self, example):
+        """
+        queue example(s) for the next batch and wait for their predictions
+
+        Args:
+            example (arraylike): example(s) to predict
+
+        Returns:
+            arraylike(float): prediction(s) for the submitted example(s) only
+        """
+
+        result = AsyncResult()
+        self.pending.append((example, result))
+        self.size += len(example)
+
+        if self.size >= self.max_size:
+            self.flush()
+        elif self.timer is None:
+            self.timer = spawn_later(self.window, self.flush)
+
+        return result.get()
+
+    def flush(self):
+        """
+        score all queued examples with one predict call and hand each request its predictions
+        """
+
+        timer, self.timer = self.timer, None
+        if timer is not None and timer is not getcurrent():
+            timer.kill(block=False)
+
+        pending, self.pending, self.size = self.pending, [], 0
+        if not pending:
+            return
+
+        try:
+            prediction = self.predict([row for example, _ in pending for row in example])
+        except Exception:
+            # don't let one bad request fail the whole batch, score requests on their own to isolate the error
+            for example, result in pending:
+                try:
+                    result.set(self.predict(example))
+                except Exception as e:
+                    result.set_exception(e)
+            return
+
+        start = 0
+        for example, result in pending:
+            end = start + len(example)
+            result.set(prediction[start:end])
+            start = end
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""
+Prediction result cache\n
+Predictions are stored by the version of the predictor that generated them and a hash of the example string, so a
+replaced model can never serve the scores of its predecessor even if a request that was scoring during the swap
+stores its result late. Entries are evicted least recently used first once the entry or byte limit is reached, and
+can optionally expire after a fixed time
+"""
+
+from collections import OrderedDict
+import hashlib
+import sys
+import time
+
+
+class PredictionCache(object):
+    """
+    LRU cache of predictions for one model
+
+    Attributes:
+        max_entries (int): maximum number of predictions stored
+        max_bytes (int): approximate maximum memory used by stored predictions, 0 for no limit
+        ttl (float): seconds before a stored prediction expires, 0 for no expiry
+        hits (int): number of lookups answered from the cache
+        misses (int): number of lookups not found in the cache (or expired)
+    """
+
+    def __init__(self, max_entries, max_bytes=0, ttl=0):
+        """
+        init for prediction cache
+
+        Args:
+            max_entries (int): maximum number of predictions stored
+            max_bytes (int): approximate maximum memory used by stored predictions, 0 for no limit
+            ttl (float): seconds before a stored prediction expires, 0 for no expiry
+
+        Returns:
+            PredictionCache: PredictionCache object
+        """
+
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+
+        self.hits = 0
+        self.misses = 0
+
+        self.entries = OrderedDict()
+        self.bytes = 0
+
+    @staticmethod
+    def make_key(version, example):
+        """
+        build the cache key for an example
+
+        Args:
+            version (int): version of the predictor
+            example (str): example feature string
+
+        Returns:
+            tuple: (version, example hash)
+        """
+
+        if isinstance(example, unicode):
+            example = example.encode('utf-8')
+
+        return version, hashlib.sha1(example).digest()
+
+    def get(self, version, example):
+        """
+        look up the prediction for an example
+
+        Args:
+            version (int): version of the predictor
+            example (str): example feature string
+
+        Returns:
+            float: stored prediction, None if not found or expired
+        """
+
+        key = self.make_key(version, example)
+        entry = self.entries.pop(key, None)
+
+        if entry is not None and self.ttl > 0 and entry[1] < time.time():
+            self.bytes -= entry[2]
+            entry = None
+
+        if entry is None:
+            self.misses += 1
+            return None
+
+        # reinsert to mark as most recently used
+        self.entries[key] = entry
+        self.hits += 1
+
+        return entry[0]
+
+    def put(self, version, example, prediction):
+        """
+        store the prediction for an example, evicting the least recently used predictions if needed
+
+        Args:
+            version (int): version of the predictor
+            example (str): example feature string
+            prediction (float): prediction for the example
+        """
+
+        key = self.make_key(version, example)
+        size = sys.getsizeof(key) + sys.getsizeof(key[1]) + sys.getsizeof(prediction)
+
+        old = self.entries.pop(key, None)
+        if old is not None:
+            self.bytes -= old[2]
+
+        self.entries[key] = (prediction, time.time() + self.ttl, size)
+        self.bytes += size
+
+        while self.entries and (len(self.entries) > self.max_entries or 0 < self.max_bytes < self.bytes):
+            self.bytes -= self.entries.popitem(last=False)[1][2]
+
+    def clear(self):
+        """
+        remove all stored predictions (hit and miss counts are kept)
+        """
+
+        self.entries.clear()
+        self.bytes = 0
+
+    def stats(self):
+        """
+        summarize cache usage
+
+        Returns:
+            dict: hits, misses, number of entries and approximate bytes stored
+        """
+
+        return {'hits': self.hits, 'misses': self.misses, 'entries': len(self.entries), 'bytes': self.bytes}
@@ -0,0 +1,508 @@
+# -*- coding: utf-8 -*-
+"""
+Out-of-process model hosts\n
+A model host is a process forked from the server after its predictor is loaded, so it shares the model memory
+copy-on-write and scores on its own CPU core while the gevent loop keeps serving requests. A crash while scoring
+(e.g. in native vw code) only ends the host, requests it was scoring fail and a new host is forked for the next
+request.\n
+Examples and predictions are not pickled: each host has a shared memory buffer split into slots, a request copies its
+batch into a free slot and only a small fixed size header goes through the socket to the host, which writes the
+predictions back into the same slot. Feature strings are written as one newline separated block, float matrices
+(binary requests) as raw float64 values, sparse matrices as their raw CSR arrays and anything else (e.g. structured
+vw examples) with marshal. Batches too large for a slot are split
+"""
+
+from gevent import spawn as spawn_greenlet
+from gevent.event import AsyncResult
+from gevent.queue import Queue
+from predict.predictors import threads
+from scipy.sparse import csr_matrix, issparse
+import exceptions
+import gevent
+import gevent.socket
+import marshal
+import mmap
+import numpy as np
+import os
+import signal
+import socket
+import struct
+
+
+# slot, kind (request) or status (reply), rows, columns, bytes in the slot
+HEADER = struct.Struct('<IBIIQ')
+
+# kinds of batches
+STRINGS = 0
+FLOATS = 1
+MARSHALED = 2
+SPARSE = 3
+
+# reply status
+OK = 0
+ERROR = 1
+TOO_LARGE = 2
+
+PREDICTION_BYTES = np.dtype(np.float64).itemsize
+
+# seconds between checks that an exited host can be reaped
+REAP_INTERVAL = 0.01
+
+
+class HostExited(Exception):
+    """
+    raised for requests that were scoring in a host when it exited
+    """
+
+    pass
+
+
+class HostPool(object):
+    """
+    Dispatches batches for one predictor across its host processes
+
+    Attributes:
+        predictor (BasePredictor): predictor loaded in the hosts
+        hosts (list(ModelHost)): host processes
+        busy (list(int)): number of requests scoring on or waiting for each host
+        slots (int): number of batches each host can have queued
+        slot_bytes (int): size of each slot
+    """
+
+    def __init__(self, predictor, n_hosts, slots, slot_bytes):
+        """
+        init for host pool, forks the hosts
+
+        Args:
+            predictor (BasePredictor): loaded predictor
+            n_hosts (int): number of host processes
+            slots (int): number of batches each host can have queued
+            slot_bytes (int): size of each slot
+
+        Returns:
+            HostPool: HostPool object
+        """
+
+        self.predictor = predictor
+        self.slots = slots
+        self.slot_bytes = slot_bytes
+
+        self.hosts = [ModelHost(predictor, slots, slot_bytes) for _ in range(n_hosts)]
+        self.busy = [0] * n_hosts
+
+    def predict(self, example):
+        """
+        score examples with the least busy host, a host that has exited is replaced first
+
+        Args:
+            example (array(str)): example(s) to score
+
+        Returns:
+            array(float): prediction(s)
+        """
+
+        kind, rows, cols, data = encode(example)
+        if not fits(data, rows, self.slot_bytes):
+            if rows == 1:
+                raise ValueError('example does not fit in a model host slot')
+            return self.predict_split(example, rows)
+
+        i = min(range(len(self.hosts)), key=self.busy.__getitem__)
+        if not self.hosts[i].alive and not self.hosts[i].closed:
+            self.hosts[i] = ModelHost(self.predictor, self.slots, self.slot_bytes)
+
+        self.busy[i] += 1
+        try:
+            prediction = self.hosts[i].send(kind, rows, cols, data)
+        finally:
+            self.busy[i] -= 1
+
+        if prediction is None:
+            if rows == 1:
+                raise ValueError('predictions for one example do not fit in a model host slot')
+            return self.predict_split(example, rows)
+
+        return prediction
+
+    def predict_split(self, example, rows):
+        """
+        score the two halves of a batch separately
+
+        Args:
+            example (array(str)): example(s) to score
+            rows (int): number of examples
+
+        Returns:
+            array(float): prediction(s)
+        """
+
+        middle = rows // 2
+
+        return np.concatenate([self.predict(example[:middle]), self.predict(example[middle:])])
+
+    def stop(self):
+        """
+        stop all hosts once they have finished the batches already sent to them
+        """
+
+        for host in self.hosts:
+            host.close()
+
+
+class ModelHost(object):
+    """
+    One host process and the shared memory used to exchange batches with it
+
+    Attributes:
+        pid (int): process id of the host
+        alive (bool): False once the host has exited
+        closed (bool): True once the host has been asked to stop
+        stopped (bool): True once the host input has been ended, after it has scored the batches sent before close
+    """
+
+    def __init__(self, predictor, slots, slot_bytes):
+        """
+        init for model host, forks the host process
+
+        Args:
+            predictor (BasePredictor): loaded predictor
+            slots (int): number of batches that can be queued
+            slot_bytes (int): size of each slot
+
+        Returns:
+            ModelHost: ModelHost object
+        """
+
+        self.slot_bytes = slot_bytes
+        self.buffer = mmap.mmap(-1, slots * slot_bytes)
+
+        self.free = Queue()
+        for slot in range(slots):
+            self.free.put(slot)
+        self.pending = dict()
+
+        self.alive = True
+        self.closed = False
+        self.stopped = False
+
+        server_end, host_end = socket.socketpair()
+
+        self.pid = os.fork()
+        if self.pid == 0:
+            status = 0
+            try:
+                server_end.close()
+                serve(predictor, host_end, self.buffer, slot_bytes)
+            except BaseException:  # pylint: disable=broad-except
+                status = 1
+            finally:
+                os._exit(status)  # pylint: disable=protected-access
+
+        host_end.close()
+        self.socket = gevent.socket.socket(_sock=server_end)
+        spawn_greenlet(self.read_replies)
+
+    def send(self, kind, rows, cols, data):
+        """
+        score a batch in the host, waiting for a free slot if all are in use
+
+        Args:
+            kind (int): kind of batch (see encode)
+            rows (int): number of examples
+            cols (int): number of features for float matrices
+            data (str or ndarray or list(ndarray)): encoded batch
+
+        Returns:
+            ndarray: predictions, None if they do not fit in a slot
+        """
+
+        slot = self.free.get()
+        try:
+            if not self.alive or self.stopped:
+                raise HostExited('model host {} has exited'.format(self.pid))
+
+            offset = slot * self.slot_bytes
+            size = write(self.buffer, offset, data)
+
+            result = AsyncResult()
+            self.pending[slot] = result
+            self.socket.sendall(HEADER.pack(slot, kind, rows, cols, size))
+            status, rows, cols, size = result.get()
+
+            if status == TOO_LARGE:
+                return None
+            if status == ERROR:
+                raise make_error(self.buffer[offset:offset + size])
+
+            prediction = np.frombuffer(self.buffer, np.float64, size // PREDICTION_BYTES, offset).copy()
+            return prediction.reshape(rows, cols) if cols else prediction
+        finally:
+            self.pending.pop(slot, None)
+            self.free.put(slot)
+
+    def read_replies(self):
+        """
+        hand replies from the host to the waiting requests until the host exits
+        """
+
+        while True:
+            header = receive(self.socket, HEADER.size)
+            if header is None:
+                break
+
+            slot, status, rows, cols, size = HEADER.unpack(header)
+            result = self.pending.get(slot, None)
+            if result is not None:
+                result.set((status, rows, cols, size))
+
+        self.alive = False
+        self.socket.close()
+
+        # the host closes its socket by exiting, so it is gone or about to be
+        pid, status = os.waitpid(self.pid, os.WNOHANG)
+        while pid == 0:
+            gevent.sleep(REAP_INTERVAL)
+            pid, status = os.waitpid(self.pid, os.WNOHANG)
+
+        error = HostExited('model host {} exited with status {}'.format(self.pid, status))
+        for result in self.pending.values():
+            result.set_exception(error)
+
+    def close(self):
+        """
+        stop the host once every slot is free, i.e. after it has scored the batches already sent
+        """
+
+        if self.closed:
+            return
+        self.closed = True
+
+        def finish():
+            """
+            wait for all slots then end the host's input, requests still waiting for a slot fail
+            """
+
+            slots = [self.free.get() for _ in range(len(self.buffer) // self.slot_bytes)]
+            self.stopped = True
+            if self.alive:
+                self.socket.shutdown(socket.SHUT_WR)
+            for slot in slots:
+                self.free.put(slot)
+
+        spawn_greenlet(finish)
+
+
+def serve(predictor, sock, buf, slot_bytes):
+    """
+    host process loop: score each batch sent until the server ends the input
+
+    Args:
+        predictor (BasePredictor): loaded predictor
+        sock (socket): host end of the socket to the server
+        buf (mmap): shared memory
+        slot_bytes (int): size of each slot
+    """
+
+    # close everything inherited from the server (listening socket, database connections, other hosts' sockets) so
+    # the host holds nothing open that the server expects to be closed when it closes it
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    fd = sock.fileno()
+    os.closerange(3, fd)
+    os.closerange(fd + 1, os.sysconf('SC_OPEN_MAX'))
+
+    sock.setblocking(1)
+    threads.run_inline()
+
+    while True:
+        header = receive(sock, HEADER.size)
+        if header is None:
+            return
+
+        slot, kind, rows, cols, size = HEADER.unpack(header)
+        offset = slot * slot_bytes
+
+        try:
+            prediction = np.asarray(predictor.predict(decode(buf, offset, kind, rows, cols, size)), dtype=np.float64)
+            if prediction.ndim > 2:
+                raise ValueError('expected one or two dimensional predictions')
+
+            if prediction.nbytes > slot_bytes:
+                reply = (slot, TOO_LARGE, 0, 0, 0)
+            else:
+                size = write(buf, offset, np.ascontiguousarray(prediction))
+                reply = (slot, OK, prediction.shape[0], prediction.shape[1] if prediction.ndim == 2 else 0, size)
+        except Exception as e:  # pylint: disable=broad-except
+            message = '{}\n{}'.format(type(e).__name__, error_message(e))[:slot_bytes]
+            reply = (slot, ERROR, 0, 0, write(buf, offset, message))
+
+        sock.sendall(HEADER.pack(*reply))
+
+
+def encode(example):
+    """
+    prepare a batch for a slot
+
+    Args:
+        example (array(str) or ndarray): example(s)
+
+    Returns:
+        (int, int, int, str or ndarray or list(ndarray)): kind, rows, columns (matrices only) and data
+    """
+
+    if issparse(example):
+        example = example.tocsr()
+        rows, cols = example.shape
+        data = [example.indptr.astype(np.int64), example.indices.astype(np.int64), example.data.astype(np.float64)]
+        return SPARSE, rows, cols, data
+
+    if isinstance(example, np.ndarray):
+        if example.ndim == 2 and example.dtype.kind in 'biuf':
+            data = np.ascontiguousarray(example, dtype=np.float64)
+            return FLOATS, data.shape[0], data.shape[1], data
+        example = example.tolist()
+
+    if all(isinstance(x, str) for x in example):
+        data = '\n'.join(example)
+        if data.count('\n') == len(example) - 1:
+            return STRINGS, len(example), 0, data
+
+    return MARSHALED, len(example), 0, marshal.dumps(list(example))
+
+
+def decode(buf, offset, kind, rows, cols, size):
+    """
+    read a batch from a slot
+
+    Args:
+        buf (mmap): shared memory
+        offset (int): start of the slot
+        kind (int): kind of batch
+        rows (int): number of examples
+        cols (int): number of features for matrices
+        size (int): bytes used in the slot
+
+    Returns:
+        array(str) or ndarray or csr_matrix: example(s)
+    """
+
+    if kind == FLOATS:
+        return np.frombuffer(buf, np.float64, rows * cols, offset).reshape(rows, cols)
+
+    if kind == SPARSE:
+        indptr = np.frombuffer(buf, np.int64, rows + 1, offset)
+        offset += indptr.nbytes
+        indices = np.frombuffer(buf, np.int64, indptr[-1], offset)
+        offset += indices.nbytes
+        data = np.frombuffer(buf, np.float64, indptr[-1], offset)
+        return csr_matrix((data, indices, indptr), shape=(rows, cols))
+
+    data = buf[offset:offset + size]
+
+    return data.split('\n') if kind == STRINGS else marshal.loads(data)
+
+
+def write(buf, offset, data):
+    """
+    copy data into a slot
+
+    Args:
+        buf (mmap): shared memory
+        offset (int): start of the slot
+        data (str or ndarray or list(ndarray)): contiguous data to copy, arrays in a list are copied one after another
+
+    Returns:
+        int: bytes written
+    """
+
+    if isinstance(data, list):
+        size = 0
+        for x in data:
+            size += write(buf, offset + size, x)
+        return size
+
+    if isinstance(data, np.ndarray):
+        np.frombuffer(buf, data.dtype, data.size, offset)[:] = data.ravel()
+        return data.nbytes
+
+    buf[offset:offset + len(data)] = data
+
+    return len(data)
+
+
+def fits(data, rows, slot_bytes):
+    """
+    check a batch and its predictions (one per example) fit in a slot
+
+    Args:
+        data (str or ndarray or list(ndarray)): encoded batch
+        rows (int): number of examples
+        slot_bytes (int): size of each slot
+
+    Returns:
+        bool: True if the batch fits
+    """
+
+    if isinstance(data, list):
+        size = sum(x.nbytes for x in data)
+    else:
+        size = data.nbytes if isinstance(data, np.ndarray) else len(data)
+
+    return size <= slot_bytes and rows * PREDICTION_BYTES <= slot_bytes
+
+
+def receive(sock, size):
+    """
+    read a fixed number of bytes from a socket
+
+    Args:
+        sock (socket): socket to read
+        size (int): number of bytes
+
+    Returns:
+        str: bytes read, None if the other end closed the socket
+    """
+
+    data = ''
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            return None
+        data += chunk
+
+    return data
+
+
+def error_message(error):
+    """
+    get the message of an error as a byte string
+
+    Args:
+        error (Exception): error
+
+    Returns:
+        str: error message
+    """
+
+    message = error.message if isinstance(error.message, basestring) else str(error)
+
+    return message.encode('utf-8') if isinstance(message, unicode) else message
+
+
+def make_error(data):
+    """
+    rebuild an error raised in a host, built in error types are kept so errors read the same as without hosts
+
+    Args:
+        data (str): error name and message written by the host
+
+    Returns:
+        Exception: error
+    """
+
+    name, _, message = data.partition('\n')
+    error_type = getattr(exceptions, name, None)
+    if not isinstance(error_type, type) or not issubclass(error_type, Exception):
+        error_type = Exception
+
+    return error_type(message)
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""
+Background model jobs\n
+A model created, updated or patched asynchronously is loaded by a job (see management.submit_job): the request returns
+at once with the job, its model file is copied and the model loaded and stored in the database on native threads
+while the gevent loop keeps serving predictions, then the new predictor replaces the old one. Jobs for the same model
+run one at a time, in order, and with the synchronous changes of the model made by the same worker.\n
+The state of each job is stored in the database (see models/model_job.py) so it can be looked up from any worker
+process. A create job reserves its model id there until it finishes, so a model is created by only one job
+"""
+
+from collections import OrderedDict
+from predict.enums import JobStatus
+from predict.models.model_job import ModelJob
+from time import time
+from uuid import uuid4
+import errno
+import json
+import os
+import socket
+
+
+# phases of a job, timed in seconds
+PHASES = ['wait', 'download', 'load', 'store', 'swap']
+
+
+class Job(object):
+    """
+    state of a background model job
+
+    Attributes:
+        job_id (str): unique id of the job
+        model_id (str): model id
+        action (str): create, update or patch
+        status (str): member of JobStatus enum
+        error (str): error of a failed job, None otherwise
+        model (dict): model loaded by a successful job, None otherwise
+        created (float): epoch time the job was submitted
+        timings (OrderedDict): seconds spent in each phase (see PHASES) and in total
+        worker (str): 'host:pid' of the worker process running the job
+        task (Greenlet): greenlet running the job
+    """
+
+    def __init__(self, model_id, action):
+        """
+        init for jobs
+
+        Args:
+            model_id (str): model id
+            action (str): create, update or patch
+
+        Returns:
+            Job: Job object
+        """
+
+        self.job_id = uuid4().hex
+        self.model_id = model_id
+        self.action = action
+        self.status = JobStatus.pending
+        self.error = None
+        self.model = None
+        self.created = time()
+        self.timings = OrderedDict((phase, 0.) for phase in PHASES + ['total'])
+        self.worker = worker_name()
+        self.task = None
+
+    def is_finished(self):
+        """
+        check if the job is done or failed
+
+        Returns:
+            bool: True if the job is finished
+        """
+
+        return self.status in (JobStatus.done, JobStatus.failed)
+
+    def wait(self, timeout=None):
+        """
+        wait for the job to finish
+
+        Args:
+            timeout (float): seconds to wait, None to wait until it finishes
+
+        Returns:
+            bool: True if the job is finished
+        """
+
+        if self.task is not None:
+            self.task.join(timeout=timeout)
+
+        return self.is_finished()
+
+    def to_dict(self):
+        """
+        generate a dictionary representation of the job
+
+        Returns:
+            dict: job attributes
+        """
+
+        return dict(job_id=self.job_id, model_id=self.model_id, action=self.action, status=self.status,
+                    error=self.error, model=self.model, created=self.created, timings=dict(self.timings))
+
+    def to_record(self):
+        """
+        generate the database record of the job, an unfinished create job reserves its model id
+
+        Returns:
+            ModelJob: ModelJob object
+        """
+
+        creates = self.model_id if self.action == 'create' and not self.is_finished() else None
+
+        return ModelJob(job_id=self.job_id, model_id=self.model_id, action=self.action, status=self.status,
+                        error=self.error, model=json.dumps(self.model) if self.model is not None else None,
+                        created=self.created, timings=json.dumps(self.timings), creates=creates, worker=self.worker)
+
+
+def worker_name():
+    """
+    name of the current worker process
+
+    Returns:
+        str: 'host:pid'
+    """
+
+    return '{host}:{pid}'.format(host=socket.gethostname(), pid=os.getpid())
+
+
+def is_orphan(worker):
+    """
+    check if a job was run by a worker process of this host that is no longer running
+
+    Args:
+        worker (str): 'host:pid' of the worker process that ran the job
+
+    Returns:
+        bool: True if the worker process is gone, False if it is running or on another host
+    """
+
+    host, _, pid = worker.rpartition(':')
+    if host != socket.gethostname() or not pid.isdigit():
+        return False
+
+    try:
+        os.kill(int(pid), 0)
+    except OSError as e:
+        # EPERM if the process is running as another user
+        return e.errno == errno.ESRCH
+
+    return False
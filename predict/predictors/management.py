@@ -3,23 +3,85 @@
 This provides the middle layer of managing predictive models (CRUD operations)
 methods here provide an interface between the public APIs and predictor methods\n
 The predictors dictionary is the in-memory singleton that houses all predictors\n
-All file management is also handled here, removing that concern from the predictor layer
+Paused models can be registered without being copied or loaded (see predictor_factory.is_lazy), they are copied when
+made active, or ahead of time in the background with PREFETCH_PAUSED\n
+When several worker processes serve the same database (see run_server.py) each keeps its own predictors, on_model_change
+is called after a worker changes a model so the other workers can catch up with sync_predictors\n
+All file management is also handled here, removing that concern from the predictor layer. Copied model files are
+kept in a content addressed store (see store.py) which survives restarts, a remote file that has not changed since it
+was copied (or that cannot be checked and was copied for the same model timestamp) is linked from the store instead of
+being copied again, so reloading unchanged models only checks their remote files\n
+Models can also be created or replaced by background jobs (see jobs.py), which copy and load them on native threads
+so the gevent loop keeps serving predictions meanwhile
 """
 
 
 from flask import current_app as app
 from predict.models.deployed_model import DeployedModel
-from predict.exceptions import ApiException, ModelNotFoundException, ModelNotActive
+from predict.models.model_job import ModelJob
+from predict.exceptions import ApiException, ModelNotFoundException, ModelNotActive, ModelExistsException, \
+    JobNotFoundException
+from predict.enums import JobStatus
 from predict import db
-from predict.predictors.predictor_factory import make_predictor
-from tools.general import run_process
+from predict.predictors.predictor_factory import make_predictor, is_lazy
+from predict.predictors.batching import MicroBatcher
+from predict.predictors.cache import PredictionCache
+from predict.predictors.hosts import HostPool
+from predict.predictors.jobs import Job, is_orphan
+from predict.predictors.store import ModelStore, link
+from predict.predictors.weights import remove_weights, prune_weights
+from predict.predictors.threads import get_threadpool, reset_threadpool, spawn, spawn_on
+from predict.predictors.transfers import make_transfer, same_remote, clear_pools, TRANSFER_CHUNK_BYTES, \
+    TRANSFER_RETRIES, TRANSFER_TIMEOUT, WEBHDFS_PARTS
+from tools.general import precision_compare, file_sha1
+from gevent.lock import Semaphore
+from gevent.threadpool import ThreadPool
+from numpy import ndarray
+from sqlalchemy.exc import IntegrityError
+from scipy.sparse import issparse
+from time import time
+import gevent
 import shutil
 import os
 
 
 predictors = dict()
+batchers = dict()
+caches = dict()
+hosts = dict()
+prefetches = dict()
+store = None
+
+# locks by model id, held by background model jobs (see jobs.py) and synchronous changes so they run one at a time
+job_locks = dict()
+job_pool = None
+
+# function called with the model id after a model is created, updated, patched or deleted
+on_model_change = None
 
 MODEL_DIR = '/tmp/model_data'
+STORE_DIR = None
+STORE_BYTES = 0
+PREDICT_BATCH_WINDOW = 0
+PREDICT_BATCH_SIZE = 256
+PREDICT_CACHE_SIZE = 0
+PREDICT_CACHE_BYTES = 0
+PREDICT_CACHE_TTL = 0
+PREDICT_HOSTS = 0
+PREDICT_HOST_SLOTS = 4
+PREDICT_HOST_SLOT_BYTES = 4 * 1024 * 1024
+STARTUP_DOWNLOADS = 8
+STARTUP_LOADS = 4
+PREFETCH_PAUSED = False
+WEBHDFS_URL = None
+WEBHDFS_USER = None
+JOB_THREADS = 2
+JOB_HISTORY = 1000
+BULK_DOWNLOADS = 8
+BULK_LOADS = 4
+
+# timing of each model loaded by the last create_predictors (see start_predictor)
+startup_report = []
 
 
 def create_predictor(model, load_model=True):
@@ -34,17 +96,97 @@ def create_predictor(model, load_model=True):
 
     model_id = model.model_id
 
-    if load_model:
-        # create local copy of model file and update model
-        model.local_path = load_model_file(model_id=model_id, remote_path=model.remote_path)
+    # a prefetch of the old model file must not overwrite the new one
+    finish_prefetch(model_id=model_id)
+
+    set_local_path(model=model, load_model=load_model)
 
     # instantiate predictor
     predictor = make_predictor(model)
 
     app.logger.debug('instantiated predictor with model id: %s', model_id)
 
+    store_model(model=model)
+
+    # the predictor is loaded into the dictionary last to ensure it is ready and verified before it can be accessed
+    # this also provides for seamless updates to active predictors
+    predictors[model_id] = predictor
+    start_prefetch(model=model)
+
+    notify_change(model_id=model_id)
+
+
+def add_predictor(model):
+    """
+    create a predictor for a model id that is not in use, see create_predictor
+
+    Args:
+        model (DeployedModel): model for predictor to use
+    """
+
+    with model_lock(model_id=model.model_id):
+        check_new(model_id=model.model_id)
+        create_predictor(model)
+
+
+def check_new(model_id):
+    """
+    check a model id can be created: it has no predictor and no unfinished create job reserves it
+
+    Args:
+        model_id (str): model id
+    """
+
+    if model_id in predictors or ModelJob.query.filter_by(creates=model_id).first() is not None:
+        raise ModelExistsException(model_id)
+
+
+def model_lock(model_id):
+    """
+    get the lock held while a model is changed, by its jobs and by synchronous changes, so they run one at a time in
+    the order they were made
+
+    Args:
+        model_id (str): model id
+
+    Returns:
+        Semaphore: lock
+    """
+
+    return job_locks.setdefault(model_id, Semaphore())
+
+
+def set_local_path(model, load_model=True):
+    """
+    set the local path of a model, copying its model file if needed (lazy models are not copied)
+
+    Args:
+        model (DeployedModel): model
+        load_model (bool): copy the model file even if it is already local
+    """
+
+    if is_lazy(model):
+        # lazy models are copied when they are made active, a local file copied for the old remote path is removed
+        if load_model:
+            model.local_path = get_local_path(model_id=model.model_id, remote_path=model.remote_path)
+            if os.path.isfile(model.local_path):
+                os.remove(model.local_path)
+    elif load_model or not os.path.isfile(model.local_path):
+        # create local copy of model file and update model
+        model.local_path = load_model_file(model_id=model.model_id, remote_path=model.remote_path,
+                                           version=model.timestamp)
+
+
+def store_model(model):
+    """
+    store a model in the database, replacing the model with the same model id
+
+    Args:
+        model (DeployedModel): model
+    """
+
     # remove old model if it exists
-    old_model = DeployedModel.query.filter_by(model_id=model_id).first()
+    old_model = DeployedModel.query.filter_by(model_id=model.model_id).first()
     if old_model:
         db.session.delete(old_model)
 
@@ -52,11 +194,7 @@ def create_predictor(model, load_model=True):
     db.session.add(model)
     db.session.commit()
 
-    app.logger.debug('model id: %s stored in database', model_id)
-
-    # the predictor is loaded into the dictionary last to ensure it is ready and verified before it can be accessed
-    # this also provides for seamless updates to active predictors
-    predictors[model_id] = predictor
+    app.logger.debug('model id: %s stored in database', model.model_id)
 
 
 def update_predictor(model):
@@ -69,11 +207,340 @@ def update_predictor(model):
 
     model_id = model.model_id
 
-    # stop old predictor after new one has been loaded
-    predictor = predictors.get(model_id, None)
-    create_predictor(model)
-    if predictor is not None:
+    with model_lock(model_id=model_id):
+        # stop old predictor after new one has been loaded
+        predictor = predictors.get(model_id, None)
+        create_predictor(model)
+        invalidate_cache(model_id=model_id)
+        stop_hosts(model_id=model_id)
+        if predictor is not None:
+            predictor.stop()
+
+
+def update_predictors(models):
+    """
+    update or create several predictors together. model files are copied and models loaded concurrently on native
+    threads, at most BULK_DOWNLOADS downloads and BULK_LOADS loads at a time. the models loaded are stored in the
+    database in one transaction, then their predictors replace the old ones at once. a model that fails to load, or
+    whose model id is reserved by a create job, is reported and left as it was. the locks of all the model ids are
+    held throughout, so jobs and other changes of these models wait for the update
+
+    Args:
+        models (list(DeployedModel)): new model parameters to use, one per model id
+
+    Returns:
+        list(dict): report of each model, see start_predictor
+    """
+
+    # locks are taken in model id order so concurrent bulk updates cannot deadlock
+    locked = []
+    try:
+        for model_id in sorted(set(model.model_id for model in models)):
+            lock = model_lock(model_id=model_id)
+            lock.acquire()
+            locked.append(lock)
+
+        return load_predictors(models=models)
+    finally:
+        for lock in locked:
+            lock.release()
+
+
+def load_predictors(models):
+    """
+    copy, load, store and swap in several predictors together, see update_predictors. the caller holds the locks of
+    the model ids
+
+    Args:
+        models (list(DeployedModel)): new model parameters to use, one per model id
+
+    Returns:
+        list(dict): report of each model, see start_predictor
+    """
+
+    n_downloads = max(app.config.get('BULK_DOWNLOADS', BULK_DOWNLOADS), 1)
+    n_loads = max(app.config.get('BULK_LOADS', BULK_LOADS), 1)
+    pool = ThreadPool(n_downloads + n_loads)
+    limits = Semaphore(n_downloads), Semaphore(n_loads)
+
+    # greenlets and threads have no app context of their own
+    context = app._get_current_object().app_context  # pylint: disable=protected-access
+
+    start = time()
+
+    # a pending create job would replace the model once the update is done
+    model_ids = [model.model_id for model in models]
+    reserved = dict((record.creates, record.job_id) for record in
+                    ModelJob.query.filter(ModelJob.creates.in_(model_ids)).all()) if model_ids else {}
+
+    reports = dict()
+    for model_id, job_id in sorted(reserved.iteritems()):
+        error = 'model {} is being created by job {}'.format(model_id, job_id)
+        app.logger.error('bulk: %s', error)
+        reports[model_id] = dict(model_id=model_id, error=error, paused=False, download=0., load=0., wait=0., total=0.)
+    models_to_load = [model for model in models if model.model_id not in reserved]
+
+    for model in models_to_load:
+        # a prefetch of the old model file must not overwrite the new one
+        finish_prefetch(model_id=model.model_id)
+
+    try:
+        tasks = [gevent.spawn(start_predictor, pool, limits, context, model, is_lazy(model))
+                 for model in models_to_load]
+        gevent.joinall(tasks)
+    finally:
+        pool.kill()
+
+    loaded = []
+    for model, task in zip(models_to_load, tasks):
+        report = reports[model.model_id] = task.value
+        predictor = report.pop('predictor')
+        if predictor is None:
+            app.logger.error('bulk: model id: %s failed after %.2fs: %s', model.model_id, report['total'],
+                             report['error'])
+            continue
+        model.local_path = predictor.get_model().local_path
+        loaded.append((model, predictor))
+
+    try:
+        if loaded:
+            loaded_ids = [model.model_id for model, _ in loaded]
+            for old_model in DeployedModel.query.filter(DeployedModel.model_id.in_(loaded_ids)).all():
+                db.session.delete(old_model)
+            db.session.add_all([model for model, _ in loaded])
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        for _, predictor in loaded:
+            predictor.stop()
+        raise
+
+    # predictors are swapped in without yielding to other greenlets, old predictors are stopped afterwards
+    old = [predictors.get(model.model_id, None) for model, _ in loaded]
+    for model, predictor in loaded:
+        predictors[model.model_id] = predictor
+
+    for (model, _), predictor in zip(loaded, old):
+        # a local file copied for the old remote path of a lazy model is only removed once the model is replaced
+        if is_lazy(model) and os.path.isfile(model.local_path):
+            os.remove(model.local_path)
+        invalidate_cache(model_id=model.model_id)
+        stop_hosts(model_id=model.model_id)
+        if predictor is not None:
+            predictor.stop()
+        start_prefetch(model=model)
+        notify_change(model_id=model.model_id)
+
+    app.logger.info('bulk: loaded %d of %d models in %.2fs', len(loaded), len(models), time() - start)
+
+    return [reports[model.model_id] for model in models]
+
+
+def submit_job(action, model, load_model=True):
+    """
+    create or replace a predictor in the background, see jobs.py. the job is stored in the database, the last
+    JOB_HISTORY finished jobs are kept
+
+    Args:
+        action (str): create, update or patch
+        model (DeployedModel): model for predictor to use
+        load_model (bool): copy the model file even if it is already local
+
+    Returns:
+        Job: submitted job
+    """
+
+    job = Job(model_id=model.model_id, action=action)
+    if action == 'create':
+        check_new(model_id=model.model_id)
+    save_job(job)
+
+    # greenlets and threads have no app context of their own
+    context = app._get_current_object().app_context  # pylint: disable=protected-access
+    job.task = gevent.spawn(run_job, job, context, model, load_model)
+
+    history = app.config.get('JOB_HISTORY', JOB_HISTORY)
+    finished = ModelJob.query.filter(ModelJob.status.in_([JobStatus.done, JobStatus.failed]))
+    for record in finished.order_by(ModelJob.created.desc()).offset(history).all():
+        db.session.delete(record)
+    db.session.commit()
+
+    app.logger.debug('submitted job: %s to %s model id: %s', job.job_id, action, model.model_id)
+
+    return job
+
+
+def submit_patch(model_id, **kwargs):
+    """
+    patch parameters of an existing predictor in the background, see patch_predictor
+
+    Args:
+        model_id (str): unique string id for model
+        kwargs (dict): parsed args mapping to fields in model object to update
+
+    Returns:
+        Job: submitted job
+    """
+
+    # the running predictor keeps its model until the job replaces it
+    model = get_model(model_id=model_id).clone()
+    for param, value in kwargs.iteritems():
+        setattr(model, param, value)
+
+    return submit_job(action='patch', model=model, load_model='remote_path' in kwargs)
+
+
+def run_job(job, context, model, load_model):
+    """
+    run a job: copy the model file and load the predictor, then store the model, on the job thread pool
+    (JOB_THREADS), and replace the old predictor. jobs for the same model run in order. errors are caught and
+    recorded in the job
+
+    Args:
+        job (Job): job
+        context (function): function returning an app context
+        model (DeployedModel): model for predictor to use
+        load_model (bool): copy the model file even if it is already local
+    """
+
+    with context():
+        start = time()
+        try:
+            with model_lock(model_id=model.model_id):
+                job.timings['wait'] = time() - start
+                job.status = JobStatus.running
+                save_job(job)
+                job.model = run_phases(job=job, context=context, model=model, load_model=load_model).to_dict()
+            job.status = JobStatus.done
+            app.logger.info('job: %s loaded model id: %s in %.2fs', job.job_id, model.model_id, time() - start)
+        except Exception as e:  # pylint: disable=broad-except
+            job.status = JobStatus.failed
+            job.error = e.message if isinstance(e, ApiException) else str(e)
+            app.logger.error('job: %s for model id: %s failed: %s', job.job_id, model.model_id, job.error)
+        finally:
+            job.timings['total'] = time() - start
+            try:
+                save_job(job)
+            except Exception as e:  # pylint: disable=broad-except
+                app.logger.error('job: %s could not be stored: %s', job.job_id, e)
+
+
+def save_job(job):
+    """
+    store the state of a job in the database, where any worker process can look it up
+
+    Args:
+        job (Job): job
+    """
+
+    try:
+        db.session.merge(job.to_record())
+        db.session.commit()
+    except IntegrityError:
+        # the model id is reserved by another create job
+        db.session.rollback()
+        raise ModelExistsException(job.model_id)
+
+
+def fail_orphan_jobs():
+    """
+    mark the unfinished jobs of worker processes that died as failed, releasing the model ids they reserved
+    """
+
+    unfinished = ModelJob.query.filter(ModelJob.status.in_([JobStatus.pending, JobStatus.running])).all()
+    for record in unfinished:
+        if is_orphan(record.worker):
+            app.logger.error('job: %s for model id: %s was interrupted', record.job_id, record.model_id)
+            record.status = JobStatus.failed
+            record.error = 'worker process {} stopped'.format(record.worker)
+            record.creates = None
+    db.session.commit()
+
+
+def run_phases(job, context, model, load_model):
+    """
+    copy, load and store a model on the job thread pool, then replace the old predictor, timing each phase
+
+    Args:
+        job (Job): job
+        context (function): function returning an app context
+        model (DeployedModel): model for predictor to use
+        load_model (bool): copy the model file even if it is already local
+
+    Returns:
+        DeployedModel: model of the new predictor
+    """
+
+    pool = get_job_pool()
+    model_id = model.model_id
+
+    # a prefetch of the old model file must not overwrite the new one
+    finish_prefetch(model_id=model_id)
+
+    started = time()
+    spawn_on(pool, in_context, context, set_local_path, model, load_model).get()
+    job.timings['download'] = time() - started
+
+    started = time()
+    predictor = spawn_on(pool, in_context, context, make_predictor, model).get()
+    job.timings['load'] = time() - started
+
+    started = time()
+    try:
+        # the thread's database session ends with it, it stores a copy of the model
+        spawn_on(pool, in_context, context, store_model, model.clone()).get()
+    except Exception:
         predictor.stop()
+        raise
+    job.timings['store'] = time() - started
+
+    # the predictor is swapped in once it is loaded, verified and stored
+    started = time()
+    old = predictors.get(model_id, None)
+    predictors[model_id] = predictor
+    start_prefetch(model=model)
+    notify_change(model_id=model_id)
+    invalidate_cache(model_id=model_id)
+    stop_hosts(model_id=model_id)
+    if old is not None:
+        old.stop()
+    job.timings['swap'] = time() - started
+
+    return predictor.get_model()
+
+
+def get_job_pool():
+    """
+    get the native thread pool running jobs, created on first use with JOB_THREADS threads
+
+    Returns:
+        ThreadPool: gevent thread pool
+    """
+
+    global job_pool  # pylint: disable=global-statement
+
+    if job_pool is None:
+        job_pool = ThreadPool(max(app.config.get('JOB_THREADS', JOB_THREADS), 1))
+
+    return job_pool
+
+
+def get_job_dict(job_id):
+    """
+    get a dictionary representation of a job, from the database so jobs run by other workers are found
+
+    Args:
+        job_id (str): job id
+
+    Returns:
+        dict: job attributes, see Job.to_dict
+    """
+
+    record = ModelJob.query.get(job_id)
+    if record is None:
+        raise JobNotFoundException(job_id)
+
+    return record.to_dict()
 
 
 def patch_predictor(model_id, **kwargs):
@@ -85,20 +552,23 @@ def patch_predictor(model_id, **kwargs):
         kwargs (dict): parsed args mapping to fields in model object to update
     """
 
-    if model_id not in predictors.keys():
-        raise ModelNotFoundException(model_id)
+    with model_lock(model_id=model_id):
+        if model_id not in predictors.keys():
+            raise ModelNotFoundException(model_id)
 
-    # stop old predictor after new one has been loaded
-    predictor = predictors.get(model_id)
-    model = get_model(model_id=model_id)
+        # stop old predictor after new one has been loaded, the old predictor keeps its model if loading fails
+        predictor = predictors.get(model_id)
+        model = get_model(model_id=model_id).clone()
 
-    # only reload model if the remote path has changed
-    reload_model = 'remote_path' in kwargs
-    for param, value in kwargs.iteritems():
-        setattr(model, param, value)
+        # only reload model if the remote path has changed
+        reload_model = 'remote_path' in kwargs
+        for param, value in kwargs.iteritems():
+            setattr(model, param, value)
 
-    create_predictor(model, load_model=reload_model)
-    predictor.stop()
+        create_predictor(model, load_model=reload_model)
+        invalidate_cache(model_id=model_id)
+        stop_hosts(model_id=model_id)
+        predictor.stop()
 
 
 def delete_predictor(model_id):
@@ -109,30 +579,173 @@ def delete_predictor(model_id):
         model_id (str): model id for predictor to delete
     """
 
-    if model_id not in predictors.keys():
-        raise ModelNotFoundException(model_id)
+    with model_lock(model_id=model_id):
+        if model_id not in predictors.keys():
+            raise ModelNotFoundException(model_id)
+
+        # remove model from list
+        predictor = predictors.pop(model_id)
+        batchers.pop(model_id, None)
+        caches.pop(model_id, None)
+        stop_hosts(model_id=model_id)
+        finish_prefetch(model_id=model_id)
+        model = predictor.get_model()
+
+        try:
+            predictor.stop()
+
+            # clean up local files (lazy paused models may not have been copied)
+            lazy = is_lazy(model)
+            if not lazy or os.path.exists(model.local_path):
+                app.logger.debug('removing file: {}'.format(model.local_path))
+                os.remove(model.local_path)
+
+            local_dir = os.path.dirname(model.local_path)
+            if not lazy or os.path.exists(local_dir):
+                app.logger.debug('removing dir: {}'.format(local_dir))
+                os.rmdir(local_dir)
+        except Exception as e:
+            raise ApiException(exception=e)
+        finally:
+            model = DeployedModel.query.filter_by(model_id=model_id).first()
+            if model:
+                db.session.delete(model)
+                db.session.commit()
+            notify_change(model_id=model_id)
+
+
+def start_prefetch(model):
+    """
+    copy the file of a lazy paused model in the background if PREFETCH_PAUSED is set and the file is not local yet.
+    the copy runs on a native thread, a model made active (or changed) in the meantime waits for it to finish
+
+    Args:
+        model (DeployedModel): model
+    """
+
+    if not is_lazy(model) or not app.config.get('PREFETCH_PAUSED', PREFETCH_PAUSED):
+        return
+    if os.path.isfile(model.local_path):
+        return
+
+    context = app._get_current_object().app_context  # pylint: disable=protected-access
+    task = spawn(in_context, context, prefetch, model.model_id, model.remote_path, model.timestamp)
+    prefetches[model.model_id] = task
 
-    # remove model from list
-    predictor = predictors.pop(model_id)
-    model = predictor.get_model()
+
+def prefetch(model_id, remote_path, version):
+    """
+    copy a model file ahead of the model being made active, errors are logged (the copy is retried on activation)
+
+    Args:
+        model_id (str): model id
+        remote_path (str): remote location of model file
+        version (int): model version (timestamp)
+    """
 
     try:
-        predictor.stop()
+        load_model_file(model_id=model_id, remote_path=remote_path, version=version)
+    except Exception as e:  # pylint: disable=broad-except
+        app.logger.error('could not prefetch model id: %s: %s', model_id, e)
 
-        # clean up local files
-        app.logger.debug('removing file: {}'.format(model.local_path))
-        os.remove(model.local_path)
 
-        local_dir = os.path.dirname(model.local_path)
-        app.logger.debug('removing dir: {}'.format(local_dir))
-        os.rmdir(local_dir)
-    except Exception as e:
-        raise ApiException(exception=e)
-    finally:
-        model = DeployedModel.query.filter_by(model_id=model_id).first()
-        if model:
-            db.session.delete(model)
-            db.session.commit()
+def finish_prefetch(model_id):
+    """
+    wait for a model file being prefetched to finish copying
+
+    Args:
+        model_id (str): model id
+    """
+
+    task = prefetches.pop(model_id, None)
+    if task is not None:
+        task.get()
+
+
+def notify_change(model_id):
+    """
+    call on_model_change (if set) after a model has changed
+
+    Args:
+        model_id (str): model id of changed model
+    """
+
+    if on_model_change is not None:
+        on_model_change(model_id)
+
+
+def sync_predictors():
+    """
+    bring predictors in line with the database after other processes have changed models.
+    models missing from the database are dropped, new or changed models are loaded from their local files (which
+    the process that changed them has already copied), and removed or replaced predictors are stopped
+    """
+
+    models = dict((model.model_id, model) for model in DeployedModel.query.all())
+
+    for model_id in predictors.keys():
+        if model_id not in models:
+            app.logger.debug('model id: %s removed by another process', model_id)
+            forget_predictor(model_id=model_id)
+
+    for model_id, model in models.iteritems():
+        old = predictors.get(model_id, None)
+        if old is not None and same_model(old.get_model(), model):
+            continue
+
+        app.logger.debug('model id: %s changed by another process, reloading', model_id)
+        try:
+            predictors[model_id] = make_predictor(model)
+        except Exception as e:
+            app.logger.error('could not load model id: %s changed by another process: %s', model_id, e)
+            continue
+
+        invalidate_cache(model_id=model_id)
+        stop_hosts(model_id=model_id)
+        if old is not None:
+            old.stop()
+
+
+def same_model(model, other):
+    """
+    compare two models, outputs are compared to the precision the database stores
+
+    Args:
+        model (DeployedModel): model
+        other (DeployedModel): model to compare with
+
+    Returns:
+        bool: True if all model attributes match
+    """
+
+    model = model.to_dict()
+    other = other.to_dict()
+    if sorted(model.keys()) != sorted(other.keys()):
+        return False
+
+    for key, value in model.iteritems():
+        if value == other[key]:
+            continue
+        if key != 'output' or value is None or other[key] is None or not precision_compare(other[key], value):
+            return False
+
+    return True
+
+
+def forget_predictor(model_id):
+    """
+    stop a predictor and remove it from management dictionary without touching its files or the database
+
+    Args:
+        model_id (str): model id for predictor to remove
+    """
+
+    predictor = predictors.pop(model_id)
+    batchers.pop(model_id, None)
+    caches.pop(model_id, None)
+    stop_hosts(model_id=model_id)
+    finish_prefetch(model_id=model_id)
+    predictor.stop()
 
 
 def get_model(model_id):
@@ -178,7 +791,9 @@ def get_model_dict(model_id):
 
 def predict(model_id, example):
     """
-    wrapper for predictor's predict method
+    wrapper for predictor's predict method, previous results are reused if caching is enabled for the model,
+    concurrent requests are batched together if enabled for the model and scored in the model's host processes if
+    enabled for the model
 
     Args:
         model_id (str): model id for predictor
@@ -188,22 +803,281 @@ def predict(model_id, example):
         array(float): prediction(s)
     """
 
+    check_active(model_id=model_id)
+
+    cache = get_cache(model_id=model_id)
+    if cache is None or isinstance(example, ndarray) or issparse(example):
+        return predict_uncached(model_id=model_id, example=example)
+
+    # only the examples not found in the cache are scored
+    predictor = predictors[model_id]
+    assert predictor.can_predict(example=example)
+
+    version = predictor.version
+    prediction = [cache.get(version, x) if isinstance(x, basestring) else None for x in example]
+    missing = [i for i, x in enumerate(prediction) if x is None]
+    if missing:
+        scored = predict_uncached(model_id=model_id, example=[example[i] for i in missing])
+        for i, value in zip(missing, scored):
+            prediction[i] = value
+            if isinstance(example[i], basestring):
+                cache.put(version, example[i], value)
+
+    return prediction
+
+
+def predict_uncached(model_id, example):
+    """
+    generate predictions with the predictor, through its batcher if batching is enabled for the model
+
+    Args:
+        model_id (str): model id for predictor
+        example (array(str)): example(s) for predictor to generate prediction(s)
+
+    Returns:
+        array(float): prediction(s)
+    """
+
+    # binary feature arrays are not queued, they are typically large batches already
+    batcher = get_batcher(model_id=model_id)
+    if batcher is None or isinstance(example, ndarray) or issparse(example):
+        return score(model_id=model_id, example=example)
+
+    return batcher.submit(example)
+
+
+def predict_many(model_ids, example):
+    """
+    generate predictions for the same example(s) from several predictors.
+    examples are parsed once for each group of predictors that parse them the same way (see parse_key), thread safe
+    predictors are scored concurrently in the thread pool while the others are scored in the calling greenlet.
+    predictors with host processes are sent the examples to score concurrently in their hosts
+
+    Args:
+        model_ids (array(str)): model ids for predictors
+        example (array(str)): example(s) for predictors to generate prediction(s)
+
+    Returns:
+        dict: prediction(s) by model id
+    """
+
+    for model_id in model_ids:
+        check_active(model_id=model_id)
+
+    parsed = dict()
+    pending = dict()
+    prediction = dict()
+    for model_id in model_ids:
+        predictor = predictors[model_id]
+
+        pool = get_hosts(model_id=model_id)
+        if pool is not None:
+            pending[model_id] = gevent.spawn(pool.predict, example)
+            continue
+
+        key = predictor.parse_key()
+        if key not in parsed:
+            assert predictor.can_predict(example=example)
+            parsed[key] = predictor.parse_examples(example)
+
+        if predictor.thread_safe:
+            pending[model_id] = spawn(predictor.predict_parsed, parsed[key])
+        else:
+            prediction[model_id] = predictor.predict_parsed(parsed[key])
+
+    for model_id, result in pending.iteritems():
+        prediction[model_id] = result.get()
+
+    return prediction
+
+
+def get_batcher(model_id):
+    """
+    get the micro-batcher that coalesces concurrent requests for a predictor.
+    the batching window (seconds) and size are set with PREDICT_BATCH_WINDOW and PREDICT_BATCH_SIZE and can be
+    overridden per model with --agent_batch_window and --agent_batch_size in extras, a window of 0 disables batching
+
+    Args:
+        model_id (str): model id for predictor
+
+    Returns:
+        MicroBatcher: batcher for the predictor, None if batching is disabled
+    """
+
+    predictor = predictors[model_id]
+    window = predictor.get_option('batch_window', app.config.get('PREDICT_BATCH_WINDOW', PREDICT_BATCH_WINDOW), float)
+    if window <= 0:
+        batchers.pop(model_id, None)
+        return None
+
+    size = predictor.get_option('batch_size', app.config.get('PREDICT_BATCH_SIZE', PREDICT_BATCH_SIZE), int)
+
+    batcher = batchers.get(model_id, None)
+    if batcher is None or batcher.window != window or batcher.max_size != size:
+        # batches flushed by the window timer are scored in a greenlet without an app context of its own
+        context = app._get_current_object().app_context  # pylint: disable=protected-access
+        batcher = MicroBatcher(predict=lambda example: in_context(context, score, model_id, example),
+                               window=window, max_size=size)
+        batchers[model_id] = batcher
+
+    return batcher
+
+
+def get_cache(model_id):
+    """
+    get the prediction cache for a predictor.
+    caching is disabled unless a maximum number of entries is set with PREDICT_CACHE_SIZE or --agent_cache_size in
+    extras, the byte limit and expiry time (seconds) are set with PREDICT_CACHE_BYTES and PREDICT_CACHE_TTL or
+    --agent_cache_bytes and --agent_cache_ttl, 0 means no limit
+
+    Args:
+        model_id (str): model id for predictor
+
+    Returns:
+        PredictionCache: cache for the predictor, None if caching is disabled
+    """
+
+    predictor = predictors[model_id]
+    size = predictor.get_option('cache_size', app.config.get('PREDICT_CACHE_SIZE', PREDICT_CACHE_SIZE), int)
+    if size <= 0:
+        caches.pop(model_id, None)
+        return None
+
+    max_bytes = predictor.get_option('cache_bytes', app.config.get('PREDICT_CACHE_BYTES', PREDICT_CACHE_BYTES), int)
+    ttl = predictor.get_option('cache_ttl', app.config.get('PREDICT_CACHE_TTL', PREDICT_CACHE_TTL), float)
+
+    cache = caches.get(model_id, None)
+    if cache is None or (cache.max_entries, cache.max_bytes, cache.ttl) != (size, max_bytes, ttl):
+        cache = PredictionCache(max_entries=size, max_bytes=max_bytes, ttl=ttl)
+        caches[model_id] = cache
+
+    return cache
+
+
+def get_hosts(model_id):
+    """
+    get the pool of host processes that score a predictor out of process (see hosts.py).
+    hosts are disabled unless a number of hosts is set with PREDICT_HOSTS or --agent_hosts in extras, the number of
+    batches queued per host and their maximum size in bytes are set with PREDICT_HOST_SLOTS and
+    PREDICT_HOST_SLOT_BYTES. hosts are forked on first use so they share the loaded predictor
+
+    Args:
+        model_id (str): model id for predictor
+
+    Returns:
+        HostPool: host processes for the predictor, None if hosts are disabled
+    """
+
+    predictor = predictors[model_id]
+    n_hosts = predictor.get_option('hosts', app.config.get('PREDICT_HOSTS', PREDICT_HOSTS), int)
+    if n_hosts <= 0:
+        stop_hosts(model_id=model_id)
+        return None
+
+    pool = hosts.get(model_id, None)
+    if pool is None or pool.predictor is not predictor or len(pool.hosts) != n_hosts:
+        stop_hosts(model_id=model_id)
+        pool = HostPool(predictor=predictor, n_hosts=n_hosts,
+                        slots=app.config.get('PREDICT_HOST_SLOTS', PREDICT_HOST_SLOTS),
+                        slot_bytes=app.config.get('PREDICT_HOST_SLOT_BYTES', PREDICT_HOST_SLOT_BYTES))
+        hosts[model_id] = pool
+
+    return pool
+
+
+def stop_hosts(model_id):
+    """
+    stop the host processes of a predictor, used whenever the predictor is replaced or removed
+
+    Args:
+        model_id (str): model id for predictor
+    """
+
+    pool = hosts.pop(model_id, None)
+    if pool is not None:
+        pool.stop()
+
+
+def invalidate_cache(model_id):
+    """
+    remove all cached predictions for a predictor, used whenever the predictor is replaced
+
+    Args:
+        model_id (str): model id for predictor
+    """
+
+    cache = caches.get(model_id, None)
+    if cache is not None:
+        cache.clear()
+
+
+def get_cache_stats(model_id):
+    """
+    get usage of the prediction cache for a predictor
+
+    Args:
+        model_id (str): model id for predictor
+
+    Returns:
+        dict: hits, misses, entries and bytes of the cache, None if caching is disabled
+    """
+
     if model_id not in predictors.keys():
         raise ModelNotFoundException(model_id)
-    if not predictors[model_id].is_active():
-        raise ModelNotActive(model_id)
+
+    cache = get_cache(model_id=model_id)
+
+    return cache.stats() if cache is not None else None
+
+
+def score(model_id, example):
+    """
+    generate predictions right away with the current predictor for a model, in its host processes if enabled (used
+    by batchers when a batch is ready)
+
+    Args:
+        model_id (str): model id for predictor
+        example (array(str)): example(s) for predictor to generate prediction(s)
+
+    Returns:
+        array(float): prediction(s)
+    """
+
+    check_active(model_id=model_id)
+
+    pool = get_hosts(model_id=model_id)
+    if pool is not None:
+        return pool.predict(example=example)
 
     return predictors[model_id].predict(example=example)
 
 
-def load_model_file(model_id, remote_path):
+def check_active(model_id):
     """
-    copy remote model file locally and provide the path of the local file
+    confirm a predictor exists and is active before using it
+
+    Args:
+        model_id (str): model id for predictor
+    """
+
+    if model_id not in predictors.keys():
+        raise ModelNotFoundException(model_id)
+    if not predictors[model_id].is_active():
+        raise ModelNotActive(model_id)
+
+
+def load_model_file(model_id, remote_path, version=None):
+    """
+    copy remote model file locally and provide the path of the local file.
+    the file is linked from the model store if the remote file has not changed since it was last copied (see
+    check_remote), or if it cannot be checked and it was copied for the same version. copied files are added to the
+    store
 
     Args:
         model_id (str): model id for predictor
         remote_path (str): remote location of model file to load 'protocol:///path/model.ext',
-            supported protocols are ['http', 'ftp', 'hdfs', 'local']
+            supported protocols are ['http', 'ftp', 'hdfs', 'local', 'scp']
+        version (int): model version (timestamp), files without a version that cannot be checked are always copied
 
     Returns:
         str: local path of model file loaded onto server
@@ -211,15 +1085,11 @@ def load_model_file(model_id, remote_path):
 
     app.logger.debug('loading model id: %s from %s', model_id, remote_path)
 
-    if model_id is None:
-        raise ApiException(name='Invalid Input', message='missing model id')
-    if remote_path is None:
-        raise ApiException(name='Invalid Input', message='missing remote path: {}')
+    local_path = get_local_path(model_id=model_id, remote_path=remote_path)
 
     # create model dir if needed
     created_dir = False
-    model_base_dir = app.config.get('MODEL_DIR', MODEL_DIR)
-    model_dir = '{dir}/{sub}'.format(dir=model_base_dir, sub=model_id)
+    model_dir = os.path.dirname(local_path)
     if not os.path.isdir(model_dir):
         app.logger.debug('creating model dir: %s', model_dir)
         os.makedirs(model_dir)
@@ -227,49 +1097,34 @@ def load_model_file(model_id, remote_path):
 
     app.logger.debug('using model dir: %s', model_dir)
 
-    # remove file if exists
-    renamed_file = None
-    local_path = '{dir}/{file}'.format(dir=model_dir, file=os.path.basename(remote_path))
-    tmp_local_path = None
-    if os.path.isfile(local_path):
-        app.logger.debug('removing existing model file: %s', local_path)
-        tmp_local_path = '{}.tmp'.format(local_path)
-        os.rename(local_path, tmp_local_path)
-        renamed_file = tmp_local_path
-
-    # copy model from remote path to local path
+    # copy model from remote path to local path, the file is replaced once copied (see transfers.py)
     try:
-        if '://' not in remote_path:
-            raise Exception('invalid remote path, expected [hdfs|http|ftp|local]://remote_dir/filename.ext')
-
-        remote_info = remote_path.split('://')
-        if remote_info[0] == 'hdfs':
-            hadoop = app.config['HADOOP']
-            cmd = '{hadoop} fs -copyToLocal {src} {dest}'.format(hadoop=hadoop, src=remote_info[1], dest=local_path)
-        elif remote_info[0] == 'http' or remote_info[0] == 'ftp':
-            cmd = 'wget -q {src} -O {dest}'.format(src=remote_info[1], dest=local_path)
-        elif remote_info[0] == 'local':
-            cmd = 'cp {src} {dest}'.format(src=remote_info[1], dest=local_path)
-        elif remote_info[0] == 'scp':
-            cmd = 'scp {src} {dest}'.format(src=remote_info[1], dest=local_path)
+        transfer = get_transfer(remote_path=remote_path)
+        model_store = get_store()
+
+        # an unchanged remote file is not copied again, if it cannot be checked the file copied for the same version is
+        key = None if version is None else '{remote}#{version}'.format(remote=remote_path, version=version)
+        stored, remote = check_remote(transfer=transfer, remote_path=remote_path)
+        if remote is None and key is not None and model_store is not None:
+            stored = model_store.lookup(key)
+
+        if stored is not None:
+            app.logger.debug('linking stored file: %s', stored)
+            link(stored, local_path)
+            digest = os.path.basename(stored)
         else:
-            msg = 'unknown transfer protocol {}, expected one of [hdfs|http|ftp|local]'
-            raise Exception(msg.format(remote_info[0]))
-
-        run_process(command=cmd, logger=app.logger)
+            digest = transfer.fetch(local_path=local_path)
 
         # confirm local path is valid and file was copied locally
         if not local_path or not os.path.isfile(local_path):
             raise Exception('local path not found')
 
-        if renamed_file is not None:
-            os.remove(tmp_local_path)
+        if model_store is not None:
+            store_file(local_path=local_path, key=key, digest=digest, remote_path=remote_path, remote=remote)
     except Exception as e:
         # if we made a mess clean it up
-        if renamed_file is not None:
-            os.rename(tmp_local_path, local_path)
         if created_dir:
-            os.rmdir(model_dir)
+            shutil.rmtree(model_dir, ignore_errors=True)
 
         message = '{err} - copying remote path: {remote} to local path: {local}'
         raise ApiException(name='Invalid Input', message=message.format(err=e, remote=remote_path, local=local_path))
@@ -279,29 +1134,366 @@ def load_model_file(model_id, remote_path):
     return local_path
 
 
+def get_store():
+    """
+    get the store of copied model files, created on first use (None if STORE_DIR is not set)
+
+    Returns:
+        ModelStore: model store
+    """
+
+    global store  # pylint: disable=global-statement
+
+    directory = app.config.get('STORE_DIR', STORE_DIR)
+    if directory is None:
+        return None
+
+    if store is None or store.directory != directory:
+        store = ModelStore(directory=directory, max_bytes=app.config.get('STORE_BYTES', STORE_BYTES),
+                           on_evict=evict_weights, in_use=stored_in_use)
+
+    return store
+
+
+def stored_in_use(digest):
+    """
+    check if a model of this process or of the database has a model file with the contents of a stored file. model
+    files are copies of the stored files when the store is on another file system, so links cannot tell
+
+    Args:
+        digest (str): sha1 of the stored file
+
+    Returns:
+        bool: True if a model file has the same contents
+    """
+
+    try:
+        size = os.path.getsize(get_store().object_path(digest))
+    except OSError:
+        return False
+
+    local_paths = set(predictor.get_model().local_path for predictor in predictors.values())
+    local_paths.update(model.local_path for model in DeployedModel.query.all())
+    for path in local_paths:
+        try:
+            # only files of the same size are hashed
+            if os.path.getsize(path) == size and file_sha1(path) == digest:
+                return True
+        except (IOError, OSError):
+            # lazy models that are not copied yet
+            continue
+
+    return False
+
+
+def evict_weights(digest):
+    """
+    remove the sidecar of a model file removed from the store (see weights.py)
+
+    Args:
+        digest (str): sha1 of the model file
+    """
+
+    weights_dir = app.config.get('WEIGHTS_DIR', None)
+    if weights_dir is not None:
+        remove_weights(weights_dir=weights_dir, digest=digest)
+
+
+def prune_weights_dir():
+    """
+    remove sidecars (see weights.py) of model files that are no longer in the store, or without a store of model
+    files that no model in the database uses
+    """
+
+    weights_dir = app.config.get('WEIGHTS_DIR', None)
+    if weights_dir is None:
+        return
+
+    model_store = get_store()
+    if model_store is not None:
+        digests = model_store.digests()
+    else:
+        local_paths = [model.local_path for model in DeployedModel.query.all()]
+        digests = set(file_sha1(path) for path in local_paths if path and os.path.isfile(path))
+
+    prune_weights(weights_dir=weights_dir, digests=digests)
+
+
+def store_file(local_path, key, digest=None, remote_path=None, remote=None):
+    """
+    add a copied model file to the model store, errors are logged (the model file can be used without the store)
+
+    Args:
+        local_path (str): local path of model file
+        key (str): store key of the file, None to only store its contents
+        digest (str): sha1 of the file if known
+        remote_path (str): remote path the file was copied from
+        remote (dict): metadata of the remote file to record (see check_remote), None to record nothing
+    """
+
+    try:
+        stored = get_store().add(path=local_path, key=key, digest=digest)
+        if remote is not None:
+            get_store().record(remote_path=remote_path, metadata=dict(remote, sha1=os.path.basename(stored)))
+    except Exception as e:  # pylint: disable=broad-except
+        app.logger.error('could not store model file %s: %s', local_path, e)
+
+
+def get_transfer(remote_path):
+    """
+    build the transfer copying a remote model file (see transfers.py)
+
+    Args:
+        remote_path (str): remote location of model file
+
+    Returns:
+        BaseTransfer Child: transfer
+    """
+
+    return make_transfer(remote_path=remote_path,
+                         chunk_bytes=app.config.get('TRANSFER_CHUNK_BYTES', TRANSFER_CHUNK_BYTES),
+                         retries=app.config.get('TRANSFER_RETRIES', TRANSFER_RETRIES),
+                         timeout=app.config.get('TRANSFER_TIMEOUT', TRANSFER_TIMEOUT),
+                         webhdfs=app.config.get('WEBHDFS_URL', WEBHDFS_URL),
+                         user=app.config.get('WEBHDFS_USER', WEBHDFS_USER),
+                         parts=app.config.get('WEBHDFS_PARTS', WEBHDFS_PARTS),
+                         hadoop=app.config.get('HADOOP'))
+
+
+def check_remote(transfer, remote_path):
+    """
+    check if a remote file is unchanged since it was last copied into the model store, from its size, modification
+    time and etag (http conditional HEAD request, hdfs file status or local stat). errors are logged and the file is
+    taken as changed
+
+    Args:
+        transfer (BaseTransfer): transfer of the remote file
+        remote_path (str): remote location of model file
+
+    Returns:
+        tuple: stored copy of the file (None if it changed, or its copy is not stored) and its current metadata (None
+            if unknown)
+    """
+
+    model_store = get_store()
+    if model_store is None:
+        return None, None
+
+    previous = model_store.remote(remote_path)
+    try:
+        remote = transfer.stat(previous=previous)
+    except Exception as e:  # pylint: disable=broad-except
+        app.logger.debug('could not get metadata of remote path %s: %s', remote_path, e)
+        return None, None
+
+    if not same_remote(previous, remote):
+        return None, remote
+
+    return model_store.get(previous['sha1']), remote
+
+
+def get_local_path(model_id, remote_path):
+    """
+    provide the local path a remote model file is copied to
+
+    Args:
+        model_id (str): model id for predictor
+        remote_path (str): remote location of model file
+
+    Returns:
+        str: local path of model file
+    """
+
+    if model_id is None:
+        raise ApiException(name='Invalid Input', message='missing model id')
+    if remote_path is None:
+        raise ApiException(name='Invalid Input', message='missing remote path: {}')
+
+    model_base_dir = app.config.get('MODEL_DIR', MODEL_DIR)
+
+    return '{dir}/{sub}/{file}'.format(dir=model_base_dir, sub=model_id, file=os.path.basename(remote_path))
+
+
 def create_predictors():
     """
     create all predictors in database, this will overwrite any
-    predictors in the management dictionary with the same model id
+    predictors in the management dictionary with the same model id.
+    models are downloaded and loaded concurrently on native threads, at most STARTUP_DOWNLOADS downloads and
+    STARTUP_LOADS loads at a time. a model that fails to load is logged and left out, and the models loaded are
+    stored in the database together at the end
+
+    Returns:
+        list(dict): startup report, see start_predictor
+    """
+
+    global startup_report  # pylint: disable=global-statement
+
+    n_downloads = max(app.config.get('STARTUP_DOWNLOADS', STARTUP_DOWNLOADS), 1)
+    n_loads = max(app.config.get('STARTUP_LOADS', STARTUP_LOADS), 1)
+    pool = ThreadPool(n_downloads + n_loads)
+    limits = Semaphore(n_downloads), Semaphore(n_loads)
+
+    # greenlets and threads have no app context of their own
+    context = app._get_current_object().app_context  # pylint: disable=protected-access
+
+    start = time()
+    models = DeployedModel.query.all()
+    try:
+        tasks = [gevent.spawn(start_predictor, pool, limits, context, model, is_lazy(model)) for model in models]
+        gevent.joinall(tasks)
+    finally:
+        pool.kill()
+
+    startup_report = [task.value for task in tasks]
+    for model, report in zip(models, startup_report):
+        predictor = report.pop('predictor')
+        if predictor is None:
+            continue
+
+        model.local_path = predictor.get_model().local_path
+        old = predictors.get(model.model_id, None)
+        predictors[model.model_id] = predictor
+        invalidate_cache(model_id=model.model_id)
+        stop_hosts(model_id=model.model_id)
+        if old is not None:
+            old.stop()
+    db.session.commit()
+
+    for model in models:
+        if model.model_id in predictors:
+            start_prefetch(model=model)
+
+    for report in startup_report:
+        if report['error'] is None and report['paused']:
+            app.logger.info('startup: model id: %s registered paused', report['model_id'])
+        elif report['error'] is None:
+            app.logger.info('startup: model id: %s loaded in %.2fs (download %.2fs, load %.2fs, waiting %.2fs)',
+                            report['model_id'], report['total'], report['download'], report['load'], report['wait'])
+        else:
+            app.logger.error('startup: model id: %s failed after %.2fs: %s', report['model_id'], report['total'],
+                             report['error'])
+
+    loaded = sum(1 for report in startup_report if report['error'] is None)
+    app.logger.info('startup: loaded %d of %d models in %.2fs', loaded, len(startup_report), time() - start)
+
+    return startup_report
+
+
+def start_predictor(pool, limits, context, model, lazy=False):
+    """
+    download and load one model at startup on the given thread pool (lazy models are only registered), errors are
+    caught and reported
+
+    Args:
+        pool (ThreadPool): thread pool to run downloads and loads in
+        limits ((Semaphore, Semaphore)): semaphores limiting concurrent downloads and loads
+        context (function): function returning an app context for the threads
+        model (DeployedModel): model to load
+        lazy (bool): True if the model is not loaded (see predictor_factory.is_lazy)
+
+    Returns:
+        dict: model_id, predictor (None if loading failed), error (None if loading succeeded), paused (True if the
+            model was only registered), and download, load, wait (for a download or load slot) and total seconds
     """
 
-    map(create_predictor, DeployedModel.query.all())
+    report = dict(model_id=model.model_id, predictor=None, error=None, paused=lazy, download=0., load=0., wait=0.,
+                  total=0.)
+    downloads, loads = limits
+
+    start = time()
+    try:
+        if lazy:
+            model = model.clone()
+            model.local_path = in_context(context, get_local_path, model.model_id, model.remote_path)
+            report['predictor'] = in_context(context, make_predictor, model)
+            return report
+
+        with downloads:
+            report['wait'] += time() - start
+            started = time()
+            local_path = spawn_on(pool, in_context, context, load_model_file, model.model_id, model.remote_path,
+                                  model.timestamp).get()
+            report['download'] = time() - started
+
+        # predictors load a copy of the model, the database model is only changed once all models are loaded
+        model = model.clone()
+        model.local_path = local_path
+
+        started = time()
+        with loads:
+            report['wait'] += time() - started
+            started = time()
+            report['predictor'] = spawn_on(pool, in_context, context, make_predictor, model).get()
+            report['load'] = time() - started
+    except Exception as e:  # pylint: disable=broad-except
+        report['error'] = str(e)
+
+    report['total'] = time() - start
+
+    return report
+
+
+def in_context(context, function, *args):
+    """
+    call function(*args) inside an app context, used to run management functions on native threads
+
+    Args:
+        context (function): function returning an app context
+        function (function): function to run
+        args (list): arguments for function
+
+    Returns:
+        object: function value
+    """
+
+    with context():
+        return function(*args)
 
 
 def reload_predictor(model_id):
     """
-    reload a predictor already existing in the management dictionary
+    reload a predictor already existing in the management dictionary, a loaded model whose remote file has not
+    changed since it was copied is kept as it is
 
     Args:
         model_id (str): model id of predictor to reload
     """
 
-    update_predictor(model=get_model(model_id=model_id))
+    model = get_model(model_id=model_id)
+    if not is_lazy(model) and same_file(model):
+        app.logger.debug('model id: %s unchanged, not reloading', model_id)
+        return
+
+    update_predictor(model=model)
+
+
+def same_file(model):
+    """
+    check if the local file of a model is the stored copy of its unchanged remote file (see check_remote)
+
+    Args:
+        model (DeployedModel): model
+
+    Returns:
+        bool: True if the local file is current
+    """
+
+    if not model.local_path or not os.path.isfile(model.local_path):
+        return False
+
+    try:
+        transfer = get_transfer(remote_path=model.remote_path)
+    except Exception:  # pylint: disable=broad-except
+        return False
+
+    stored, _ = check_remote(transfer=transfer, remote_path=model.remote_path)
+
+    return stored is not None and os.path.samefile(stored, model.local_path)
 
 
 def reload_predictors():
     """
-    reload all predictors in management dictionary
+    reload all predictors in management dictionary, only models whose remote files changed are copied and loaded
     """
 
     map(reload_predictor, predictors.keys())
@@ -320,16 +1512,87 @@ def clear_model_dir():
         app.logger.error('could not clear model directory %s', app.config['MODEL_DIR'])
 
 
+def prune_model_dir():
+    """
+    remove files from the model directory that do not belong to a model in the database.
+    the files of models in the database are kept, they link to the model store and are replaced when the models load
+    """
+
+    model_dir = app.config.get('MODEL_DIR', MODEL_DIR)
+    if not os.path.isdir(model_dir):
+        return
+
+    local_paths = dict((str(model.model_id), model.local_path) for model in DeployedModel.query.all())
+    for name in os.listdir(model_dir):
+        path = os.path.join(model_dir, name)
+        try:
+            if name not in local_paths or not os.path.isdir(path):
+                app.logger.debug('removing unused model path: %s', path)
+                if os.path.isdir(path):
+                    shutil.rmtree(path)
+                else:
+                    os.remove(path)
+                continue
+
+            for filename in os.listdir(path):
+                if os.path.join(path, filename) != local_paths[name]:
+                    app.logger.debug('removing unused model file: %s', os.path.join(path, filename))
+                    os.remove(os.path.join(path, filename))
+        except Exception as e:  # pylint: disable=broad-except
+            app.logger.error('could not prune model path %s: %s', path, e)
+
+
 def startup():
     """ start management layer """
 
-    clear_model_dir()
+    get_threadpool()
+    get_store()
+    prune_model_dir()
+    prune_weights_dir()
+    # the jobs table is added to databases created before background jobs
+    ModelJob.__table__.create(bind=db.engine, checkfirst=True)
+    fail_orphan_jobs()
     create_predictors()
 
 
+def start_worker():
+    """
+    start management layer in a worker process forked after startup.
+    the worker needs its own database connections and threads, and catches up with model changes made since the
+    fork (workers that are restarted are forked from the original state)
+    """
+
+    db.engine.dispose()
+    reset_threadpool()
+    get_threadpool()
+    # batch timers, host processes and prefetches belong to the parent, cached predictions are kept per process
+    batchers.clear()
+    caches.clear()
+    hosts.clear()
+    prefetches.clear()
+    job_locks.clear()
+    reset_job_pool()
+    # connections kept by the parent must not be shared
+    clear_pools()
+    sync_predictors()
+    # a worker replacing one that died releases the models its jobs reserved
+    fail_orphan_jobs()
+
+
+def reset_job_pool():
+    """
+    forget the job thread pool, used in forked processes where the threads of the parent's pool do not exist
+    """
+
+    global job_pool  # pylint: disable=global-statement
+
+    job_pool = None
+
+
 def shutdown():
     """
     delete all predictors in management dictionary
     """
 
     map(delete_predictor, predictors.keys())
+    clear_pools()
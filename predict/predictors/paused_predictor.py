@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""
+Paused predictor implementation\n
+Stands in for a paused model that has not been loaded, it only holds the model metadata. The model file is copied and
+the model loaded and verified when the model is made active (see predictor_factory.is_lazy)
+"""
+
+from predict.predictors.base_predictor import BasePredictor
+
+
+class PausedPredictor(BasePredictor):
+    """
+    Concrete class holding a paused model without loading it, it never predicts
+    """
+
+    def __init__(self, model):
+        """
+        init for paused predictor, calls BasePredictor init but does not load the model
+
+        Args:
+            model (DeployedModel): paused model
+
+        Returns:
+            PausedPredictor: PausedPredictor object
+        """
+
+        super(self.__class__, self).__init__(model=model)
+
+        self.model_type = model.model_type
+
+    def stop(self):
+        """
+        nothing is loaded, nothing to stop
+        """
+
+        self.process = None
+
+    def predict(self, example):
+        """
+        paused models cannot predict
+
+        Args:
+            example (arraylike(str)): example feature vector(s)
+        """
+
+        assert self.can_predict(example=example)
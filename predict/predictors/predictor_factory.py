@@ -6,13 +6,17 @@ Factory for building predictors
 from flask import current_app as app
 from predict.predictors.vw_predictor import VWPredictor
 from predict.predictors.sklearn_predictor import SKLearnPredictor
+from predict.predictors.paused_predictor import PausedPredictor
 from predict.exceptions import ApiException
-from predict.enums import ModelType
+from predict.enums import ModelType, ModelStatus
+
+
+LAZY_PAUSED = False
 
 
 def make_predictor(model):
     """
-    Factory to build predictor based on model type provided
+    Factory to build predictor based on model type provided, paused models are not loaded if lazy (see is_lazy)
 
     Args:
         model (DeployedModel): model to use when instantiating a predictor
@@ -23,9 +27,27 @@ def make_predictor(model):
 
     verify = False if model.example == '' else True
 
-    if model.model_type == ModelType.vw:
+    if model.model_type not in ModelType.values():
+        raise ApiException(name='Invalid Input', message='unknown model type: {type}'.format(type=model.model_type))
+
+    if is_lazy(model):
+        return PausedPredictor(model=model)
+    elif model.model_type == ModelType.vw:
         return VWPredictor(model=model, verify_on_load=verify)
-    elif model.model_type == ModelType.sklearn:
-        return SKLearnPredictor(model=model, sep=app.config.get('SKLEARN_SEPARATOR', None), verify_on_load=verify)
     else:
-        raise ApiException(name='Invalid Input', message='unknown model type: {type}'.format(type=model.model_type))
+        return SKLearnPredictor(model=model, sep=app.config.get('SKLEARN_SEPARATOR', None),
+                                weights_dir=app.config.get('WEIGHTS_DIR', None), verify_on_load=verify)
+
+
+def is_lazy(model):
+    """
+    check if a model is only registered without being loaded, paused models are when LAZY_PAUSED is set
+
+    Args:
+        model (DeployedModel): model
+
+    Returns:
+        bool: True if the model is not loaded
+    """
+
+    return model.status != ModelStatus.active and app.config.get('LAZY_PAUSED', LAZY_PAUSED)
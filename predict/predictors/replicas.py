@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""
+Replica pools for models that are not thread safe\n
+A replica pool holds several independent processes loaded from the same model file. Each request is scored by the
+least busy replica on a native thread (see threads.py), requests for a replica that is already scoring wait for it
+so a process is never used by two threads at once
+"""
+
+from gevent.lock import Semaphore
+from predict.predictors.threads import spawn
+
+
+class ReplicaPool(object):
+    """
+    Dispatches work across replicas of a model process
+
+    Attributes:
+        processes (list): model processes
+        busy (list(int)): number of requests scoring on or waiting for each process
+    """
+
+    def __init__(self, processes):
+        """
+        init for replica pool
+
+        Args:
+            processes (list): model processes, loaded from the same model file
+
+        Returns:
+            ReplicaPool: ReplicaPool object
+        """
+
+        self.processes = processes
+        self.busy = [0] * len(processes)
+        self.locks = [Semaphore() for _ in processes]
+
+    def run(self, function, *args):
+        """
+        run function(process, *args) with the least busy process on a native thread, the calling greenlet waits for
+        the result without blocking the gevent loop
+
+        Args:
+            function (function): work to run, given a process as its first argument
+            args (list): other arguments for function
+
+        Returns:
+            object: function result
+        """
+
+        i = min(range(len(self.processes)), key=self.busy.__getitem__)
+
+        self.busy[i] += 1
+        try:
+            with self.locks[i]:
+                return spawn(function, self.processes[i], *args).get()
+        finally:
+            self.busy[i] -= 1
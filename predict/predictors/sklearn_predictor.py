@@ -2,16 +2,34 @@
 """
 Scikit-learn predictor implementation\n
 Models are expected to be implementations of a scikit-learn linear model and must support calling predict(X=example)\n
-http://scikit-learn.org/stable/modules/classes.html#module-sklearn.linear_model
+http://scikit-learn.org/stable/modules/classes.html#module-sklearn.linear_model\n
+Examples are dense separator delimited strings by default. Examples written as space separated index:value pairs (or
+binary scipy sparse matrices) are sparse, the batch is assembled into one CSR matrix so models with many mostly zero
+features are scored without building dense arrays\n
+Linear models, and pipelines of feature scalers followed by a linear model, are compiled at load into one coefficient
+vector and intercept (see compile_linear) so scoring is a single matrix product without scikit-learn's per call input
+checks. The compiled scorer is only used if it matches the model's own predictions\n
+Given a weights directory, model arrays are memory-mapped from a sidecar of the model file (see weights) and shared
+by every process loading the same file
 """
 
 from predict.predictors.base_predictor import BasePredictor
+from predict.predictors.weights import load_model
+from scipy.sparse import csr_matrix, issparse
+from sklearn.base import ClassifierMixin
+from sklearn.linear_model.base import LinearModel
+from sklearn.linear_model.stochastic_gradient import BaseSGDRegressor
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import MinMaxScaler, StandardScaler
 import numpy as np
 import pickle
 
 
 SKLEARN_SEPARATOR = ','
 
+# number of random examples compared (with the model's example) before a compiled scorer is used
+PARITY_EXAMPLES = 8
+
 
 class SKLearnPredictor(BasePredictor):
     """
@@ -19,17 +37,26 @@ class SKLearnPredictor(BasePredictor):
 
     Attributes:
         sep (str): separator character to use when parsing the feature example strings
+        linear ((ndarray, ndarray)): compiled coefficients and intercept, None if the model is scored by scikit-learn
+        weights_dir (str): directory of memory-mapped model sidecars, None to load private copies of the model
     """
 
     sep = None
+    weights_dir = None
+    n_features = None
+    linear = None
+
+    # scoring only reads the fitted model
+    thread_safe = True
 
-    def __init__(self, model, sep=None, verify_on_load=True):
+    def __init__(self, model, sep=None, weights_dir=None, verify_on_load=True):
         """
         init for scikit-learn predictor, calls BasePredictor init then fills in specific attributes and loads model
 
         Args:
             model (DeployedModel): model to use for instantiating predictor
             sep (str): separator character to use when parsing the feature example strings
+            weights_dir (str): directory of memory-mapped model sidecars, None to load private copies of the model
 
         Returns:
             SKLearnPredictor: SKLearnPredictor object
@@ -39,6 +66,9 @@ class SKLearnPredictor(BasePredictor):
 
         self.sep = sep or SKLEARN_SEPARATOR
         self.model_type = 'sklearn'
+        self.n_features = None
+        self.linear = None
+        self.weights_dir = weights_dir if self.get_option('mmap', True, bool) else None
 
         self.load(verify_on_load=verify_on_load)
 
@@ -46,14 +76,25 @@ class SKLearnPredictor(BasePredictor):
         """
         loads model file into memory if status is active
         model files are expected to be a pickled object of type sklearn.linear_model
-        see http://scikit-learn.org/stable/modules/model_persistence.html
+        see http://scikit-learn.org/stable/modules/model_persistence.html\n
+        model arrays are memory-mapped if the predictor has a weights directory, unless --agent_mmap=false is set
+        linear models are compiled unless --agent_compile=false is set in extras
         """
 
         try:
-            self.process = pickle.load(open(self.model.local_path, 'rb'))
+            if self.weights_dir is not None:
+                self.process = load_model(self.model.local_path, self.weights_dir)
+            else:
+                self.process = pickle.load(open(self.model.local_path, 'rb'))
         except Exception as e:
             raise Exception('could not load model file: {}'.format(e))
 
+        self.n_features = get_n_features(self.process)
+
+        self.linear = compile_linear(self.process) if self.get_option('compile', True, bool) else None
+        if self.linear is not None and not self.check_linear():
+            self.linear = None
+
         super(self.__class__, self).load(verify_on_load=verify_on_load)
 
     def stop(self):
@@ -62,6 +103,8 @@ class SKLearnPredictor(BasePredictor):
         """
 
         self.process = None
+        self.n_features = None
+        self.linear = None
 
     def predict(self, example):
         """
@@ -69,7 +112,7 @@ class SKLearnPredictor(BasePredictor):
         see http://scikit-learn.org/stable/modules/classes.html#module-sklearn.linear_model
 
         Args:
-            example (arraylike(str)): example feature vector(s)
+            example (arraylike(str) or ndarray(float) or spmatrix): example feature vector(s)
 
         Returns:
             arraylike(float) prediction(s)
@@ -78,10 +121,252 @@ class SKLearnPredictor(BasePredictor):
         assert self.can_predict(example=example)
 
         try:
-            # convert array of strings to numpy array of arrays (of floats)
-            example = [np.fromstring(x, sep=self.sep) for x in example]
+            features = self.parse_examples(example)
+        except Exception as e:
+            raise Exception('prediction failed: {err} on example {ex}.'.format(err=e, ex=example))
+
+        return self.predict_parsed(features)
+
+    def predict_parsed(self, example):
+        """
+        provide prediction from features already parsed by parse_examples
+
+        Args:
+            example (ndarray(float) or csr_matrix): 2-d array of features
+
+        Returns:
+            arraylike(float) prediction(s)
+        """
+
+        try:
+            if self.linear is not None:
+                coef, intercept = self.linear
+                return example.dot(coef) + intercept
+
             prediction = self.process.predict(X=example)
         except Exception as e:
             raise Exception('prediction failed: {err} on example {ex}.'.format(err=e, ex=example))
 
         return prediction
+
+    def check_linear(self):
+        """
+        confirm the compiled scorer matches the model on the model's example and PARITY_EXAMPLES random examples
+
+        Returns:
+            bool: True if all predictions match
+        """
+
+        coef, intercept = self.linear
+        try:
+            features = self.parse_examples([self.model.example])
+        except Exception:  # pylint: disable=broad-except
+            return False
+
+        if issparse(features):
+            features = features.toarray()
+        features = np.vstack([features, np.random.RandomState(0).randn(PARITY_EXAMPLES, coef.shape[0])])
+
+        expected = np.asarray(self.process.predict(X=features), dtype=np.float64)
+        compiled = features.dot(coef) + intercept
+        scale = max(1.0, np.abs(expected).max())
+
+        return compiled.shape == expected.shape and np.allclose(compiled, expected, rtol=1e-9, atol=1e-9 * scale)
+
+    def parse_key(self):
+        """
+        sklearn predictors share parsed examples if they use the same separator and number of features
+
+        Returns:
+            tuple: (model type, separator, number of features)
+        """
+
+        return self.model_type, self.sep, self.n_features
+
+    def parse_examples(self, example):
+        """
+        convert separator delimited feature strings into one contiguous 2-d array of floats.
+        all strings are joined and parsed with a single call, so the array is allocated once at its final size and
+        reshaped in place instead of being assembled row by row. if any string contains index:value pairs the batch is
+        sparse (see parse_sparse)
+
+        Args:
+            example (arraylike(str) or ndarray(float) or spmatrix): example feature vector(s), a float array or sparse
+                matrix is used as is
+
+        Returns:
+            ndarray or csr_matrix: array of floats with shape (number of examples, number of features)
+        """
+
+        if isinstance(example, np.ndarray) and example.dtype.kind == 'f':
+            return self.check_features(example)
+        if issparse(example):
+            return self.check_features(example.tocsr())
+
+        example = list(example)
+        if not all(isinstance(x, basestring) for x in example):
+            raise Exception('invalid input: expected feature strings')
+
+        if any(':' in x for x in example):
+            return self.parse_sparse(example)
+
+        n_rows = len(example)
+        n_features = self.n_features or np.fromstring(example[0], sep=self.sep).size
+
+        # count separators in each row as well, otherwise a short row can be hidden by a long one in the batch total
+        if self.sep.strip() and any(x.count(self.sep) != n_features - 1 for x in example):
+            raise Exception('invalid input: expected {} features per example'.format(n_features))
+
+        features = np.fromstring(self.sep.join(example), sep=self.sep)
+        if features.size != n_rows * n_features:
+            raise Exception('invalid input: expected {} features per example'.format(n_features))
+
+        return features.reshape(n_rows, n_features)
+
+    def parse_sparse(self, example):
+        """
+        convert sparse feature strings of space separated index:value pairs (indices start at 0, an empty string is
+        all zeros) into one CSR matrix. all strings are joined and parsed with a single call, so parse time and memory
+        scale with the number of pairs rather than the number of features
+
+        Args:
+            example (list(str)): sparse example feature vector(s)
+
+        Returns:
+            csr_matrix: sparse matrix of floats with shape (number of examples, number of features)
+        """
+
+        if not self.n_features:
+            raise Exception('invalid input: sparse examples need a model with a known number of features')
+
+        counts = [x.count(':') for x in example]
+        if any(len(x.split()) != n for x, n in zip(example, counts)):
+            raise Exception('invalid input: expected space separated index:value pairs')
+
+        indptr = np.zeros(len(example) + 1, dtype=np.int64)
+        np.cumsum(counts, out=indptr[1:])
+
+        pairs = np.fromstring(' '.join(example).replace(':', ' '), sep=' ')
+        if pairs.size != 2 * indptr[-1]:
+            raise Exception('invalid input: expected space separated index:value pairs')
+
+        indices = pairs[0::2].astype(np.int32)
+        if (indices != pairs[0::2]).any() or (indices < 0).any() or (indices >= self.n_features).any():
+            raise Exception('invalid input: expected feature indices from 0 to {}'.format(self.n_features - 1))
+
+        return csr_matrix((pairs[1::2].copy(), indices, indptr), shape=(len(example), self.n_features))
+
+    def check_features(self, features):
+        """
+        confirm an array of floats (e.g. from a binary request) has the shape expected by the model
+
+        Args:
+            features (ndarray(float) or csr_matrix): 1-d array for one example or 2-d array of examples
+
+        Returns:
+            ndarray or csr_matrix: 2-d array of features
+        """
+
+        if features.ndim == 1:
+            features = features.reshape(1, -1)
+
+        if features.ndim != 2 or (self.n_features and features.shape[1] != self.n_features):
+            raise Exception('invalid input: expected {} features per example'.format(self.n_features))
+
+        return features
+
+
+def get_n_features(process):
+    """
+    find the number of input features expected by a scikit-learn model (or the first step of a pipeline)
+
+    Args:
+        process (object): scikit-learn model
+
+    Returns:
+        int: number of features, None if it cannot be determined from the model
+    """
+
+    steps = getattr(process, 'steps', None)
+    if steps:
+        return get_n_features(steps[0][1])
+
+    for attr in ['coef_', 'mean_', 'scale_', 'std_']:
+        value = getattr(process, attr, None)
+        if value is not None:
+            return np.shape(value)[-1]
+
+    return None
+
+
+def compile_linear(process):
+    """
+    fold a linear regression model, or a pipeline of feature scalers followed by one, into a single coefficient
+    vector (or matrix for several targets) and intercept. scalers are affine, x * scale + shift, so for coefficients w
+    and intercept b the model is x * (scale * w) + (shift . w + b)
+
+    Args:
+        process (object): scikit-learn model
+
+    Returns:
+        (ndarray, ndarray): coefficients with one row per feature and intercept, None if the model is not linear
+    """
+
+    steps = [step for _, step in process.steps] if isinstance(process, Pipeline) else [process]
+
+    model = steps[-1]
+    if not isinstance(model, (LinearModel, BaseSGDRegressor)) or isinstance(model, ClassifierMixin):
+        return None
+
+    coef = np.asarray(model.coef_, dtype=np.float64).T
+    intercept = np.asarray(model.intercept_, dtype=np.float64)
+    n_features = coef.shape[0]
+
+    scale = np.ones(n_features)
+    shift = np.zeros(n_features)
+    for step in steps[:-1]:
+        affine = get_affine(step, n_features)
+        if affine is None:
+            return None
+        scale, shift = scale * affine[0], shift * affine[0] + affine[1]
+
+    # without scalers the model's own (possibly memory-mapped) coefficients are used as they are
+    if len(steps) > 1:
+        intercept = intercept + shift.dot(coef)
+        coef = coef * (scale[:, np.newaxis] if coef.ndim == 2 else scale)
+
+    if not (np.isfinite(coef).all() and np.isfinite(intercept).all()):
+        return None
+
+    return coef, intercept
+
+
+def get_affine(step, n_features):
+    """
+    find the scale and shift applied to each feature by a scikit-learn scaler
+
+    Args:
+        step (object): pipeline step
+        n_features (int): number of features
+
+    Returns:
+        (ndarray, ndarray): scale and shift of each feature, None if the step is not a supported scaler
+    """
+
+    if isinstance(step, StandardScaler):
+        std = getattr(step, 'scale_', getattr(step, 'std_', None))
+        if step.with_std and std is None:
+            return None
+        with np.errstate(divide='ignore'):
+            scale = 1.0 / np.asarray(std, dtype=np.float64) if step.with_std else np.ones(n_features)
+        mean = np.asarray(step.mean_, dtype=np.float64) if step.with_mean else np.zeros(n_features)
+        affine = scale, -mean * scale
+    elif isinstance(step, MinMaxScaler):
+        affine = np.asarray(step.scale_, dtype=np.float64), np.asarray(step.min_, dtype=np.float64)
+    else:
+        return None
+
+    if any(np.shape(x) != (n_features,) for x in affine):
+        return None
+
+    return affine
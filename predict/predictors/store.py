@@ -0,0 +1,321 @@
+# -*- coding: utf-8 -*-
+"""
+Content addressed store of model files\n
+Copied model files are kept in the store named by the sha1 of their contents, so a file shared by several models is
+stored once. Model files in the model directory are hard links to the stored file, and a remote path copied for a
+given model version (timestamp) is found again by its key without copying it, including after a restart. The size,
+modification time and etag of the last copy of each remote path are recorded, a remote file that has not changed is
+not copied again for a new version.\n
+Stored files that no model file links to are removed, least recently used first, to keep the store under its size
+limit. A store on another file system than the model files keeps copies instead of links, a callback tells which of
+those copies are still used by a model. The sidecars of sklearn model weights (see weights.py) are named by the same
+sha1, a callback is told which stored files are removed so their sidecars can be removed as well
+"""
+
+import errno
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from tools.general import file_sha1
+
+
+OBJECTS = 'objects'
+KEYS = 'keys'
+REMOTES = 'remotes'
+
+
+class ModelStore(object):
+    """
+    Local store of model files by content
+
+    Attributes:
+        directory (str): store directory
+        max_bytes (int): size limit of the store, 0 for no limit. only files no model links to are removed to stay
+            within it
+        on_evict (function): called with the sha1 of each stored file removed, None to do nothing
+        in_use (function): called with the sha1 of a stored file no model file links to, True if a model file is a
+            copy of it (the store is on another file system). None if model files are always links
+    """
+
+    def __init__(self, directory, max_bytes=0, on_evict=None, in_use=None):
+        """
+        init for model store, creates the store directories
+
+        Args:
+            directory (str): store directory
+            max_bytes (int): size limit of stored files, 0 for no limit
+            on_evict (function): called with the sha1 of each stored file removed
+            in_use (function): called with the sha1 of a stored file no model file links to, True if it is used
+
+        Returns:
+            ModelStore: ModelStore object
+        """
+
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.on_evict = on_evict
+        self.in_use = in_use
+
+        for name in [OBJECTS, KEYS, REMOTES]:
+            make_dirs(os.path.join(directory, name))
+
+    def lookup(self, key):
+        """
+        find the stored file for a key, the file is marked as used
+
+        Args:
+            key (str): key, e.g. remote path and version
+
+        Returns:
+            str: stored file, None if there is none
+        """
+
+        try:
+            with open(self.key_path(key), 'r') as f:
+                digest = f.read().strip()
+        except IOError:
+            return None
+
+        return self.get(digest)
+
+    def get(self, digest):
+        """
+        find a stored file by the sha1 of its contents, the file is marked as used
+
+        Args:
+            digest (str): sha1 of the file contents
+
+        Returns:
+            str: stored file, None if it is not stored
+        """
+
+        path = self.object_path(digest)
+        try:
+            os.utime(path, None)
+        except OSError:
+            # the stored file was evicted
+            return None
+
+        return path
+
+    def remote(self, remote_path):
+        """
+        get the metadata recorded for the last copy of a remote file
+
+        Args:
+            remote_path (str): remote path
+
+        Returns:
+            dict: remote metadata and the sha1 of the copy, None if none is recorded
+        """
+
+        try:
+            with open(self.record_path(remote_path), 'r') as f:
+                return json.load(f)
+        except (IOError, ValueError):
+            return None
+
+    def record(self, remote_path, metadata):
+        """
+        record the metadata of a copied remote file
+
+        Args:
+            remote_path (str): remote path
+            metadata (dict): remote metadata (e.g. size, mtime and etag) and the sha1 of the copy
+        """
+
+        fd, tmp_path = tempfile.mkstemp(prefix='.tmp', dir=os.path.join(self.directory, REMOTES))
+        with os.fdopen(fd, 'w') as f:
+            json.dump(metadata, f)
+        os.rename(tmp_path, self.record_path(remote_path))
+
+    def add(self, path, key=None, digest=None):
+        """
+        store a model file: the file is linked into the store, or replaced by a link to the stored file if its
+        contents are already stored. the key (if given) is recorded for the file, then the store is trimmed
+
+        Args:
+            path (str): model file
+            key (str): key, e.g. remote path and version
+            digest (str): sha1 of the file if known, e.g. computed while it was copied
+
+        Returns:
+            str: stored file
+        """
+
+        if digest is None:
+            digest = file_sha1(path)
+        stored = self.object_path(digest)
+
+        try:
+            os.link(path, stored)
+        except OSError as e:
+            if e.errno == errno.EEXIST:
+                link(stored, path)
+            elif e.errno == errno.EXDEV:
+                # the store is on another file system, it keeps a copy
+                copy(path, stored)
+            else:
+                raise
+
+        os.utime(stored, None)
+
+        if key is not None:
+            fd, tmp_path = tempfile.mkstemp(prefix='.tmp', dir=os.path.join(self.directory, KEYS))
+            with os.fdopen(fd, 'w') as f:
+                f.write(digest)
+            os.rename(tmp_path, self.key_path(key))
+
+        # the model file just stored may be a copy that no model uses yet
+        self.evict(keep=digest)
+
+        return stored
+
+    def evict(self, keep=None):
+        """
+        remove stored files not linked to by any model file (nor copied to one, see in_use), least recently used
+        first, until the store is within max_bytes. keys of removed files are removed on their next lookup
+
+        Args:
+            keep (str): sha1 of a stored file not to remove
+        """
+
+        if not self.max_bytes:
+            return
+
+        directory = os.path.join(self.directory, OBJECTS)
+        files = []
+        total = 0
+        for name in os.listdir(directory):
+            # files being copied in
+            if name.startswith('.'):
+                continue
+            try:
+                stat = os.stat(os.path.join(directory, name))
+            except OSError:
+                continue
+            total += stat.st_size
+            if stat.st_nlink == 1 and name != keep:
+                files.append((stat.st_mtime, stat.st_size, name))
+
+        for _, size, name in sorted(files):
+            if total <= self.max_bytes:
+                break
+            # copies have no other link, the models using them are checked
+            if self.in_use is not None and self.in_use(name):
+                continue
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError:
+                continue
+            total -= size
+            if self.on_evict is not None:
+                self.on_evict(name)
+
+    def digests(self):
+        """
+        list the stored files
+
+        Returns:
+            set(str): sha1 of each stored file
+        """
+
+        return set(name for name in os.listdir(os.path.join(self.directory, OBJECTS)) if not name.startswith('.'))
+
+    def object_path(self, digest):
+        """
+        path of a stored file
+
+        Args:
+            digest (str): sha1 of the file contents
+
+        Returns:
+            str: path
+        """
+
+        return os.path.join(self.directory, OBJECTS, digest)
+
+    def key_path(self, key):
+        """
+        path of the file recording the stored file for a key
+
+        Args:
+            key (str): key
+
+        Returns:
+            str: path
+        """
+
+        return os.path.join(self.directory, KEYS, hashlib.sha1(key).hexdigest())
+
+    def record_path(self, remote_path):
+        """
+        path of the file recording the metadata of a remote file
+
+        Args:
+            remote_path (str): remote path
+
+        Returns:
+            str: path
+        """
+
+        return os.path.join(self.directory, REMOTES, hashlib.sha1(remote_path).hexdigest())
+
+
+def link(stored, path):
+    """
+    replace a file by a hard link to a stored file (or a copy if they are on different file systems)
+
+    Args:
+        stored (str): stored file
+        path (str): file to replace
+    """
+
+    # renaming a link over another link to the same file does nothing
+    if os.path.exists(path) and os.path.samefile(stored, path):
+        return
+
+    tmp_path = '{}.link'.format(path)
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    try:
+        os.link(stored, tmp_path)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        shutil.copyfile(stored, tmp_path)
+
+    os.rename(tmp_path, path)
+
+
+def copy(path, stored):
+    """
+    copy a file into the store, the copy appears complete
+
+    Args:
+        path (str): file
+        stored (str): stored file
+    """
+
+    fd, tmp_path = tempfile.mkstemp(prefix='.tmp', dir=os.path.dirname(stored))
+    os.close(fd)
+    shutil.copyfile(path, tmp_path)
+    os.rename(tmp_path, stored)
+
+
+def make_dirs(directory):
+    """
+    create a directory and its parents if they do not exist
+
+    Args:
+        directory (str): directory
+    """
+
+    try:
+        os.makedirs(directory)
+    except OSError:
+        # created by another process
+        if not os.path.isdir(directory):
+            raise
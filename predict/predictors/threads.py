@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""
+Native thread pool shared by predictors\n
+Requests are served by gevent greenlets on a single thread, scoring handed to this pool runs on native threads so the
+gevent loop keeps serving other requests in the meantime (size set by PREDICT_THREADS)
+"""
+
+from flask import current_app as app, has_app_context
+from gevent.event import AsyncResult
+from gevent.threadpool import ThreadPool
+
+
+PREDICT_THREADS = 4
+
+threadpool = None
+
+# run spawned work in the calling thread instead of the pool (see run_inline)
+inline = False
+
+
+def get_threadpool():
+    """
+    get the pool of native threads used to run predictions off the gevent loop.
+    the pool is created at startup, greenlets spawned outside of a request (e.g. by batchers) have no app context
+
+    Returns:
+        ThreadPool: gevent thread pool
+    """
+
+    global threadpool  # pylint: disable=global-statement
+
+    if threadpool is None:
+        size = app.config.get('PREDICT_THREADS', PREDICT_THREADS) if has_app_context() else PREDICT_THREADS
+        threadpool = ThreadPool(size)
+
+    return threadpool
+
+
+def reset_threadpool():
+    """
+    forget the thread pool, used in forked processes where the threads of the parent's pool do not exist
+    """
+
+    global threadpool  # pylint: disable=global-statement
+
+    threadpool = None
+
+
+def run_inline():
+    """
+    run work given to spawn in the calling thread, used in model host processes (see hosts.py) which score one batch
+    at a time and do not run the gevent loop
+    """
+
+    global inline  # pylint: disable=global-statement
+
+    inline = True
+
+
+def spawn(function, *args):
+    """
+    run function(*args) in the thread pool (or right away in the calling thread after run_inline).
+    gevent's thread pool only prints errors raised in a thread (the result is None), so errors are caught in the
+    thread and raised again by the result
+
+    Args:
+        function (function): function to run
+        args (list): arguments for function
+
+    Returns:
+        AsyncResult: result, get() returns the function value or raises its error
+    """
+
+    if inline:
+        result = AsyncResult()
+        settle(result, capture(function, *args))
+        return result
+
+    return spawn_on(get_threadpool(), function, *args)
+
+
+def spawn_on(pool, function, *args):
+    """
+    run function(*args) in the given thread pool, errors are raised by the result as with spawn
+
+    Args:
+        pool (ThreadPool): gevent thread pool
+        function (function): function to run
+        args (list): arguments for function
+
+    Returns:
+        AsyncResult: result, get() returns the function value or raises its error
+    """
+
+    result = AsyncResult()
+    pool.spawn(capture, function, *args).rawlink(lambda task: settle(result, task.value))
+
+    return result
+
+
+def settle(result, outcome):
+    """
+    hand the outcome of capture to a result
+
+    Args:
+        result (AsyncResult): result to set
+        outcome ((bool, object)): value returned by capture
+    """
+
+    succeeded, value = outcome
+    if succeeded:
+        result.set(value)
+    else:
+        result.set_exception(value)
+
+
+def capture(function, *args):
+    """
+    call function(*args) and catch any error
+
+    Args:
+        function (function): function to run
+        args (list): arguments for function
+
+    Returns:
+        (bool, object): True and the function value, or False and the error raised
+    """
+
+    try:
+        return True, function(*args)
+    except Exception as e:  # pylint: disable=broad-except
+        return False, e
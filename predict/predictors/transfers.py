@@ -0,0 +1,978 @@
+# -*- coding: utf-8 -*-
+"""
+Model file transfers\n
+Remote model files are copied by a transfer for the protocol of their remote path ('protocol://source'). Local, http
+and ftp files are streamed in process into a temporary file next to the model file, which is renamed over the model
+file once complete, so a model file is never seen partially copied and a failed copy leaves the previous file in
+place. The sha1 of the file is computed while it is streamed (it names the file in the model store, see store.py).\n
+A stream interrupted by a network error is resumed from the bytes already received (http range requests, ftp REST)
+up to TRANSFER_RETRIES times. http ranges are conditional on the file's ETag or Last-Modified (If-Range), a file that
+changed since the first attempt is read again from its start. Idle http and ftp connections are kept and reused by
+later transfers to the same host.\n
+hdfs files are downloaded over WebHDFS, large files one block per request by parallel threads, with the hadoop command
+line tool as a fallback. scp files are copied with scp, commands are run without a shell.\n
+Transfers also get the size, modification time and etag of remote files (stat) without copying them, so a file that
+has not changed since it was copied is not copied again (see management.check_remote)
+"""
+
+from tools.general import file_sha1, run_process
+import ftplib
+import hashlib
+import httplib
+import os
+import shutil
+import tempfile
+import json
+import threading
+import urllib
+import urlparse
+
+
+TRANSFER_CHUNK_BYTES = 1024 * 1024
+TRANSFER_RETRIES = 3
+TRANSFER_TIMEOUT = 60
+
+# idle connections kept per host
+POOL_SIZE = 4
+
+# http redirects followed by a transfer
+MAX_REDIRECTS = 5
+
+# blocks of a hdfs file read at a time with WebHDFS
+WEBHDFS_PARTS = 4
+
+# ssh connections are shared by scp commands to the same host and kept open this many seconds after the last one
+SCP_PERSIST = 60
+
+
+class TransferError(Exception):
+    """
+    error copying a model file that is not resumed
+    """
+    pass
+
+
+class TransferRestart(Exception):
+    """
+    the remote file changed while it was read, it is read again from its start
+    """
+    pass
+
+
+class ConnectionPool(object):
+    """
+    idle connections by host, shared by the threads copying model files
+    """
+
+    def __init__(self, size=POOL_SIZE):
+        """
+        init for connection pool
+
+        Args:
+            size (int): idle connections kept per host
+
+        Returns:
+            ConnectionPool: ConnectionPool object
+        """
+
+        self.size = size
+        self.idle = dict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        """
+        take an idle connection
+
+        Args:
+            key (tuple): host key
+
+        Returns:
+            object: connection, None if there is none idle
+        """
+
+        with self.lock:
+            connections = self.idle.get(key)
+            return connections.pop() if connections else None
+
+    def put(self, key, connection):
+        """
+        return a connection for reuse
+
+        Args:
+            key (tuple): host key
+            connection (object): idle connection
+
+        Returns:
+            bool: False if the pool is full, the connection should be closed
+        """
+
+        with self.lock:
+            connections = self.idle.setdefault(key, [])
+            if len(connections) >= self.size:
+                return False
+            connections.append(connection)
+            return True
+
+    def clear(self):
+        """
+        forget all idle connections, e.g. in forked processes
+
+        Returns:
+            list(object): connections that were idle
+        """
+
+        with self.lock:
+            connections = [c for host in self.idle.values() for c in host]
+            self.idle.clear()
+            return connections
+
+
+http_pool = ConnectionPool()
+ftp_pool = ConnectionPool()
+
+
+class BaseTransfer(object):
+    """
+    Abstract class for copying a remote model file, streaming transfers implement read, others implement copy
+
+    Attributes:
+        source (str): remote path without its protocol
+        chunk_bytes (int): bytes read at a time
+        retries (int): times an interrupted stream is resumed
+        timeout (float): network timeout in seconds
+    """
+
+    # errors after which a stream is resumed
+    retry_errors = ()
+
+    # True if the file is streamed with read, else it is copied with copy
+    streaming = False
+
+    def __init__(self, source, chunk_bytes=TRANSFER_CHUNK_BYTES, retries=TRANSFER_RETRIES, timeout=TRANSFER_TIMEOUT):
+        """
+        init for transfers
+
+        Args:
+            source (str): remote path without its protocol
+            chunk_bytes (int): bytes read at a time
+            retries (int): times an interrupted stream is resumed
+            timeout (float): network timeout in seconds
+
+        Returns:
+            BaseTransfer: BaseTransfer object
+        """
+
+        self.source = source
+        self.chunk_bytes = chunk_bytes
+        self.retries = retries
+        self.timeout = timeout
+
+    def fetch(self, local_path):
+        """
+        copy the remote file to a temporary file in the directory of local_path, then rename it to local_path
+
+        Args:
+            local_path (str): local path of model file, its directory must exist
+
+        Returns:
+            str: sha1 of the file
+        """
+
+        tmp_dir = tempfile.mkdtemp(prefix='.tmp', dir=os.path.dirname(local_path))
+        tmp_path = os.path.join(tmp_dir, os.path.basename(local_path))
+        try:
+            digest = self.download(tmp_path)
+            os.rename(tmp_path, local_path)
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+        return digest
+
+    def download(self, path):
+        """
+        copy the remote file to path, streaming it with read if the transfer streams, else with copy
+
+        Args:
+            path (str): local path, does not exist
+
+        Returns:
+            str: sha1 of the file
+        """
+
+        if not self.streaming:
+            self.copy(path)
+            if not os.path.isfile(path):
+                raise TransferError('remote file not copied')
+            return file_sha1(path)
+
+        sha1 = [hashlib.sha1()]
+        with open(path, 'wb') as f:
+            def write(chunk):
+                f.write(chunk)
+                sha1[0].update(chunk)
+
+            def restart():
+                f.seek(0)
+                f.truncate()
+                sha1[0] = hashlib.sha1()
+
+            self.resume(read=self.read, write=write, restart=restart)
+
+        return sha1[0].hexdigest()
+
+    def resume(self, read, write, restart):
+        """
+        call read until it completes, resuming from the bytes already written after retry_errors, or from the start
+        if read raises TransferRestart
+
+        Args:
+            read (function): called with the offset to read from and write
+            write (function): called with each chunk (str)
+            restart (function): called to discard the bytes already written before reading from the start
+        """
+
+        received = [0]
+
+        def count(chunk):
+            write(chunk)
+            received[0] += len(chunk)
+
+        attempt = 0
+        while True:
+            try:
+                read(received[0], count)
+                return
+            except TransferRestart:
+                # only raised when resuming, so it follows a retried error
+                restart()
+                received[0] = 0
+            except self.retry_errors as e:
+                attempt += 1
+                if attempt > self.retries:
+                    msg = 'transfer interrupted after {received} bytes and {retries} retries: {err}'
+                    raise TransferError(msg.format(received=received[0], retries=self.retries, err=e))
+
+    def stat(self, previous=None):
+        """
+        get the metadata of the remote file used to tell if it changed since it was copied (see same_remote)
+
+        Args:
+            previous (dict): metadata of the copied file, used for conditional requests
+
+        Returns:
+            dict: size, mtime and etag (None if unknown), None if the transfer cannot tell
+        """
+
+        return None
+
+    def read(self, offset, write):
+        """
+        abstract read method, must be implemented in streaming child classes. reads the remote file from offset,
+        passing each chunk to write
+
+        Args:
+            offset (int): bytes to skip
+            write (function): called with each chunk (str)
+        """
+
+        raise Exception('cannot call abstract read method in base transfer class')
+
+    def copy(self, path):
+        """
+        abstract copy method, must be implemented in child classes that do not stream. copies the remote file to path
+
+        Args:
+            path (str): local path, does not exist
+        """
+
+        raise Exception('cannot call abstract copy method in base transfer class')
+
+
+class LocalTransfer(BaseTransfer):
+    """
+    copies a file from the local file system, 'local:///dir/model.ext'
+    """
+
+    streaming = True
+
+    def read(self, offset, write):
+        """
+        read the file from offset, passing each chunk to write
+
+        Args:
+            offset (int): bytes to skip
+            write (function): called with each chunk (str)
+        """
+
+        with open(self.source, 'rb') as f:
+            f.seek(offset)
+            for chunk in iter(lambda: f.read(self.chunk_bytes), ''):
+                write(chunk)
+
+
+    def stat(self, previous=None):
+        """
+        get the size and modification time of the file
+
+        Args:
+            previous (dict): metadata of the copied file, not used
+
+        Returns:
+            dict: size, mtime and etag
+        """
+
+        stat = os.stat(self.source)
+
+        return dict(size=stat.st_size, mtime=stat.st_mtime, etag=None)
+
+
+class HTTPTransfer(BaseTransfer):
+    """
+    downloads a file over http 1.1, 'http://host[:port]/dir/model.ext'. redirects are followed, connections are kept
+    alive and reused
+    """
+
+    retry_errors = (IOError, httplib.HTTPException)
+
+    streaming = True
+
+    # ETag or Last-Modified of the file when it was first read, ranges are conditional on it
+    validator = None
+
+    connection_classes = {'http': httplib.HTTPConnection, 'https': httplib.HTTPSConnection}
+
+    def url(self):
+        """
+        url of the remote file
+
+        Returns:
+            str: url
+        """
+
+        return 'http://{}'.format(self.source)
+
+    def read(self, offset, write):
+        """
+        download the file from offset (with a range request conditional on the file being unchanged), passing each
+        chunk to write
+
+        Args:
+            offset (int): bytes to skip
+            write (function): called with each chunk (str)
+        """
+
+        headers = {}
+        if offset:
+            # without a validator a file changed since the first attempt would be spliced
+            if self.validator is None:
+                raise TransferRestart('no ETag or Last-Modified to resume from')
+            headers = {'Range': 'bytes={}-'.format(offset), 'If-Range': self.validator}
+
+        def read_body(response):
+            if offset and response.status == 200:
+                # the file changed, or the server ignores ranges and responds with the whole file
+                raise TransferRestart('remote file changed')
+            if not offset:
+                # weak etags cannot be used in If-Range
+                etag = response.getheader('etag')
+                self.validator = etag if etag and not etag.startswith('W/') else response.getheader('last-modified')
+            self.read_response(response=response, skip=0, write=write)
+
+        self.get(url=self.url(), headers=headers, read=read_body)
+
+    def stat(self, previous=None):
+        """
+        get the size, Last-Modified and ETag of the file with a HEAD request, conditional on the copied file's
+        Last-Modified and ETag (the server responds 304 if the file is unchanged)
+
+        Args:
+            previous (dict): metadata of the copied file
+
+        Returns:
+            dict: size, mtime and etag
+        """
+
+        headers = {}
+        if previous and previous.get('etag'):
+            headers['If-None-Match'] = previous['etag']
+        if previous and previous.get('mtime'):
+            headers['If-Modified-Since'] = previous['mtime']
+
+        def read_headers(response):
+            # no body, reading closes the response so the connection is reused
+            response.read()
+            if response.status == 304:
+                return dict(size=previous.get('size'), mtime=previous.get('mtime'), etag=previous.get('etag'))
+            length = response.getheader('content-length')
+            return dict(size=int(length) if length is not None else None, mtime=response.getheader('last-modified'),
+                        etag=response.getheader('etag'))
+
+        return self.get(url=self.url(), headers=headers, read=read_headers, method='HEAD', statuses=(200, 304))
+
+    def get(self, url, headers, read, method='GET', statuses=(200, 206)):
+        """
+        send a request following redirects, the response is passed to read then its connection is reused
+
+        Args:
+            url (str): url
+            headers (dict): request headers
+            read (function): called with the response, if successful
+            method (str): request method
+            statuses (tuple(int)): successful response statuses
+
+        Returns:
+            object: result of read
+        """
+
+        for _ in range(MAX_REDIRECTS + 1):
+            key, connection, response = self.request(url=url, headers=headers, method=method)
+            try:
+                if response.status in (301, 302, 303, 307, 308):
+                    url = urlparse.urljoin(url, response.getheader('location', ''))
+                    response.read()
+                    continue
+                if response.status not in statuses:
+                    raise TransferError('http status {status} {reason} from {url}'.format(
+                        status=response.status, reason=response.reason, url=url))
+
+                return read(response)
+            except Exception:
+                connection.close()
+                connection = None
+                raise
+            finally:
+                if connection is not None:
+                    self.release(key=key, connection=connection, response=response)
+
+        raise TransferError('too many redirects from {}'.format(url))
+
+    def read_response(self, response, skip, write):
+        """
+        read a response body, passing each chunk after the first skip bytes to write
+
+        Args:
+            response (HTTPResponse): response
+            skip (int): bytes to skip
+            write (function): called with each chunk (str)
+        """
+
+        length = response.getheader('content-length')
+        received = 0
+        for chunk in iter(lambda: response.read(self.chunk_bytes), ''):
+            received += len(chunk)
+            if skip >= len(chunk):
+                skip -= len(chunk)
+                continue
+            write(chunk[skip:])
+            skip = 0
+
+        # the connection was closed early
+        if length is not None and received < int(length):
+            raise httplib.IncompleteRead('', int(length) - received)
+
+    def request(self, url, headers, method='GET'):
+        """
+        send a request on a pooled connection, a new connection is opened if the pooled one was closed
+
+        Args:
+            url (str): url
+            headers (dict): request headers
+            method (str): request method
+
+        Returns:
+            tuple: pool key, connection and response
+        """
+
+        parts = urlparse.urlsplit(url)
+        if parts.scheme not in self.connection_classes:
+            raise TransferError('unsupported url: {}'.format(url))
+
+        key = (parts.scheme, parts.netloc)
+        path = urlparse.urlunsplit(('', '', parts.path or '/', parts.query, ''))
+
+        connection = http_pool.get(key)
+        if connection is not None:
+            try:
+                connection.request(method, path, headers=headers)
+                return key, connection, connection.getresponse()
+            except (IOError, httplib.HTTPException):
+                # idle connection closed by the server
+                connection.close()
+
+        connection = self.connection_classes[parts.scheme](parts.netloc, timeout=self.timeout)
+        try:
+            connection.request(method, path, headers=headers)
+            return key, connection, connection.getresponse()
+        except Exception:
+            connection.close()
+            raise
+
+    @staticmethod
+    def release(key, connection, response):
+        """
+        return a connection to the pool once its response is read, unless the server closes it
+
+        Args:
+            key (tuple): pool key
+            connection (HTTPConnection): connection
+            response (HTTPResponse): its last response
+        """
+
+        if response.will_close or not response.isclosed() or not http_pool.put(key, connection):
+            connection.close()
+
+
+class FTPTransfer(BaseTransfer):
+    """
+    downloads a file over ftp, 'ftp://[user:password@]host[:port]/dir/model.ext' (anonymous by default). logged in
+    connections are reused
+    """
+
+    retry_errors = (IOError, EOFError, ftplib.error_temp)
+
+    streaming = True
+
+    def read(self, offset, write):
+        """
+        download the file from offset (with REST), passing each chunk to write
+
+        Args:
+            offset (int): bytes to skip
+            write (function): called with each chunk (str)
+        """
+
+        key, connection, path = self.connect()
+        try:
+            connection.retrbinary('RETR {}'.format(path), write, blocksize=self.chunk_bytes, rest=offset or None)
+        except ftplib.error_perm as e:
+            connection.close()
+            raise TransferError('ftp error: {}'.format(e))
+        except Exception:
+            connection.close()
+            raise
+
+        if not ftp_pool.put(key, connection):
+            connection.close()
+
+    def stat(self, previous=None):
+        """
+        get the size (SIZE) and modification time (MDTM) of the file
+
+        Args:
+            previous (dict): metadata of the copied file, not used
+
+        Returns:
+            dict: size, mtime and etag, None if the server does not support SIZE and MDTM
+        """
+
+        key, connection, path = self.connect()
+        try:
+            connection.voidcmd('TYPE I')
+            size = connection.size(path)
+            mtime = connection.sendcmd('MDTM {}'.format(path)).split(None, 1)[1]
+        except ftplib.error_perm:
+            size = mtime = None
+        except Exception:
+            connection.close()
+            raise
+
+        if not ftp_pool.put(key, connection):
+            connection.close()
+
+        if size is None or not mtime:
+            return None
+
+        return dict(size=size, mtime=mtime, etag=None)
+
+    def connect(self):
+        """
+        get a logged in connection to the server, a pooled connection if one is still open
+
+        Returns:
+            tuple: pool key, connection and path of the file on the server
+        """
+
+        parts = urlparse.urlsplit('ftp://{}'.format(self.source))
+        key = (parts.hostname, parts.port, parts.username)
+
+        connection = ftp_pool.get(key)
+        if connection is not None:
+            try:
+                connection.voidcmd('NOOP')
+                return key, connection, parts.path
+            except (IOError, EOFError, ftplib.Error):
+                # idle connection closed by the server
+                connection.close()
+
+        connection = ftplib.FTP(timeout=self.timeout)
+        try:
+            connection.connect(parts.hostname, parts.port or ftplib.FTP_PORT)
+            connection.login(parts.username or 'anonymous', parts.password or '')
+        except Exception:
+            connection.close()
+            raise
+
+        return key, connection, parts.path
+
+
+class HadoopTransfer(BaseTransfer):
+    """
+    copies a file from hdfs with the hadoop command line tool, 'hdfs://dir/model.ext'
+
+    Attributes:
+        hadoop (str): hadoop executable
+    """
+
+    def __init__(self, source, hadoop='hadoop', **kwargs):
+        """
+        init for hadoop transfers
+
+        Args:
+            source (str): hdfs path
+            hadoop (str): hadoop executable
+            kwargs (dict): BaseTransfer arguments
+
+        Returns:
+            HadoopTransfer: HadoopTransfer object
+        """
+
+        super(HadoopTransfer, self).__init__(source=source, **kwargs)
+
+        self.hadoop = hadoop
+
+    def copy(self, path):
+        """
+        copy the file to path
+
+        Args:
+            path (str): local path
+        """
+
+        run_process(command=[self.hadoop, 'fs', '-copyToLocal', self.source, path])
+
+
+class WebHDFSTransfer(HTTPTransfer):
+    """
+    downloads a file from hdfs over the WebHDFS REST api of the namenode, 'hdfs:///dir/model.ext', or
+    'hdfs://dir/model.ext' relative to the user's home directory as with the hadoop command line tool (a namenode
+    'host:port' before the path is ignored). reads are redirected by the namenode to the datanodes holding the file,
+    files of more than one block are read one block per request by several threads at a time. without a namenode url,
+    or if the download fails, the file is copied with the hadoop command line tool
+
+    Attributes:
+        webhdfs (str): namenode http url, e.g. 'http://namenode:50070'
+        user (str): hdfs user name
+        parts (int): blocks read at a time
+        hadoop (str): hadoop executable, None to not fall back on it
+        home (str): home directory of the user, relative paths are in it (None until it is needed)
+    """
+
+    def __init__(self, source, webhdfs=None, user=None, parts=WEBHDFS_PARTS, hadoop='hadoop', **kwargs):
+        """
+        init for webhdfs transfers
+
+        Args:
+            source (str): hdfs path
+            webhdfs (str): namenode http url, None to use the hadoop command line tool
+            user (str): hdfs user name
+            parts (int): blocks read at a time
+            hadoop (str): hadoop executable, None to not fall back on it
+            kwargs (dict): BaseTransfer arguments
+
+        Returns:
+            WebHDFSTransfer: WebHDFSTransfer object
+        """
+
+        super(WebHDFSTransfer, self).__init__(source=source, **kwargs)
+
+        self.webhdfs = webhdfs
+        self.user = user
+        self.parts = parts
+        self.hadoop = hadoop
+        self.home = None
+
+    def path(self):
+        """
+        absolute hdfs path of the remote file, the home directory of relative paths is asked to the namenode once
+
+        Returns:
+            str: path
+        """
+
+        if self.source.startswith('/'):
+            return self.source
+
+        # ':' is not allowed in hdfs file names, it separates the port of a namenode
+        namenode, _, path = self.source.partition('/')
+        if ':' in namenode:
+            return '/{}'.format(path)
+
+        if self.home is None:
+            self.home = self.get(url=self.url(op='GETHOMEDIRECTORY', path='/'), headers={},
+                                 read=lambda response: json.loads(response.read())['Path'])
+
+        return '{home}/{path}'.format(home=self.home.rstrip('/'), path=self.source)
+
+    def url(self, op='OPEN', path=None, **params):
+        """
+        url of a WebHDFS operation on the remote file
+
+        Args:
+            op (str): operation
+            path (str): hdfs path, the remote file's by default
+            params (dict): operation parameters
+
+        Returns:
+            str: url
+        """
+
+        path = path or self.path()
+        if self.user is not None:
+            params['user.name'] = self.user
+        query = urllib.urlencode(sorted(params.items()) + [('op', op)])
+
+        return '{url}/webhdfs/v1{path}?{query}'.format(url=self.webhdfs.rstrip('/'), path=urllib.quote(path),
+                                                        query=query)
+
+    def status(self):
+        """
+        get the hdfs status of the remote file
+
+        Returns:
+            dict: FileStatus, e.g. length, blockSize and modificationTime
+        """
+
+        return self.get(url=self.url(op='GETFILESTATUS'), headers={},
+                        read=lambda response: json.loads(response.read())['FileStatus'])
+
+    def stat(self, previous=None):
+        """
+        get the size and modification time of the file from the namenode
+
+        Args:
+            previous (dict): metadata of the copied file, not used
+
+        Returns:
+            dict: size, mtime and etag, None without a namenode url
+        """
+
+        if self.webhdfs is None:
+            return None
+
+        status = self.status()
+
+        return dict(size=status['length'], mtime=status['modificationTime'], etag=None)
+
+    def download(self, path):
+        """
+        download the remote file to path with WebHDFS, falling back on the hadoop command line tool
+
+        Args:
+            path (str): local path, does not exist
+
+        Returns:
+            str: sha1 of the file
+        """
+
+        if self.webhdfs is None:
+            return self.fallback().download(path)
+
+        try:
+            return self.download_blocks(path)
+        except Exception as e:  # pylint: disable=broad-except
+            if self.hadoop is None:
+                raise
+            if os.path.exists(path):
+                os.remove(path)
+            try:
+                return self.fallback().download(path)
+            except Exception as fallback_error:  # pylint: disable=broad-except
+                raise TransferError('webhdfs: {err}, hadoop: {fallback_err}'.format(err=e,
+                                                                                     fallback_err=fallback_error))
+
+    def download_blocks(self, path):
+        """
+        download the remote file to path, the blocks of files larger than a block are read in parallel
+
+        Args:
+            path (str): local path, does not exist
+
+        Returns:
+            str: sha1 of the file
+        """
+
+        status = self.status()
+        if status.get('type', 'FILE') != 'FILE':
+            raise TransferError('not a file: {}'.format(self.source))
+
+        length = status['length']
+        block = status.get('blockSize') or length
+        if self.parts <= 1 or length <= block:
+            return super(WebHDFSTransfer, self).download(path)
+
+        with open(path, 'wb') as f:
+            f.truncate(length)
+
+        blocks = [(start, min(block, length - start)) for start in range(0, length, block)]
+        lock = threading.Lock()
+        errors = []
+
+        def read_blocks():
+            with open(path, 'r+b') as f:
+                while not errors:
+                    with lock:
+                        if not blocks:
+                            return
+                        start, size = blocks.pop(0)
+                    try:
+                        self.read_block(f=f, start=start, size=size)
+                    except Exception as e:  # pylint: disable=broad-except
+                        errors.append(e)
+
+        threads = [threading.Thread(target=read_blocks) for _ in range(min(self.parts, len(blocks)))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        if errors:
+            raise errors[0]
+
+        # blocks arrive out of order, the file is hashed once complete
+        return file_sha1(path)
+
+    def read_block(self, f, start, size):
+        """
+        write a block of the remote file at its offset in f
+
+        Args:
+            f (file): open local file, used by this thread only
+            start (int): offset of the block
+            size (int): length of the block
+        """
+
+        f.seek(start)
+
+        def read(offset, write):
+            expected = size - offset
+            received = [0]
+
+            def count(chunk):
+                write(chunk)
+                received[0] += len(chunk)
+
+            self.get(url=self.url(offset=start + offset, length=expected), headers={},
+                     read=lambda response: self.read_response(response=response, skip=0, write=count))
+            if received[0] < expected:
+                raise httplib.IncompleteRead('', expected - received[0])
+
+        self.resume(read=read, write=f.write, restart=lambda: f.seek(start))
+
+    def read(self, offset, write):
+        """
+        download the file from offset, passing each chunk to write
+
+        Args:
+            offset (int): bytes to skip
+            write (function): called with each chunk (str)
+        """
+
+        url = self.url(offset=offset) if offset else self.url()
+        self.get(url=url, headers={}, read=lambda response: self.read_response(response=response, skip=0, write=write))
+
+    def fallback(self):
+        """
+        transfer copying the remote file with the hadoop command line tool
+
+        Returns:
+            HadoopTransfer: transfer
+        """
+
+        return HadoopTransfer(source=self.source, hadoop=self.hadoop or 'hadoop', chunk_bytes=self.chunk_bytes,
+                              retries=self.retries, timeout=self.timeout)
+
+
+class SCPTransfer(BaseTransfer):
+    """
+    copies a file with scp, 'scp://[user@]host:dir/model.ext'. the ssh connection to a host is shared by the copies
+    made while it is open (see SCP_PERSIST)
+    """
+
+    def copy(self, path):
+        """
+        copy the file to path
+
+        Args:
+            path (str): local path
+        """
+
+        control_path = os.path.join(tempfile.gettempdir(), 'ml-agent-ssh-%r@%h:%p')
+        run_process(command=['scp', '-q', '-B', '-o', 'ControlMaster=auto', '-o', 'ControlPath={}'.format(control_path),
+                             '-o', 'ControlPersist={}'.format(SCP_PERSIST), self.source, path])
+
+
+# make_transfer arguments only used by hdfs transfers
+HDFS_OPTIONS = ('webhdfs', 'user', 'parts', 'hadoop')
+
+TRANSFERS = {'local': LocalTransfer,
+             'http': HTTPTransfer,
+             'ftp': FTPTransfer,
+             'hdfs': WebHDFSTransfer,
+             'scp': SCPTransfer}
+
+
+def make_transfer(remote_path, **kwargs):
+    """
+    Factory to build the transfer for the protocol of a remote path
+
+    Args:
+        remote_path (str): remote location of model file 'protocol://source'
+        kwargs (dict): transfer arguments (see BaseTransfer), and HDFS_OPTIONS for hdfs
+
+    Returns:
+        BaseTransfer Child: transfer
+    """
+
+    protocols = '|'.join(sorted(TRANSFERS))
+    if not remote_path or '://' not in remote_path:
+        raise TransferError('invalid remote path, expected [{}]://remote_dir/filename.ext'.format(protocols))
+
+    protocol, source = remote_path.split('://', 1)
+    if protocol not in TRANSFERS:
+        raise TransferError('unknown transfer protocol {}, expected one of [{}]'.format(protocol, protocols))
+
+    if protocol != 'hdfs':
+        for option in HDFS_OPTIONS:
+            kwargs.pop(option, None)
+
+    return TRANSFERS[protocol](source=source, **kwargs)
+
+
+def same_remote(previous, current):
+    """
+    check if a remote file is unchanged since it was copied, its modification time or etag must be known
+
+    Args:
+        previous (dict): metadata of the remote file when it was copied
+        current (dict): metadata of the remote file now (see BaseTransfer.stat)
+
+    Returns:
+        bool: True if the metadata match
+    """
+
+    if not previous or not current or (current.get('mtime') is None and current.get('etag') is None):
+        return False
+
+    return all(previous.get(name) == current.get(name) for name in ['size', 'mtime', 'etag'])
+
+
+def clear_pools():
+    """
+    close idle connections, e.g. at shutdown
+    """
+
+    for connection in http_pool.clear() + ftp_pool.clear():
+        try:
+            connection.close()
+        except Exception:  # pylint: disable=broad-except
+            pass
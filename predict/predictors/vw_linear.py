@@ -0,0 +1,481 @@
+# -*- coding: utf-8 -*-
+"""
+Numpy scorer for linear vowpal wabbit models\n
+A plain linear vw model predicts the sum of weight * value over the hashed features of an example, clamped to the
+label range seen in training and passed through the link function. This reads the non-zero weights from the vw
+regressor file and scores examples with vw's feature hashing (murmurhash3 and its handling of numeric feature names)
+without calling vw. The hash and weight of each (namespace, feature) pair is memoized, so repeated features cost a
+dictionary lookup, and each batch is summed with one vectorized numpy call.\n
+Only models whose options are known not to change how features are built (no interactions, ngrams, reductions, etc.)
+are supported, see https://github.com/JohnLangford/vowpal_wabbit/wiki/Input-format and
+https://github.com/JohnLangford/vowpal_wabbit/wiki/Command-line-arguments
+"""
+
+import numpy as np
+import shlex
+import struct
+
+
+# hash of vw's constant (intercept) feature
+CONSTANT_HASH = 11650396
+
+# options that do not change predictions of a loaded linear model (training, output and hashing options handled here)
+SAFE_OPTIONS = {'adaptive', 'b', 'bit_precision', 'decay_learning_rate', 'hash', 'holdout_off', 'i',
+                'initial_regressor', 'initial_t', 'invariant', 'l', 'l1', 'l2', 'learning_rate', 'link',
+                'loss_function', 'max_prediction', 'min_prediction', 'noconstant', 'normalized', 'P', 'power_t',
+                'progress', 'quiet', 'random_seed', 'sgd', 't', 'testonly'}
+
+# (namespace hash, feature) pairs remembered before the memo is cleared
+MEMO_SIZE = 1000000
+
+LINKS = {'identity': lambda x: x,
+         'logistic': lambda x: 1.0 / (1.0 + np.exp(-x)),
+         'glf1': lambda x: 2.0 / (1.0 + np.exp(-x)) - 1.0}
+
+
+class UnsupportedModel(Exception):
+    """
+    raised for vw models that cannot be scored without vw
+    """
+
+    pass
+
+
+class LinearVW(object):
+    """
+    Scores examples of a linear vw model from its weights
+
+    Attributes:
+        indices (ndarray(uint32)): sorted weight indices with non-zero weights
+        weights (ndarray(float32)): weights for indices
+        mask (int): mask of weight index bits
+        min_label (float): lowest prediction before the link function
+        max_label (float): highest prediction before the link function
+        link (function): link function applied to clamped predictions
+        hash_all (bool): True if numeric feature names are hashed like other names (--hash all)
+        constant (bool): True if the constant feature is added to every example
+    """
+
+    def __init__(self, path, extras=''):
+        """
+        init for linear vw scorer, reads the model file
+
+        Args:
+            path (str): vw model file
+            extras (str): vw command line arguments used with the model
+
+        Returns:
+            LinearVW: LinearVW object
+        """
+
+        with open(path, 'rb') as f:
+            header, self.indices, self.weights = read_regressor(f.read())
+
+        options = parse_options('{} {}'.format(header['options'], extras))
+        unsupported = sorted(set(options) - SAFE_OPTIONS)
+        if unsupported:
+            raise UnsupportedModel('unsupported vw options: {}'.format(', '.join(unsupported)))
+
+        self.mask = (1 << header['bits']) - 1
+        self.min_label = float(options.get('min_prediction', header['min_label']))
+        self.max_label = float(options.get('max_prediction', header['max_label']))
+        self.hash_all = options.get('hash', 'strings') == 'all'
+        self.constant = 'noconstant' not in options
+
+        link = options.get('link', 'identity')
+        if link not in LINKS:
+            raise UnsupportedModel('unsupported vw link function: {}'.format(link))
+        self.link = LINKS[link]
+
+        self.memo = dict()
+        self.constant_weight = self.lookup(CONSTANT_HASH) if self.constant else 0.0
+
+    def predict(self, example):
+        """
+        score examples
+
+        Args:
+            example (list(str or dict)): vw input format strings or namespace name -> list of (feature, value) as
+                returned by vw_predictor.parse_namespaces
+
+        Returns:
+            ndarray(float): prediction(s)
+        """
+
+        rows = []
+        weights = []
+        values = []
+        for i, row in enumerate(example):
+            features = self.text_features(row) if isinstance(row, basestring) else self.dict_features(row)
+            for weight, value in features:
+                rows.append(i)
+                weights.append(weight)
+                values.append(value)
+
+        if not len(example):
+            return np.zeros(0)
+
+        # bincount of no features gives integer zeros
+        prediction = np.bincount(np.asarray(rows, dtype=np.intp),
+                                 weights=np.asarray(weights, dtype=np.float64) * np.asarray(values, dtype=np.float64),
+                                 minlength=len(example)).astype(np.float64)
+        prediction += self.constant_weight
+
+        return self.link(np.clip(prediction, self.min_label, self.max_label))
+
+    def text_features(self, example):
+        """
+        read features of a vw input format string, the text before the first bar (label, importance and tag) is
+        ignored
+
+        Args:
+            example (str): vw input format example
+
+        Returns:
+            list((float, float)): weight and value of each feature
+        """
+
+        features = []
+        for section in example.split('|')[1:]:
+            tokens = section.split()
+            if not tokens:
+                continue
+
+            scale = 1.0
+            name_hash = 0
+            if not section[0].isspace():
+                name, _, scale = tokens.pop(0).partition(':')
+                scale = float(scale) if scale else 1.0
+                name_hash = self.hash(name, 0)
+
+            for token in tokens:
+                feature, _, value = token.partition(':')
+                features.append((self.feature_weight(name_hash, feature), float(value) * scale if value else scale))
+
+        return features
+
+    def dict_features(self, namespaces):
+        """
+        read features of a structured example
+
+        Args:
+            namespaces (dict): namespace name -> list of (feature, value)
+
+        Returns:
+            list((float, float)): weight and value of each feature
+        """
+
+        features = []
+        for name, values in namespaces.iteritems():
+            name_hash = self.hash(name, 0) if name else 0
+            features.extend((self.feature_weight(name_hash, feature), value) for feature, value in values)
+
+        return features
+
+    def feature_weight(self, name_hash, feature):
+        """
+        find the weight of a feature, memoized
+
+        Args:
+            name_hash (int): hash of the feature's namespace
+            feature (str): feature name
+
+        Returns:
+            float: weight
+        """
+
+        key = (name_hash, feature)
+        weight = self.memo.get(key, None)
+        if weight is None:
+            if len(self.memo) >= MEMO_SIZE:
+                self.memo.clear()
+            weight = self.memo[key] = self.lookup(self.hash(feature, name_hash))
+
+        return weight
+
+    def lookup(self, feature_hash):
+        """
+        find the weight for a feature hash
+
+        Args:
+            feature_hash (int): feature hash
+
+        Returns:
+            float: weight, 0 if the model has no weight for the hash
+        """
+
+        index = feature_hash & self.mask
+        i = np.searchsorted(self.indices, index)
+
+        return float(self.weights[i]) if i < self.indices.size and self.indices[i] == index else 0.0
+
+    def hash(self, name, seed):
+        """
+        hash a namespace or feature name like vw: names of digits only are their number plus the seed (unless
+        --hash all is used), others are hashed with murmurhash3
+
+        Args:
+            name (str): name
+            seed (int): seed, the namespace hash for features
+
+        Returns:
+            int: hash
+        """
+
+        name = name.strip()
+        if not self.hash_all and name.isdigit():
+            return int(name) + seed
+
+        return murmurhash3_32(name, seed)
+
+
+def read_regressor(data):
+    """
+    read the header and weights of a vw model file (regressor saved without --save_resume).
+    the header holds the vw version, label range, number of bits, and the options saved with the model, followed by
+    (index, weight) records of the non-zero weights
+
+    Args:
+        data (str): bytes of the model file
+
+    Returns:
+        (dict, ndarray(uint32), ndarray(float32)): header, sorted weight indices and weights
+    """
+
+    reader = Reader(data)
+    header = dict()
+
+    header['version'] = reader.string()
+    if reader.read(1) != 'm':
+        raise UnsupportedModel('not a vw model file')
+
+    header['min_label'], header['max_label'] = reader.unpack('<ff')
+    header['bits'], lda = reader.unpack('<II')
+    if lda:
+        raise UnsupportedModel('lda models are not linear')
+    if header['bits'] > 31:
+        raise UnsupportedModel('models with more than 31 bits are not supported')
+
+    # interactions were saved in the header before they moved to the options
+    if version_tuple(header['version']) < (7, 10, 2):
+        for size in [2, 3]:
+            if reader.unpack('<I')[0]:
+                raise UnsupportedModel('models with interactions are not linear')
+
+    for name in ['ngram', 'skips']:
+        if reader.unpack('<I')[0]:
+            raise UnsupportedModel('models with {} are not supported'.format(name))
+
+    header['options'] = reader.string()
+
+    if reader.read(1) != '\x00':
+        raise UnsupportedModel('models saved with --save_resume are not supported')
+
+    records = np.frombuffer(reader.rest(), dtype=[('index', '<u4'), ('weight', '<f4')])
+    indices = records['index']
+    if indices.size and ((np.diff(indices.astype(np.int64)) <= 0).any() or indices[-1] >= 1 << header['bits']):
+        raise UnsupportedModel('could not read vw weights')
+
+    return header, indices.copy(), records['weight'].astype(np.float32)
+
+
+class Reader(object):
+    """
+    reads values one after another from a byte string
+    """
+
+    def __init__(self, data):
+        self.data = data
+        self.offset = 0
+
+    def read(self, size):
+        """
+        read bytes
+
+        Args:
+            size (int): number of bytes
+
+        Returns:
+            str: bytes
+        """
+
+        if self.offset + size > len(self.data):
+            raise UnsupportedModel('unexpected end of vw model file')
+
+        value = self.data[self.offset:self.offset + size]
+        self.offset += size
+
+        return value
+
+    def unpack(self, fmt):
+        """
+        read and unpack values
+
+        Args:
+            fmt (str): struct format
+
+        Returns:
+            tuple: values
+        """
+
+        return struct.unpack(fmt, self.read(struct.calcsize(fmt)))
+
+    def string(self):
+        """
+        read a string written as its length and its (null terminated) bytes
+
+        Returns:
+            str: string
+        """
+
+        return self.read(self.unpack('<I')[0]).rstrip('\x00')
+
+    def rest(self):
+        """
+        read all remaining bytes, the length must be a multiple of a weight record
+
+        Returns:
+            str: bytes
+        """
+
+        if (len(self.data) - self.offset) % 8:
+            raise UnsupportedModel('could not read vw weights')
+
+        return self.read(len(self.data) - self.offset)
+
+
+def version_tuple(version):
+    """
+    convert a version string to a comparable tuple
+
+    Args:
+        version (str): version string, e.g. 7.10.0
+
+    Returns:
+        tuple(int): version numbers
+    """
+
+    try:
+        return tuple(int(x) for x in version.split('.'))
+    except ValueError:
+        raise UnsupportedModel('unknown vw version {}'.format(version))
+
+
+def parse_options(command):
+    """
+    split vw command line arguments into options
+
+    Args:
+        command (str): vw command line arguments
+
+    Returns:
+        dict: option name (without dashes) -> value, True for flags
+    """
+
+    options = dict()
+    name = None
+    for token in shlex.split(command):
+        if token.startswith('-') and not is_number(token):
+            name, _, value = token.lstrip('-').partition('=')
+            options[name] = value or True
+            if value:
+                name = None
+        elif name is not None:
+            options[name] = token
+            name = None
+        else:
+            raise UnsupportedModel('unexpected vw argument {}'.format(token))
+
+    return options
+
+
+def is_number(token):
+    """
+    check a command line token is a number (e.g. a negative option value)
+
+    Args:
+        token (str): token
+
+    Returns:
+        bool: True if token is a number
+    """
+
+    try:
+        float(token)
+    except ValueError:
+        return False
+
+    return True
+
+
+def murmurhash3_32(data, seed):
+    """
+    32 bit murmurhash3 (x86 variant) as used by vw to hash names
+
+    Args:
+        data (str): bytes to hash
+        seed (int): seed
+
+    Returns:
+        int: hash
+    """
+
+    c1 = 0xcc9e2d51
+    c2 = 0x1b873593
+    h = seed & 0xffffffff
+
+    n_blocks = len(data) // 4
+    for k in struct.unpack('<{}I'.format(n_blocks), data[:n_blocks * 4]):
+        k = (k * c1) & 0xffffffff
+        k = ((k << 15) | (k >> 17)) & 0xffffffff
+        k = (k * c2) & 0xffffffff
+        h ^= k
+        h = ((h << 13) | (h >> 19)) & 0xffffffff
+        h = (h * 5 + 0xe6546b64) & 0xffffffff
+
+    tail = bytearray(data[n_blocks * 4:])
+    if tail:
+        k = 0
+        for i, byte in enumerate(tail):
+            k |= byte << (8 * i)
+        k = (k * c1) & 0xffffffff
+        k = ((k << 15) | (k >> 17)) & 0xffffffff
+        k = (k * c2) & 0xffffffff
+        h ^= k
+
+    h ^= len(data)
+    h ^= h >> 16
+    h = (h * 0x85ebca6b) & 0xffffffff
+    h ^= h >> 13
+    h = (h * 0xc2b2ae35) & 0xffffffff
+    h ^= h >> 16
+
+    return h
+
+
+def parity_examples(example):
+    """
+    examples compared with vw before the numpy scorer is used: the example itself, each of its namespaces on its own
+    and the example with every feature value halved, so namespace hashing, feature hashing and values are all checked
+
+    Args:
+        example (str): vw input format example
+
+    Returns:
+        list(str): examples
+    """
+
+    sections = example.split('|')
+    examples = [example] + ['|{}'.format(section) for section in sections[1:] if section.split()]
+
+    halved = []
+    for section in sections[1:]:
+        tokens = section.split()
+        name = tokens.pop(0) if tokens and not section[0].isspace() else ''
+        for token in tokens:
+            feature, _, value = token.partition(':')
+            name += ' {}:{!r}'.format(feature, float(value or 1.0) / 2)
+        halved.append(name)
+    examples.append('|{}'.format('|'.join(halved)))
+
+    return examples
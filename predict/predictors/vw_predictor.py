@@ -3,27 +3,48 @@
 Vowpal wabbit predictor implementation\n
 This will create a subprocess running vowpal wabbit binary installed on the local machine\n
 Model versions should match the version of vw installed on the machine (this is not verified at run-time)\n
+Examples are either vw input format strings or dictionaries of namespace -> {feature: value}, which are passed to vw
+as features directly instead of being written out and parsed as text ('' is the default namespace)\n
+Plain linear models can be scored in numpy instead of vw with --agent_engine=numpy (see vw_linear), the numpy scorer
+is only used if it matches vw's predictions when the model is loaded\n
 https://github.com/JohnLangford/vowpal_wabbit/wiki
 """
 
-from predict.predictors.base_predictor import BasePredictor
+from predict.predictors.base_predictor import BasePredictor, split_extras
+from predict.predictors.replicas import ReplicaPool
+from predict.predictors.vw_linear import LinearVW, UnsupportedModel, parity_examples
 from vowpalwabbit import pyvw
+import numpy as np
 import re
 
 
+# reference definition of the accepted input format: optional label, importance and tag before the first namespace bar
+# validate_example accepts exactly the strings this matches in full, without running it
 valid_regex = re.compile(r"(([-0-9\.]+ )?([-0-9\.]+ )?([\S^\|]+|('[\S^\|]+ ))?\|.*)")
 
+NUMBER_CHARS = '-0123456789.'
+space_regex = re.compile(r'\s')
+
+# scoring engines, vw or the numpy scorer for linear models
+ENGINES = ['vw', 'numpy']
+
 
 class VWPredictor(BasePredictor):
     """
     Concrete class providing interface for a Vowpal Wabbit model
+
+    Attributes:
+        replicas (ReplicaPool): vw processes used for scoring when --agent_replicas is more than 1, None otherwise
+        linear (LinearVW): numpy scorer used instead of vw, None if the model is scored by vw
     """
 
+    linear = None
+
     def __init__(self, model, verify_on_load=True):
         """
         init for vowpal wabbit predictor, calls BasePredictor init then fills in specific attributes and loads model.
         uses python binding to c++ executable to make predictions.
-        model.extras can provide addition arguments to vw:
+        model.extras can provide addition arguments to vw (ml-agent options are removed first):
         see https://github.com/JohnLangford/vowpal_wabbit/wiki/Command-line-arguments
 
         Args:
@@ -37,17 +58,34 @@ class VWPredictor(BasePredictor):
 
         self.model_type = 'vw'
 
+        # input that is already known to be valid vw format can skip validation
+        self.trust_input = self.get_option('trust_input', False, bool)
+
+        # hashes of namespace names used by structured examples
+        self.namespace_hashes = dict()
+
+        # a vw process scores one example at a time, hot models can load several copies to score concurrently
+        self.n_replicas = max(self.get_option('replicas', 1, int), 1)
+        self.replicas = None
+
+        self.engine = self.get_option('engine', 'vw')
+        if self.engine not in ENGINES:
+            raise Exception('unknown engine {}, expected one of {}'.format(self.engine, ', '.join(ENGINES)))
+        self.linear = None
+
         self.command = '-i {path} --quiet'.format(path=self.model.local_path)
-        if self.model.extras:
+        extras = split_extras(self.model.extras)[1]
+        if extras:
             # don't allow duplicate quiets in extras
-            extras = self.model.extras.replace('--quiet', '')
+            extras = extras.replace('--quiet', '')
             self.command += ' {}'.format(extras)
 
         self.load(verify_on_load=verify_on_load)
 
     def load(self, verify_on_load=True):
         """
-        loads model file into memory (as a vw sub-process)
+        loads model file into memory (as a vw sub-process, or one per replica)
+        with --agent_engine=numpy linear models are also read into a numpy scorer, which is kept if it matches vw
         verify model first, then stop process if status is not active
 
         Args:
@@ -55,17 +93,52 @@ class VWPredictor(BasePredictor):
         """
 
         self.process = pyvw.vw(self.command)
+        self.namespace_hashes = dict()
+        if self.n_replicas > 1:
+            self.replicas = ReplicaPool([self.process] + [pyvw.vw(self.command) for _ in range(self.n_replicas - 1)])
+
+        self.linear = None
+        if self.engine == 'numpy':
+            # models the numpy scorer does not support, or scores differently, are scored by vw
+            try:
+                self.linear = LinearVW(self.model.local_path, extras=self.command)
+            except UnsupportedModel:
+                pass
+            if self.linear is not None and not self.check_linear():
+                self.linear = None
 
         super(self.__class__, self).load(verify_on_load=verify_on_load)
 
     def stop(self):
         """
-        stops vw from processing
+        stops vw from processing (all replicas)
         """
 
         if self.is_active():
-            self.process.finish()
+            for process in self.replicas.processes if self.replicas is not None else [self.process]:
+                process.finish()
         self.process = None
+        self.replicas = None
+        self.linear = None
+
+    def verify(self, predict=None):
+        """
+        verify that the output generated by every replica matches what is expected
+
+        Args:
+            predict (function): function generating predictions to verify, defaults to each replica in turn
+
+        Returns:
+            bool: True if output matches, False otherwise
+        """
+
+        if predict is not None or self.replicas is None:
+            return super(self.__class__, self).verify(predict=predict)
+
+        for process in self.replicas.processes:
+            super(self.__class__, self).verify(predict=lambda x, p=process: self.score(p, self.parse_examples(x)))
+
+        return True
 
     def predict(self, example):
         """
@@ -81,25 +154,153 @@ class VWPredictor(BasePredictor):
 
         assert self.can_predict(example=example)
 
-        prediction = []
+        return self.predict_parsed(self.parse_examples(example))
+
+    def parse_key(self):
+        """
+        vw predictors share parsed examples only if they validate input the same way, so unvalidated examples parsed
+        for a model with --agent_trust_input never reach a model that validates its input
+
+        Returns:
+            tuple: (model type, trust input)
+        """
+
+        return self.model_type, self.trust_input
+
+    def parse_examples(self, example):
+        """
+        validate example strings and convert them to the ascii strings expected by vw,
+        structured examples are converted to lists of (feature, value) for each namespace
+
+        Args:
+            example (arraylike(str or dict)): example feature vector(s)
+
+        Returns:
+            list(str or dict): validated example(s)
+        """
+
+        rows = []
         for row in example:
+            if isinstance(row, dict):
+                rows.append(parse_namespaces(row))
+                continue
+            if not isinstance(row, basestring):
+                raise Exception('invalid input: {} expected a feature string or namespace dictionary'.format(row))
             row = row.strip().encode('ascii', 'ignore')
-            if not self.validate(row):
+            if not self.trust_input and not self.validate(row):
                 raise Exception('invalid input: {}'.format(row))
+            rows.append(row)
+
+        return rows
+
+    def predict_parsed(self, example):
+        """
+        provide prediction from examples already validated by parse_examples, using the numpy scorer if it is
+        loaded, otherwise the least busy replica if the model has several
+
+        Args:
+            example (list(str or dict)): validated example(s)
+
+        Returns:
+            arraylike(float): prediction(s)
+        """
+
+        if self.linear is not None:
+            try:
+                return self.linear.predict(example).tolist()
+            except Exception as e:
+                raise Exception('prediction failed: {err} on example {ex}.'.format(err=e, ex=example))
+
+        if self.replicas is None:
+            return self.score(self.process, example)
+
+        return self.replicas.run(self.score, example)
+
+    def check_linear(self):
+        """
+        confirm the numpy scorer matches vw on the model's example, each of its namespaces on its own and the example
+        with feature values halved (see vw_linear.parity_examples)
+
+        Returns:
+            bool: True if all predictions match
+        """
+
+        try:
+            example = self.parse_examples([self.model.example])[0]
+            if not isinstance(example, str):
+                return False
+            examples = self.parse_examples(parity_examples(example))
+            expected = np.asarray(self.score(self.process, examples), dtype=np.float64)
+            prediction = self.linear.predict(examples)
+        except Exception:  # pylint: disable=broad-except
+            return False
+
+        # vw sums in single precision
+        return np.allclose(prediction, expected, rtol=1e-5, atol=1e-5)
+
+    def score(self, process, example):
+        """
+        provide prediction from validated examples with the given vw process.
+        each vw example is finished (released) right after its prediction is read, even if prediction fails
+
+        Args:
+            process (pyvw.vw): vw process to use
+            example (list(str or dict)): validated example(s)
+
+        Returns:
+            arraylike(float): prediction(s)
+        """
+
+        prediction = []
+        for row in example:
             try:
-                ex = self.process.example(row)
-                ex.set_test_only(True)
-                ex.learn()
-                prediction.append(ex.get_simplelabel_prediction())
+                ex = process.example(row if isinstance(row, str) else self.make_features(row))
+                try:
+                    ex.set_test_only(True)
+                    ex.learn()
+                    prediction.append(ex.get_simplelabel_prediction())
+                finally:
+                    # hand the example back to vw's example pool as soon as its prediction is read, otherwise the
+                    # native example memory is only freed when python gets around to collecting the wrapper
+                    ex.finish()
             except Exception as e:
                 raise Exception('prediction failed: {err} on example {ex}.'.format(err=e, ex=row))
 
         return prediction
 
+    def make_features(self, namespaces):
+        """
+        build the feature dictionary used to construct a vw example from parsed namespaces.
+        vw examples index namespaces by their first character, but the text format hashes features with the whole
+        namespace name, so features of longer namespace names are hashed here to give the same predictions
+
+        Args:
+            namespaces (dict): namespace name -> list of (feature, value), as returned by parse_namespaces
+
+        Returns:
+            dict: namespace character -> list of (feature or feature hash, value)
+        """
+
+        features = dict()
+        for name, values in namespaces.iteritems():
+            if len(name) > 1:
+                name_hash = self.namespace_hashes.get(name, None)
+                if name_hash is None:
+                    name_hash = self.namespace_hashes[name] = self.process.hash_space(name)
+                values = [(self.process.hash_feature(f, name_hash), v) for f, v in values]
+
+            key = name[0] if name else ' '
+            if key in features:
+                features[key] = features[key] + values
+            else:
+                features[key] = values
+
+        return features
+
     @staticmethod
     def validate(example):
         """
-        match regular expression defining valid vw input format
+        check example is valid vw input format (see validate_example)
 
         Args:
             example (str): input example
@@ -108,5 +309,126 @@ class VWPredictor(BasePredictor):
             bool: True if input is valid vw format, False otherwise
         """
 
-        match = valid_regex.match(example)
-        return match and match.group(0) == example
+        return validate_example(example)
+
+
+def parse_namespaces(example):
+    """
+    check a structured example and convert it to lists of (feature, value) for each namespace
+
+    Args:
+        example (dict): namespace name -> {feature name: value}
+
+    Returns:
+        dict: namespace name -> list of (feature name, value)
+    """
+
+    namespaces = dict()
+    for name, features in example.iteritems():
+        if not isinstance(name, basestring) or not isinstance(features, dict):
+            raise Exception('invalid input: {} expected namespace -> {{feature: value}}'.format(example))
+        if space_regex.search(name):
+            raise Exception('invalid input: invalid namespace {}'.format(name))
+
+        values = []
+        for feature, value in features.iteritems():
+            if not isinstance(feature, basestring) or isinstance(value, bool) or \
+                    not isinstance(value, (int, long, float)):
+                raise Exception('invalid input: {} expected feature name -> number'.format(features))
+            if isinstance(feature, unicode):
+                feature = feature.encode('utf-8')
+            values.append((feature, float(value)))
+
+        if isinstance(name, unicode):
+            name = name.encode('utf-8')
+        namespaces[name] = values
+
+    return namespaces
+
+
+def is_numbers(tokens):
+    """
+    check tokens only contain number characters, as allowed for labels and importance weights
+
+    Args:
+        tokens (list(str)): space separated tokens
+
+    Returns:
+        bool: True if every token is a non-empty string of number characters
+    """
+
+    return all(tokens) and not ''.join(tokens).strip(NUMBER_CHARS)
+
+
+def is_valid_prefix(prefix):
+    """
+    check the text before a namespace bar is made of at most two numbers (label and importance) followed by an
+    optional tag, either a token right before the bar or a quoted token followed by a space
+
+    Args:
+        prefix (str): text before the bar, must not contain newlines
+
+    Returns:
+        bool: True if prefix is valid
+    """
+
+    if not prefix:
+        return True
+
+    tokens = prefix.split(' ', 3)
+    if tokens[-1]:
+        # ends with a tag right before the bar
+        if len(tokens) == 4:
+            return False
+        tag = tokens.pop()
+    else:
+        tokens.pop()
+        if is_numbers(tokens):
+            return len(tokens) <= 2
+
+        # ends with a quoted tag and a space
+        tag = tokens.pop()
+        if len(tag) < 2 or tag[0] != "'":
+            return False
+
+    return not space_regex.search(tag) and is_numbers(tokens)
+
+
+def validate_example(example):
+    """
+    check example is valid vw input format in one pass, accepting exactly the strings matched in full by valid_regex.
+    the example is valid if some bar has a valid prefix before it (see is_valid_prefix). a tag may itself contain
+    bars, so when the text before the first bar is not a valid prefix the bar may still belong to the tag, in which
+    case a later bar in the same token, or a bar right after a quoted tag, starts the features
+
+    Args:
+        example (str): input example
+
+    Returns:
+        bool: True if input is valid vw format, False otherwise
+    """
+
+    if '\n' in example:
+        return False
+
+    bar = example.find('|')
+    if bar < 0:
+        return False
+
+    head = example[:bar]
+    if is_valid_prefix(head):
+        return True
+
+    # the first bar has to be part of the tag, which starts after the last space before it and can only follow
+    # the label and importance
+    start = head.rfind(' ') + 1
+    if start and (head.count(' ') > 2 or not is_numbers(head[:start - 1].split(' '))):
+        return False
+    if space_regex.search(head, start):
+        return False
+
+    match = space_regex.search(example, bar)
+    end = match.start() if match else len(example)
+
+    # tag followed directly by a bar or quoted tag followed by a space and a bar
+    return example.find('|', bar + 1, end) >= 0 or (example[start] == "'" and example[end:end + 2] == ' |')
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""
+Memory-mapped model weights\n
+Pickled models are split into a sidecar directory named by the sha1 of the model file: the numeric numpy arrays of the
+model are saved as .npy files, and the rest of the model is pickled with references to them. Loading the sidecar
+memory-maps the arrays read-only, so every process (and every restart) that loads the same model file shares the same
+physical pages, and reloading an unchanged model only unpickles the small remainder. Sidecars of model files that are
+no longer kept are removed (see prune_weights), models already loaded from them keep their mapped pages
+"""
+
+import numpy as np
+import os
+import pickle
+import shutil
+import tempfile
+from tools.general import file_sha1
+
+
+# pickled model without its arrays
+SKELETON = 'model.pickle'
+
+
+class WeightPickler(pickle.Pickler):
+    """
+    pickles a model with its numeric arrays replaced by their index in arrays
+    """
+
+    def __init__(self, f):
+        pickle.Pickler.__init__(self, f, pickle.HIGHEST_PROTOCOL)
+        self.arrays = []
+
+    def persistent_id(self, obj):
+        """
+        replace non-empty numeric arrays (and memory-mapped arrays) by a reference
+
+        Args:
+            obj (object): object being pickled
+
+        Returns:
+            str: array index, None to pickle obj normally
+        """
+
+        # empty files cannot be memory-mapped
+        if type(obj) not in (np.ndarray, np.memmap) or obj.dtype.hasobject or not obj.size:
+            return None
+
+        self.arrays.append(obj)
+
+        return str(len(self.arrays) - 1)
+
+
+def load_model(path, weights_dir):
+    """
+    load a pickled model with memory-mapped weights, the sidecar is created on first load of a model file
+
+    Args:
+        path (str): pickled model file
+        weights_dir (str): directory holding sidecars
+
+    Returns:
+        object: model
+    """
+
+    sidecar = os.path.join(weights_dir, file_sha1(path))
+    if not os.path.isdir(sidecar):
+        with open(path, 'rb') as f:
+            model = pickle.load(f)
+        save_weights(model, sidecar)
+
+    return load_weights(sidecar)
+
+
+def save_weights(model, sidecar):
+    """
+    write a model sidecar, the directory is written under a temporary name then renamed so other processes never see
+    a partial sidecar
+
+    Args:
+        model (object): model
+        sidecar (str): sidecar directory
+    """
+
+    parent = os.path.dirname(sidecar)
+    if not os.path.isdir(parent):
+        try:
+            os.makedirs(parent)
+        except OSError:
+            # created by another process
+            if not os.path.isdir(parent):
+                raise
+
+    tmp_dir = tempfile.mkdtemp(prefix='.tmp', dir=parent)
+    try:
+        with open(os.path.join(tmp_dir, SKELETON), 'wb') as f:
+            pickler = WeightPickler(f)
+            pickler.dump(model)
+
+        for i, array in enumerate(pickler.arrays):
+            np.save(os.path.join(tmp_dir, '{}.npy'.format(i)), np.asarray(array))
+
+        os.rename(tmp_dir, sidecar)
+    except OSError:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        # another process saved the same model first
+        if not os.path.isdir(sidecar):
+            raise
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+
+def load_weights(sidecar):
+    """
+    load a model from its sidecar, arrays are memory-mapped read-only
+
+    Args:
+        sidecar (str): sidecar directory
+
+    Returns:
+        object: model
+    """
+
+    with open(os.path.join(sidecar, SKELETON), 'rb') as f:
+        unpickler = pickle.Unpickler(f)
+        unpickler.persistent_load = lambda pid: np.load(os.path.join(sidecar, '{}.npy'.format(pid)), mmap_mode='r')
+        return unpickler.load()
+
+
+def remove_weights(weights_dir, digest):
+    """
+    remove the sidecar of a model file, if there is one
+
+    Args:
+        weights_dir (str): directory holding sidecars
+        digest (str): sha1 of the model file
+    """
+
+    shutil.rmtree(os.path.join(weights_dir, digest), ignore_errors=True)
+
+
+def prune_weights(weights_dir, digests):
+    """
+    remove the sidecars of model files that are no longer kept, sidecars being written are left alone
+
+    Args:
+        weights_dir (str): directory holding sidecars
+        digests (set(str)): sha1 of the model files whose sidecars are kept
+    """
+
+    if not os.path.isdir(weights_dir):
+        return
+
+    for name in os.listdir(weights_dir):
+        if not name.startswith('.') and name not in digests:
+            remove_weights(weights_dir, name)
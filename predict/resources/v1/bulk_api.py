@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""
+Bulk Models API
+"""
+
+from flask import current_app as app
+from flask_restful import Resource, reqparse
+from predict import mgmt
+from predict.models.deployed_model import DeployedModel
+from predict.resources.v1.models_api import model_parser
+from werkzeug.exceptions import BadRequest
+
+
+class BulkModelsApi(Resource):
+    """
+    API for replacing or creating many models at once (e.g. after retraining them)
+    """
+
+    @staticmethod
+    def put():
+        """
+        replace or create predictors for several models together.
+        body of request must contain a models argument, a list with one model per model id. each model must contain
+        model_id and all of the required arguments of a PUT to the Models endpoint, and may contain any of (but no
+        more than) its optional arguments. models are copied and loaded concurrently, then the models loaded are
+        stored and replace their old predictors together. models that fail to load are left as they were
+
+        Args:
+            models (array(dict)): models, see ModelsApi.put
+
+        Returns:
+            json: {'models': array(dict)}, for each model: model_id, error (null if loaded), paused (true if only
+                registered, see LAZY_PAUSED), and the seconds spent downloading, loading, waiting and in total
+        """
+
+        parser = reqparse.RequestParser()
+        parser.add_argument('models', required=True, type=list, location='json', help='list of models')
+        pargs = parser.parse_args(strict=True)
+
+        models = []
+        for i, spec in enumerate(pargs.models):
+            models.append(DeployedModel(**parse_model(spec, index=i)))
+
+        model_ids = [model.model_id for model in models]
+        duplicates = sorted(set(model_id for model_id in model_ids if model_ids.count(model_id) > 1))
+        if duplicates:
+            raise BadRequest('duplicate model ids: {}'.format(', '.join(duplicates)))
+
+        app.logger.debug('bulk put of %d models', len(models))
+
+        return {'models': mgmt.update_predictors(models=models)}
+
+
+class ModelSpec(object):
+    """
+    stands in for the request when parsing one model of a bulk request
+
+    Attributes:
+        json (dict): model arguments
+    """
+
+    def __init__(self, spec):
+        self.json = spec
+
+
+def parse_model(spec, index):
+    """
+    parse the arguments of one model of a bulk request with the same parser as the Models endpoint
+
+    Args:
+        spec (dict): model arguments
+        index (int): position of the model in the request
+
+    Returns:
+        dict: parsed model arguments
+    """
+
+    if not isinstance(spec, dict):
+        raise BadRequest('model {}: expected a dictionary of model arguments'.format(index))
+
+    parser = model_parser()
+    parser.add_argument('model_id', required=True, type=str, help='unique id of model')
+    try:
+        return parser.parse_args(req=ModelSpec(spec), strict=True)
+    except BadRequest as e:
+        # flask-restful keeps the reason in the data of the error
+        message = getattr(e, 'data', {}).get('message', e.description)
+        raise BadRequest('model {}: {}'.format(spec.get('model_id', index), message))
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""
+Low overhead predict API\n
+A plain flask view for latency sensitive callers sending small batches. It skips flask-restful dispatch and request
+parsing: the json body is decoded once with ujson, checked against a fixed schema, and predictions are written with
+a numpy aware json encoder. Responses and errors are the same as the Predict API for json bodies
+"""
+
+from flask import Blueprint, Response, current_app as app, request
+from predict.exceptions import ApiException, ModelNotFoundException
+from predict import mgmt
+import numpy as np
+import ujson
+import json
+
+
+fast_predict_app = Blueprint('fast_predict', __name__, url_prefix='/v1/predict')
+
+# request schema: argument name -> (required, types accepted for each example)
+# numbers are accepted and converted to strings like the Predict API does, dictionaries are structured vw examples
+PREDICT_SCHEMA = {'example': (True, (basestring, int, long, float, dict))}
+
+
+class NumpyEncoder(json.JSONEncoder):
+    """
+    json encoder that also writes numpy arrays and scalars
+    """
+
+    def default(self, o):  # pylint: disable=method-hidden
+        """
+        convert numpy objects to python objects json can write
+
+        Args:
+            o (object): object to convert
+
+        Returns:
+            object: python equivalent of o
+        """
+
+        if isinstance(o, np.ndarray):
+            return o.tolist()
+        if isinstance(o, np.generic):
+            return o.item()
+
+        return super(NumpyEncoder, self).default(o)
+
+
+encoder = NumpyEncoder()
+
+
+def parse_body(data, schema=None):
+    """
+    decode a json request body and check it against a schema
+
+    Args:
+        data (str): request body
+        schema (dict): argument name -> (required, accepted types), defaults to PREDICT_SCHEMA
+
+    Returns:
+        dict: argument name -> list of values
+    """
+
+    schema = PREDICT_SCHEMA if schema is None else schema
+
+    try:
+        body = ujson.loads(data)
+    except ValueError:
+        raise ApiException(name='Bad Request', message='could not decode json body', status_code=400)
+
+    if not isinstance(body, dict):
+        raise ApiException(name='Bad Request', message='expected a json object', status_code=400)
+
+    unknown = [name for name in body if name not in schema]
+    if unknown:
+        raise ApiException(name='Bad Request', message='Unknown arguments: {}'.format(', '.join(unknown)),
+                           status_code=400)
+
+    args = dict()
+    for name, (required, types) in schema.iteritems():
+        values = body.get(name, None)
+        if values is None or values == []:
+            if required:
+                raise ApiException(name='Bad Request', message='missing required argument {}'.format(name),
+                                   status_code=400)
+            continue
+
+        if not isinstance(values, list):
+            values = [values]
+
+        try:
+            if any(isinstance(x, bool) or not isinstance(x, types) for x in values):
+                raise ValueError
+            args[name] = [x if isinstance(x, dict) else str(x) for x in values]
+        except (ValueError, UnicodeEncodeError):
+            raise ApiException(name='Bad Request', message='invalid value for argument {}'.format(name),
+                               status_code=400)
+
+    return args
+
+
+def error_response(e):
+    """
+    write an error the same way the flask-restful apis do
+
+    Args:
+        e (ApiException): error
+
+    Returns:
+        Response: json error string with the error status code
+    """
+
+    app.logger.exception(e.to_string())
+
+    return Response(json.dumps(e.to_string()), status=e.status_code, mimetype='application/json')
+
+
+@fast_predict_app.route('/<model_id>/fast', methods=['POST'])
+def fast_predict(model_id):
+    """
+    provide feature example(s) in a json body and get prediction(s).
+    body must be a json object with one example argument, a string or an array of strings (or structured vw
+    examples).
+    if examples is an array predictions are provided in the same order
+
+    Args:
+        model_id (str): model id of predictor to use
+
+    Returns:
+        json: dictionary {'prediction': float}, or {'prediction': (array(float))} if using multiple examples
+    """
+
+    try:
+        example = parse_body(request.get_data(cache=False))['example']
+        try:
+            prediction = mgmt.predict(model_id=model_id, example=example)
+        except ModelNotFoundException as e:
+            raise e
+        except Exception as e:
+            raise ApiException(exception=e)
+    except ApiException as e:
+        return error_response(e)
+
+    prediction = prediction if len(prediction) > 1 else prediction[0]
+
+    return Response(encoder.encode({'prediction': prediction}), mimetype='application/json')
@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+"""
+Jobs API
+"""
+
+from flask_restful import Resource
+from predict import mgmt
+
+
+class JobsApi(Resource):
+    """
+    API for following background model jobs (models created, updated or patched with ?async=true)
+    """
+
+    @staticmethod
+    def get(job_id):
+        """
+        returns the state of a job
+
+        Args:
+            job_id (str): job id returned when the job was submitted
+
+        Returns:
+            json: dict of job, status is one of pending, running, done or failed. timings has the seconds spent
+                waiting for other jobs of the model, downloading, loading, storing and swapping in the model, and in
+                total. model is the loaded model once done, error the reason a failed job failed
+        """
+
+        return mgmt.get_job_dict(job_id)
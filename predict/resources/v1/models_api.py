@@ -3,9 +3,8 @@
 Models APIs
 """
 
-from flask import current_app as app
-from flask_restful import Resource, reqparse
-from predict.exceptions import ModelExistsException
+from flask import current_app as app, url_for
+from flask_restful import Resource, reqparse, inputs
 from predict import mgmt
 from predict.enums import ModelType, ModelStatus
 from predict.models.deployed_model import DeployedModel
@@ -55,31 +54,24 @@ class ModelsApi(Resource):
             extras (optional, str): additional arguments to use when instantiating the model
             info (optional, str): additional information on the model
             status (optional, str): status of model must be valid member of ModelStatus enum, default 'paused'
+            async (optional, bool): query parameter, load the model in a background job
 
         Returns:
-            json: dictionary loaded model
+            json: dictionary loaded model, or the job (see JobsApi) with status 202 if async
         """
 
-        if model_id in mgmt.get_model_ids():
-            raise ModelExistsException(model_id)
-
         app.logger.debug('post model for model id: %s', model_id)
 
-        parser = reqparse.RequestParser()
-        parser.add_argument('model_type', required=True, type=str, choices=MODEL_TYPES, help='type of model')
-        parser.add_argument('local_path', type=str, help='local path to model')
-        parser.add_argument('remote_path', required=True, type=str, help='remote path to model')
-        parser.add_argument('example', required=True, type=str, help='example feature vector for model')
-        parser.add_argument('output', required=True, type=float, help='expected output of model')
-        parser.add_argument('timestamp', type=int, default=int(time()), help='epoch timestamp when model was trained')
-        parser.add_argument('extras', type=str, default='', help='extra parameters to use with model')
-        parser.add_argument('info', type=str, default='', help='information on the model')
-        parser.add_argument('status', type=str, choices=MODEL_STATUSES, default=ModelStatus.paused,
-                            help='model status')
+        parser = model_parser()
+        parser.add_argument('async', type=inputs.boolean, default=False, location='args',
+                            help='load the model in a background job')
         pargs = parser.parse_args(strict=True)
 
-        # instantiate model
-        mgmt.create_predictor(model=DeployedModel(model_id=model_id, **pargs))
+        if pargs.pop('async'):
+            return job_response(mgmt.submit_job(action='create', model=DeployedModel(model_id=model_id, **pargs)))
+
+        # instantiate model, unless the model id is in use
+        mgmt.add_predictor(model=DeployedModel(model_id=model_id, **pargs))
 
         return mgmt.get_model_dict(model_id), 201
 
@@ -103,26 +95,22 @@ class ModelsApi(Resource):
             extras (optional, str): additional arguments to use when instantiating the model
             info (optional, str): additional information on the model
             status (optional, str): status of model must be valid member of ModelStatus enum, default 'paused'
+            async (optional, bool): query parameter, load the model in a background job
 
         Returns:
-            json: dictionary of updated model
+            json: dictionary of updated model, or the job (see JobsApi) with status 202 if async
         """
 
         app.logger.debug('put model for model id: %s', model_id)
 
-        parser = reqparse.RequestParser()
-        parser.add_argument('model_type', required=True, type=str, choices=MODEL_TYPES, help='type of model')
-        parser.add_argument('local_path', type=str, help='local path to model')
-        parser.add_argument('remote_path', required=True, type=str, help='remote path to model')
-        parser.add_argument('example', required=True, type=str, help='example feature vector for model')
-        parser.add_argument('output', required=True, type=float, help='expected output of model')
-        parser.add_argument('timestamp', type=int, default=int(time()), help='epoch timestamp when model was trained')
-        parser.add_argument('extras', type=str, default='', help='extra parameters to use with model')
-        parser.add_argument('info', type=str, default='', help='information on the model')
-        parser.add_argument('status', type=str, choices=MODEL_STATUSES, default=ModelStatus.paused,
-                            help='model status')
+        parser = model_parser()
+        parser.add_argument('async', type=inputs.boolean, default=False, location='args',
+                            help='load the model in a background job')
         pargs = parser.parse_args(strict=True)
 
+        if pargs.pop('async'):
+            return job_response(mgmt.submit_job(action='update', model=DeployedModel(model_id=model_id, **pargs)))
+
         mgmt.update_predictor(model=DeployedModel(model_id=model_id, **pargs))
 
         return mgmt.get_model_dict(model_id), 200
@@ -146,9 +134,10 @@ class ModelsApi(Resource):
             extras (optional, str): additional arguments to use when instantiating the model
             info (optional, str): additional information on the model
             status (optional, str): status of model must be valid member of ModelStatus enum
+            async (optional, bool): query parameter, load the model in a background job
 
         Returns:
-            json: dictionary of updated model
+            json: dictionary of updated model, or the job (see JobsApi) with status 202 if async
         """
 
         app.logger.debug('patch model for model id: %s', model_id)
@@ -163,9 +152,15 @@ class ModelsApi(Resource):
         parser.add_argument('extras', type=str, help='extra parameters to use with model')
         parser.add_argument('info', type=str, help='information on the model')
         parser.add_argument('status', type=str, choices=MODEL_STATUSES, help='model status')
+        parser.add_argument('async', type=inputs.boolean, default=False, location='args',
+                            help='load the model in a background job')
         pargs = parser.parse_args(strict=False)
 
+        run_async = pargs.pop('async')
         kwargs = dict((k, pargs[k]) for k in pargs if pargs[k] is not None)
+        if run_async:
+            return job_response(mgmt.submit_patch(model_id, **kwargs))
+
         mgmt.patch_predictor(model_id, **kwargs)
 
         return mgmt.get_model_dict(model_id), 200
@@ -186,3 +181,61 @@ class ModelsApi(Resource):
         mgmt.delete_predictor(model_id=model_id)
 
         return '', 204
+
+
+class ModelStatsApi(Resource):
+    """
+    API for usage statistics of a model
+    """
+
+    @staticmethod
+    def get(model_id):
+        """
+        returns usage statistics of a model in the worker process serving the request
+
+        Args:
+            model_id (str): requested model id
+
+        Returns:
+            json: {'model_id': str, 'cache': dict}, cache has the hits, misses, entries and approximate bytes of the
+                model's prediction cache, null if caching is disabled for the model
+        """
+
+        return {'model_id': model_id, 'cache': mgmt.get_cache_stats(model_id=model_id)}
+
+
+def model_parser():
+    """
+    parser for the parameters of a new model, required arguments must be given and optional ones get their defaults
+
+    Returns:
+        RequestParser: model parser
+    """
+
+    parser = reqparse.RequestParser()
+    parser.add_argument('model_type', required=True, type=str, choices=MODEL_TYPES, help='type of model')
+    parser.add_argument('local_path', type=str, help='local path to model')
+    parser.add_argument('remote_path', required=True, type=str, help='remote path to model')
+    parser.add_argument('example', required=True, type=str, help='example feature vector for model')
+    parser.add_argument('output', required=True, type=float, help='expected output of model')
+    parser.add_argument('timestamp', type=int, default=int(time()), help='epoch timestamp when model was trained')
+    parser.add_argument('extras', type=str, default='', help='extra parameters to use with model')
+    parser.add_argument('info', type=str, default='', help='information on the model')
+    parser.add_argument('status', type=str, choices=MODEL_STATUSES, default=ModelStatus.paused,
+                        help='model status')
+
+    return parser
+
+
+def job_response(job):
+    """
+    response for a submitted job, its status can be followed at the job url given in the Location header
+
+    Args:
+        job (Job): submitted job
+
+    Returns:
+        tuple: job dictionary, 202 status and headers
+    """
+
+    return job.to_dict(), 202, {'Location': url_for('jobs', job_id=job.job_id)}
@@ -3,9 +3,33 @@
 Predict APIs
 """
 
+from flask import current_app as app, request, Response
 from flask_restful import Resource, reqparse
 from predict.exceptions import ApiException, ModelNotFoundException
 from predict import mgmt
+from tools.binary_format import NPY_MIMETYPE, NPZ_MIMETYPE, loads_npy, loads_sparse, dumps_npy
+from tools.general import chunks
+import numpy as np
+import json
+
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+STREAM_CHUNK_SIZE = 1000
+
+
+def example_type(value):
+    """
+    request argument type for examples, feature strings are converted to str and structured examples (dictionaries
+    of namespace -> {feature: value}) are kept as is
+
+    Args:
+        value (object): example from the request
+
+    Returns:
+        str or dict: example
+    """
+
+    return value if isinstance(value, dict) else str(value)
 
 
 class PredictApi(Resource):
@@ -20,23 +44,143 @@ class PredictApi(Resource):
         body must only contain one example argument.
         if examples is an array predictions are provided in the same order
 
+        a binary body can be sent instead with content type application/x-npy, it must be a .npy document holding a
+        float matrix with one example per row, or with content type application/x-npz for a sparse matrix (a .npz
+        document of its CSR arrays, see binary_format). predictions are returned as a .npy document of float64 values
+        unless the request only accepts json, then as a list even for a single example
+
         Args:
             model_id (str): model id of predictor to use
-            example (str) or array(str): feature example(s) for predictions
+            example (str) or array(str): feature example(s) for predictions, vw models also accept structured examples
+                as {namespace: {feature: value}}
+
+
+        Returns:
+            json: dictionary {'prediction': float}, or {'prediction': (array(float))} if using multiple examples or a
+                binary body
+        """
+
+        binary = request.mimetype in [NPY_MIMETYPE, NPZ_MIMETYPE]
+
+        if binary:
+            loads, name = (loads_npy, 'npy') if request.mimetype == NPY_MIMETYPE else (loads_sparse, 'npz')
+            try:
+                example = loads(request.get_data(cache=False))
+            except Exception as e:
+                raise ApiException(name='Invalid Input', message='could not read {} body: {}'.format(name, e),
+                                   status_code=400)
+            if example.shape[0] == 0:
+                raise ApiException(name='Invalid Input', message='{} body has no examples'.format(name),
+                                   status_code=400)
+        else:
+            parser = reqparse.RequestParser()
+            parser.add_argument('example', required=True, type=example_type, action='append',
+                                help='feature example for prediction')
+            example = parser.parse_args(strict=True).example
+
+        try:
+            prediction = mgmt.predict(model_id=model_id, example=example)
+        except ModelNotFoundException as e:
+            raise e
+        except Exception as e:
+            raise ApiException(exception=e)
+
+        accept = request.accept_mimetypes
+        if binary and accept.best_match([NPY_MIMETYPE, 'application/json'], default=NPY_MIMETYPE) == NPY_MIMETYPE:
+            return Response(dumps_npy(np.asarray(prediction, dtype=np.float64)), mimetype=NPY_MIMETYPE)
+
+        prediction = np.asarray(prediction).tolist()
+        return {'prediction': prediction} if binary or len(prediction) > 1 else {'prediction': prediction[0]}
+
+
+class PredictStreamApi(Resource):
+    """
+    API for streaming predictions on batches too large to hold in memory
+    """
+
+    @staticmethod
+    def post(model_id):
+        """
+        stream newline delimited json examples and get newline delimited json predictions back.
+        each line of the body is one json encoded example string. examples are read incrementally and scored in chunks
+        of STREAM_CHUNK_SIZE, each prediction is written as one line of the response (in the same order) as soon as its
+        chunk is scored, so memory use does not depend on the size of the batch.
+        the status code is sent before scoring starts, a failure part way through ends the response with a line
+        {"error": str}
+
+        Args:
+            model_id (str): model id of predictor to use
+
+        Returns:
+            ndjson: one prediction (float) per line
+        """
+
+        # report missing or paused models with a normal error response before streaming starts
+        mgmt.check_active(model_id=model_id)
+
+        chunk_size = app.config.get('STREAM_CHUNK_SIZE', STREAM_CHUNK_SIZE)
+
+        # gevent decodes chunked request bodies itself, but werkzeug only exposes bodies with a content length
+        if request.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+            stream = request.environ['wsgi.input']
+        else:
+            stream = request.stream
 
+        # the generator runs after the request context is gone, so it keeps its own application context
+        app_context = app.app_context()
+
+        def generate():
+            """
+            score examples from the request stream one chunk at a time
+            """
+
+            with app_context:
+                try:
+                    examples = (json.loads(line) for line in iter(stream.readline, '') if line.strip())
+                    for example in chunks(examples, chunk_size):
+                        prediction = mgmt.predict(model_id=model_id, example=example)
+                        yield ''.join('{}\n'.format(json.dumps(x)) for x in np.asarray(prediction).tolist())
+                except Exception as e:
+                    error = ApiException(exception=e)
+                    app.logger.exception(error.to_string())
+                    yield '{}\n'.format(json.dumps({'error': error.to_string()}))
+
+        return Response(generate(), mimetype=NDJSON_MIMETYPE)
+
+
+class PredictManyApi(Resource):
+    """
+    API for generating predictions from several loaded models for the same examples
+    """
+
+    @staticmethod
+    def post():
+        """
+        provide feature example(s) and model ids and get prediction(s) from each model.
+        body must contain one or more model_id arguments and one example argument.
+        examples are parsed once for each type of model and models are scored concurrently where possible
+
+        Args:
+            model_id (str) or array(str): model id(s) of predictors to use
+            example (str) or array(str): feature example(s) for predictions
 
         Returns:
-            json: dictionary {'prediction': float}, or {'prediction': (array(float))} if using multiple examples
+            json: dictionary {'prediction': {model_id: float}}, or {'prediction': {model_id: (array(float))}} if using
+                multiple examples
         """
 
         parser = reqparse.RequestParser()
-        parser.add_argument('example', required=True, type=str, action='append', help='feature example for prediction')
+        parser.add_argument('model_id', required=True, type=str, action='append', help='model ids for prediction')
+        parser.add_argument('example', required=True, type=example_type, action='append',
+                            help='feature example for prediction')
         pargs = parser.parse_args(strict=True)
 
         try:
-            prediction = mgmt.predict(model_id=model_id, example=pargs.example)
-            return {'prediction': prediction} if len(prediction) > 1 else {'prediction': prediction[0]}
+            prediction = mgmt.predict_many(model_ids=pargs.model_id, example=pargs.example)
         except ModelNotFoundException as e:
             raise e
         except Exception as e:
             raise ApiException(exception=e)
+
+        prediction = dict((k, np.asarray(v).tolist()) for k, v in prediction.iteritems())
+        return {'prediction': dict((k, v if len(v) > 1 else v[0]) for k, v in prediction.iteritems())}
@@ -1,22 +1,197 @@
 # -*- coding: utf-8 -*-
 # pylint: disable=relative-import
 """
-Script to run gevent wsgi server
+Script to run gevent wsgi server\n
+With --workers above 1 the server runs in pre-fork mode: models are loaded once in the master process, then workers are
+forked to accept requests on the shared listening socket, so model memory is shared copy-on-write between workers.
+A worker that changes a model signals the master (SIGUSR1) which passes the signal on to every worker to reload its
+models from the database. The master restarts workers that die, and workers stop if the master dies
 """
 
 from gevent.wsgi import WSGIServer
 import argparse
+import errno
+import gevent
+import os
+import signal
+import time
 from predict.app_factory import create_app
 from predict.configurations import config
+from predict import mgmt
+
+
+# seconds to wait before restarting a worker that died right after it was started
+RESTART_DELAY = 1
+
+# seconds between checks by workers that their master is still running
+MASTER_CHECK_INTERVAL = 1
+
+
+def notify_master(master_pid):
+    """
+    tell the master process a model has changed so all workers reload it
+
+    Args:
+        master_pid (int): process id of the master
+    """
+
+    if os.getppid() == master_pid:
+        os.kill(master_pid, signal.SIGUSR1)
+
+
+def watch_master(server, master_pid):
+    """
+    stop serving once the master has gone, so workers are not left running on their own
+
+    Args:
+        server (WSGIServer): worker server
+        master_pid (int): process id of the master
+    """
+
+    while os.getppid() == master_pid:
+        gevent.sleep(MASTER_CHECK_INTERVAL)
+
+    server.stop()
+
+
+def run_worker(app, server, master_pid):
+    """
+    serve requests in a forked worker process until it is killed
+
+    Args:
+        app (object): flask app
+        server (WSGIServer): server with the listening socket already open
+        master_pid (int): process id of the master
+    """
+
+    gevent.reinit()
+
+    for signum in [signal.SIGUSR1, signal.SIGTERM, signal.SIGINT]:
+        signal.signal(signum, signal.SIG_DFL)
+
+    with app.app_context():
+        mgmt.start_worker()
+
+    def sync():
+        """
+        reload models changed by other workers
+        """
+
+        with app.app_context():
+            mgmt.sync_predictors()
+
+    mgmt.on_model_change = lambda model_id: notify_master(master_pid)
+    gevent.signal(signal.SIGUSR1, sync)
+    gevent.spawn(watch_master, server, master_pid)
+
+    server.serve_forever()
+
+
+def fork_worker(app, server):
+    """
+    fork a worker process
+
+    Args:
+        app (object): flask app
+        server (WSGIServer): server with the listening socket already open
+
+    Returns:
+        int: worker process id
+    """
+
+    master_pid = os.getpid()
+
+    pid = os.fork()
+    if pid == 0:
+        status = 0
+        try:
+            run_worker(app, server, master_pid)
+        except Exception as e:
+            app.logger.exception('worker %s failed: %s', os.getpid(), e)
+            status = 1
+        finally:
+            os._exit(status)  # pylint: disable=protected-access
+
+    app.logger.debug('started worker %s', pid)
+
+    return pid
+
+
+def prefork(app, server, n_workers):
+    """
+    fork workers and supervise them until the master is stopped with SIGTERM or SIGINT
+
+    Args:
+        app (object): flask app, with models already loaded
+        server (WSGIServer): server to run in each worker
+        n_workers (int): number of worker processes
+    """
+
+    # open the listening socket once so every worker accepts on it
+    server.init_socket()
+
+    workers = dict()
+    stopping = []
+
+    def relay(signum, frame):
+        """
+        pass a model change on to every worker
+        """
+
+        for pid in list(workers):
+            try:
+                os.kill(pid, signal.SIGUSR1)
+            except OSError:
+                pass
+
+    def stop(signum, frame):
+        """
+        stop all workers, the master exits once they are gone
+        """
+
+        stopping.append(signum)
+        for pid in list(workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except OSError:
+                pass
+
+    signal.signal(signal.SIGUSR1, relay)
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for _ in range(n_workers):
+        workers[fork_worker(app, server)] = time.time()
+
+    while workers:
+        try:
+            pid, status = os.wait()
+        except OSError as e:
+            if e.errno == errno.EINTR:
+                continue
+            raise
+
+        started = workers.pop(pid, None)
+        if started is None or stopping:
+            continue
+
+        app.logger.error('worker %s exited with status %s, restarting', pid, status)
+        if time.time() - started < RESTART_DELAY:
+            time.sleep(RESTART_DELAY)
+        workers[fork_worker(app, server)] = time.time()
 
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument('--port', default=8080, type=int, help='Server port')
     parser.add_argument('--env', default='test', choices=config.keys(), help='Configuration Environment')
+    parser.add_argument('--workers', default=1, type=int, help='Number of worker processes (pre-fork mode if > 1)')
     pargs = parser.parse_args()
 
     wgsi = create_app(env=pargs.env)
 
     http_server = WSGIServer(listener=('', pargs.port), application=wgsi)
-    http_server.serve_forever()
+    if pargs.workers > 1:
+        prefork(app=wgsi, server=http_server, n_workers=pargs.workers)
+    else:
+        http_server.serve_forever()
@@ -13,6 +13,8 @@ import os
 
 MAX_MODELS = 1000
 MODELS_API_URL = '/v1/models'
+BULK_API_URL = '/v1/bulk/models'
+BULK_SIZE = 100
 PAYLOAD = get_vw_payload(1)
 HEADERS = {'Content-type': 'application/json'}
 
@@ -41,6 +43,21 @@ class BuildModels(TaskSet):
         # don't create more than max models
         self.model_id = (self.model_id + 1) % MAX_MODELS
 
+    @task
+    def add_models(self):
+        """ check that all models of a bulk request were built """
+
+        models = [dict(model_id=str((self.model_id + i) % MAX_MODELS), **PAYLOAD) for i in range(BULK_SIZE)]
+        with self.client.put(BULK_API_URL, data=json.dumps({'models': models}), catch_response=True,
+                             headers=HEADERS) as response:
+            if response.status_code != 200:
+                response.failure('invalid response: {}'.format(response.content))
+            elif any(report['error'] is not None for report in response.json()['models']):
+                response.failure('models failed to build: {}'.format(response.content))
+
+        # don't create more than max models
+        self.model_id = (self.model_id + BULK_SIZE) % MAX_MODELS
+
 
 class WebsiteUser(HttpLocust):
     """ set up a locust tasked with building models """
@@ -96,6 +96,29 @@ def get_vw_payload(row):
     return payload
 
 
+def get_vw_namespaces(example):
+    """
+    converts a vw input format string into a structured example
+
+    Args:
+        example (str): vw input format example
+
+    Returns:
+        dict: namespace -> {feature: value}
+    """
+
+    namespaces = dict()
+    for part in example.split('|')[1:]:
+        name = '' if part.startswith(' ') else part.split()[0]
+        features = part.split()[0 if not name else 1:]
+        values = namespaces.setdefault(name, dict())
+        for feature in features:
+            feature, _, value = feature.partition(':')
+            values[feature] = float(value) if value else 1.
+
+    return namespaces
+
+
 def get_vw_params(row):
     """
     generates data for expected result of creating one vw predictor (matching get_vw_payload)
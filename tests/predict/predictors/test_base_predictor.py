@@ -4,7 +4,7 @@ Test base predictor class
 """
 
 import pytest
-from predict.predictors.base_predictor import BasePredictor
+from predict.predictors.base_predictor import BasePredictor, split_extras
 
 
 # pylint: disable=super-init-not-called
@@ -65,3 +65,18 @@ def test_abstract_methods():
         predictor.predict()
     assert e.value.message == 'cannot call abstract predict method in base predictor class'
 
+
+def test_agent_options():
+    """
+    test ml-agent options are separated from model extras
+    """
+
+    options, extras = split_extras('--loss_function=logistic --agent_batch_window=0.01 --agent_trust_input -b 18')
+    assert options == {'batch_window': '0.01', 'trust_input': ''}
+    assert extras == '--loss_function=logistic -b 18'
+
+    predictor = TestPredictor(model=None)
+    predictor.options = options
+    assert predictor.get_option('batch_window', cast=float) == 0.01
+    assert predictor.get_option('trust_input', cast=bool)
+    assert predictor.get_option('batch_size', default=8, cast=int) == 8
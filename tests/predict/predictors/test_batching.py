@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""
+Test micro-batching of concurrent requests
+"""
+
+import gevent
+from predict.predictors.batching import MicroBatcher
+
+
+calls = []
+
+
+def double(example):
+    """
+    fake predict function, fails on negative examples
+
+    Args:
+        example (arraylike(int)): examples
+
+    Returns:
+        list(int): doubled examples
+    """
+
+    if min(example) < 0:
+        raise Exception('invalid input')
+    calls.append(list(example))
+    return [x * 2 for x in example]
+
+
+def test_coalesce():
+    """
+    test concurrent requests are scored with one call and each gets its own predictions
+    """
+
+    del calls[:]
+    batcher = MicroBatcher(predict=double, window=0.01, max_size=100)
+
+    jobs = [gevent.spawn(batcher.submit, [i, i + 10]) for i in range(3)]
+    gevent.joinall(jobs)
+
+    assert [job.value for job in jobs] == [[0, 20], [2, 22], [4, 24]]
+    assert calls == [[0, 10, 1, 11, 2, 12]]
+
+
+def test_max_size():
+    """
+    test a full batch is scored without waiting for the window
+    """
+
+    del calls[:]
+    batcher = MicroBatcher(predict=double, window=60, max_size=2)
+
+    assert batcher.submit([1, 2]) == [2, 4]
+    assert batcher.timer is None
+
+
+def test_error_isolation():
+    """
+    test an invalid request does not fail the others in its batch
+    """
+
+    batcher = MicroBatcher(predict=double, window=0.01, max_size=100)
+
+    good = gevent.spawn(batcher.submit, [1])
+    bad = gevent.spawn(batcher.submit, [-1])
+    gevent.joinall([good, bad])
+
+    assert good.value == [2]
+    assert bad.exception.message == 'invalid input'
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""
+Test prediction result cache
+"""
+
+import time
+from predict.predictors.cache import PredictionCache
+
+
+def test_lru():
+    """
+    test least recently used predictions are evicted first
+    """
+
+    cache = PredictionCache(max_entries=2)
+    cache.put(1, 'a', 1.0)
+    cache.put(1, 'b', 2.0)
+    assert cache.get(1, 'a') == 1.0
+
+    cache.put(1, 'c', 3.0)
+    assert cache.get(1, 'b') is None
+    assert cache.get(1, 'a') == 1.0
+    assert cache.get(1, 'c') == 3.0
+    assert cache.stats()['entries'] == 2
+    assert (cache.hits, cache.misses) == (3, 1)
+
+
+def test_version():
+    """
+    test predictions from other predictor versions are not returned
+    """
+
+    cache = PredictionCache(max_entries=10)
+    cache.put(1, 'a', 1.0)
+    assert cache.get(2, 'a') is None
+    assert cache.get(1, u'a') == 1.0
+
+
+def test_bytes():
+    """
+    test the byte limit bounds the number of entries
+    """
+
+    cache = PredictionCache(max_entries=100)
+    cache.put(1, 'a', 1.0)
+    size = cache.bytes
+
+    cache = PredictionCache(max_entries=100, max_bytes=3 * size)
+    for x in 'abcdef':
+        cache.put(1, x, 1.0)
+    assert cache.stats()['entries'] == 3
+    assert cache.bytes <= 3 * size
+    assert cache.get(1, 'f') == 1.0
+
+
+def test_ttl():
+    """
+    test predictions expire
+    """
+
+    cache = PredictionCache(max_entries=10, ttl=0.01)
+    cache.put(1, 'a', 1.0)
+    assert cache.get(1, 'a') == 1.0
+
+    time.sleep(0.02)
+    assert cache.get(1, 'a') is None
+    assert cache.stats()['entries'] == 0
+    assert cache.bytes == 0
+
+
+def test_clear():
+    """
+    test clearing keeps counters
+    """
+
+    cache = PredictionCache(max_entries=10)
+    cache.put(1, 'a', 1.0)
+    cache.get(1, 'a')
+    cache.clear()
+    assert cache.get(1, 'a') is None
+    assert cache.stats() == {'hits': 1, 'misses': 1, 'entries': 0, 'bytes': 0}
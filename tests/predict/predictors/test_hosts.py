@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""
+Test model host processes
+"""
+
+import mmap
+import os
+import time
+import gevent
+import numpy as np
+import pytest
+from scipy.sparse import csr_matrix, issparse
+from predict.predictors.hosts import HostPool, HostExited, encode, decode, write, STRINGS, FLOATS, MARSHALED, SPARSE
+
+
+class FakePredictor(object):
+    """
+    stands in for a loaded predictor, scores run in the host process
+    """
+
+    @staticmethod
+    def predict(example):
+        """
+        fake scoring: length of feature strings, sum of float rows, number of namespaces of structured examples.
+        'bad' raises an error, 'crash' ends the host
+
+        Args:
+            example (array(str)): examples
+
+        Returns:
+            list(float): predictions
+        """
+
+        if isinstance(example, np.ndarray) or issparse(example):
+            return np.asarray(example.sum(axis=1)).ravel()
+        if 'bad' in example:
+            raise AssertionError('bad example')
+        if 'crash' in example:
+            os._exit(3)  # pylint: disable=protected-access
+        if 'slow' in example:
+            time.sleep(0.2)
+
+        return [float(len(x)) for x in example]
+
+
+@pytest.yield_fixture
+def pool():
+    """
+    test fixture for a pool of two hosts with small slots
+
+    Returns:
+        HostPool: host pool
+    """
+
+    pool = HostPool(predictor=FakePredictor(), n_hosts=2, slots=2, slot_bytes=64)
+
+    yield pool
+
+    pool.stop()
+
+
+def test_encode():
+    """
+    test batches are copied to and from a slot unchanged
+    """
+
+    buf = mmap.mmap(-1, 256)
+    batches = [(['a b', '', 'c'], STRINGS),
+               (['a\nb', 'c'], MARSHALED),
+               ([{'a': {'b': 1.0}}, 'c'], MARSHALED),
+               (np.arange(6).reshape(2, 3), FLOATS),
+               (csr_matrix(np.array([[0, 1.5], [0, 0], [2, 0]])), SPARSE)]
+
+    for example, expected in batches:
+        kind, rows, cols, data = encode(example)
+        assert kind == expected
+        size = write(buf, 32, data)
+        decoded = decode(buf, 32, kind, rows, cols, size)
+        if kind == SPARSE:
+            assert np.array_equal(decoded.toarray(), example.toarray())
+        elif kind == FLOATS:
+            assert np.array_equal(decoded, example)
+        else:
+            assert decoded == example
+
+
+def test_predict(pool):
+    """
+    test predictions from hosts match the predictor and large batches are split
+    """
+
+    example = ['a', 'bb', 'ccc']
+    assert pool.predict(example).tolist() == [1.0, 2.0, 3.0]
+
+    example = ['x' * i for i in range(40)]
+    assert pool.predict(example).tolist() == [float(i) for i in range(40)]
+
+    example = np.ones((10, 2))
+    assert pool.predict(example).tolist() == [2.0] * 10
+
+    example = csr_matrix(np.eye(10))
+    assert pool.predict(example).tolist() == [1.0] * 10
+
+    with pytest.raises(ValueError):
+        pool.predict(['x' * 100])
+
+
+def test_concurrent(pool):
+    """
+    test concurrent requests are spread across hosts
+    """
+
+    jobs = [gevent.spawn(pool.predict, ['slow', 'x' * i]) for i in range(4)]
+    gevent.joinall(jobs, timeout=2)
+
+    assert [job.value.tolist() for job in jobs] == [[4.0, float(i)] for i in range(4)]
+    assert pool.busy == [0, 0]
+    assert len(set(host.pid for host in pool.hosts)) == 2
+
+
+def test_errors(pool):
+    """
+    test errors are raised with their type and a host that exits is replaced
+    """
+
+    with pytest.raises(AssertionError) as e:
+        pool.predict(['bad'])
+    assert e.value.message == 'bad example'
+
+    pids = [host.pid for host in pool.hosts]
+    with pytest.raises(HostExited):
+        pool.predict(['crash'])
+    gevent.sleep(0.1)
+
+    assert pool.predict(['a', 'bb']).tolist() == [1.0, 2.0]
+    assert pool.predict(['a', 'bb']).tolist() == [1.0, 2.0]
+    assert len(set(host.pid for host in pool.hosts) - set(pids)) == 1
+
+
+def test_stop(pool):
+    """
+    test stopped hosts finish their batches and exit
+    """
+
+    job = gevent.spawn(pool.predict, ['slow'])
+    gevent.sleep(0.05)
+    pool.stop()
+
+    assert job.get(timeout=1).tolist() == [4.0]
+
+    gevent.sleep(0.1)
+    assert not any(host.alive for host in pool.hosts)
+    for host in pool.hosts:
+        with pytest.raises(OSError):
+            os.kill(host.pid, 0)
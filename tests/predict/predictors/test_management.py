@@ -4,14 +4,23 @@
 Test management layer
 """
 
+import errno
+import gevent
 import pytest
 import shutil
+import socket
 import os
+import subprocess
 from time import time
 from predict.models.deployed_model import DeployedModel
+from predict.models.model_job import ModelJob
 from predict import mgmt, db
-from predict.exceptions import ApiException
-from tests.predict.conftest import get_vw_params
+from predict.exceptions import ApiException, ModelNotActive, ModelExistsException, JobNotFoundException
+from predict.enums import JobStatus, ModelStatus
+from predict.predictors.paused_predictor import PausedPredictor
+from predict.predictors.transfers import BaseTransfer, LocalTransfer, TRANSFERS
+from tests.predict.conftest import get_vw_params, get_sklearn_payload
+from tools.general import precision_compare, file_sha1
 
 
 load_model_data = [(None, ' ', 'missing model id'),
@@ -42,31 +51,25 @@ def test_load_model_file(app, tmpdir, monkeypatch, model_id, remote_path, error)
     src = str(full_path)
     dest = '{dir}/{id}/{filename}'.format(dir=app.config['MODEL_DIR'], id=model_id, filename=filename)
 
-    # define command to execute based on protocol in remote path
+    # define transfer expected for the protocol in remote path
     if remote_path:
         remote_path += src
-        if remote_path.startswith('hdfs'):
-            cmd = '{cmd} fs -copyToLocal {src} {dest}'.format(cmd=app.config['HADOOP'], src=src, dest=dest)
-        elif remote_path.startswith('http') or remote_path.startswith('ftp'):
-            cmd = 'wget -q {src} -O {dest}'.format(src=src, dest=dest)
-        elif remote_path.startswith('local'):
-            cmd = 'cp {src} {dest}'.format(src=src, dest=dest)
-        elif remote_path.startswith('scp'):
-            cmd = 'scp {src} {dest}'.format(src=src, dest=dest)
-
-    def mock_run_process(command, logger=None):
+        transfer = TRANSFERS.get(remote_path.split('://')[0])
+
+    def mock_fetch(self, local_path):
         """
-        mock run_process to check if correct command is being issued to shell
-        then manually copy src file to dest, and return dest path
+        mock fetch to check if the correct transfer is used then manually copy src file to dest
         """
 
-        assert command == cmd
+        assert type(self) == transfer
+        assert self.source == src
+        assert local_path == dest
         if not error:
             shutil.copy(src, dest)
-        return dest
+        return None
 
-    # need to patch mgmt's run_process method with mock_run_process
-    monkeypatch.setattr(mgmt, 'run_process', mock_run_process)
+    # need to patch fetch of transfers with mock_fetch
+    monkeypatch.setattr(BaseTransfer, 'fetch', mock_fetch)
 
     try:
         local_path = mgmt.load_model_file(model_id=model_id, remote_path=remote_path)
@@ -141,6 +144,436 @@ def test_model_deletion(app):
     shutil.rmtree(os.path.dirname(tmp_local_path))
 
 
+def test_sync_predictors(app, monkeypatch):
+    """
+    test that predictors follow model changes made by other processes
+    """
+
+    changes = []
+    monkeypatch.setattr(mgmt, 'on_model_change', changes.append)
+
+    model = DeployedModel(**dict(model_id='3', **get_sklearn_payload(1)))
+    mgmt.create_predictor(model)
+    assert changes == ['3']
+    version = mgmt.predictors['3'].version
+
+    # nothing changed in the database
+    mgmt.sync_predictors()
+    assert mgmt.predictors['3'].version == version
+
+    # another process changed the model
+    model = DeployedModel.query.filter(DeployedModel.model_id == '3').first()
+    model.info = '{"cycle_id": 5678}'
+    db.session.commit()
+    mgmt.sync_predictors()
+    assert mgmt.predictors['3'].version > version
+    assert mgmt.get_model_dict('3')['info'] == '{"cycle_id": 5678}'
+
+    # another process deleted the model
+    db.session.delete(model)
+    db.session.commit()
+    mgmt.sync_predictors()
+    assert '3' not in mgmt.get_model_ids()
+
+
+def test_create_predictors(app, monkeypatch):
+    """
+    test models are loaded concurrently at startup and a model that fails does not stop the others
+    """
+
+    monkeypatch.setitem(app.config, 'STARTUP_DOWNLOADS', 1)
+    bad = dict(get_sklearn_payload(3), remote_path='blrg:///foo.bar')
+    for model_id, payload in [('4', get_sklearn_payload(1)), ('5', get_sklearn_payload(2)), ('6', bad)]:
+        db.session.add(DeployedModel(model_id=model_id, **payload))
+    db.session.commit()
+
+    report = dict((x['model_id'], x) for x in mgmt.create_predictors())
+    assert {'4', '5'} <= set(mgmt.get_model_ids())
+    assert '6' not in mgmt.get_model_ids()
+
+    assert report['4']['error'] is None and report['5']['error'] is None
+    assert report['4']['total'] >= report['4']['download'] + report['4']['load']
+    assert report['6']['error'].startswith('unknown transfer protocol')
+
+    model = DeployedModel.query.filter(DeployedModel.model_id == '4').first()
+    assert model.local_path == '{}/4/sklearn.model'.format(app.config['MODEL_DIR'])
+    assert mgmt.get_model_dict('4') == model.to_dict()
+
+    db.session.delete(DeployedModel.query.filter(DeployedModel.model_id == '6').first())
+    db.session.commit()
+
+
+def test_lazy_paused(app, monkeypatch):
+    """
+    test paused models are only copied and loaded when they are made active with LAZY_PAUSED
+    """
+
+    monkeypatch.setitem(app.config, 'LAZY_PAUSED', True)
+    copies = []
+    load_model_file = mgmt.load_model_file
+
+    def counted_load_model_file(model_id, remote_path, version=None):
+        """
+        count model file copies
+        """
+
+        copies.append(model_id)
+        return load_model_file(model_id=model_id, remote_path=remote_path, version=version)
+
+    monkeypatch.setattr(mgmt, 'load_model_file', counted_load_model_file)
+
+    payload = get_sklearn_payload(1)
+    local_path = '{}/7/sklearn.model'.format(app.config['MODEL_DIR'])
+    mgmt.update_predictor(DeployedModel(model_id='7', **dict(payload, status='paused')))
+    assert isinstance(mgmt.predictors['7'], PausedPredictor)
+    assert mgmt.get_model_dict('7')['local_path'] == local_path
+    assert not copies and not os.path.exists(local_path)
+    with pytest.raises(ModelNotActive):
+        mgmt.predict('7', [payload['example']])
+
+    # activation copies and loads the model
+    mgmt.patch_predictor('7', status='active')
+    assert copies == ['7']
+    assert precision_compare(payload['output'], mgmt.predict('7', [payload['example']])[0])
+
+    # pausing keeps the file, so activating again does not copy it
+    mgmt.patch_predictor('7', status='paused')
+    mgmt.patch_predictor('7', status='active')
+    assert copies == ['7']
+
+    # paused models that were never copied can be deleted
+    mgmt.update_predictor(DeployedModel(model_id='7', **dict(payload, status='paused')))
+    assert not os.path.exists(local_path)
+    mgmt.delete_predictor('7')
+    assert '7' not in mgmt.get_model_ids()
+
+    # a broken paused model is accepted, and rejected when it is made active
+    mgmt.update_predictor(DeployedModel(model_id='7', **dict(payload, status='paused', remote_path='blrg:///a.b')))
+    with pytest.raises(Exception) as e:
+        mgmt.patch_predictor('7', status='active')
+    assert str(e.value).startswith('unknown transfer protocol blrg')
+    assert mgmt.get_model_dict('7')['status'] == 'paused'
+    assert DeployedModel.query.filter_by(model_id='7').one().status == 'paused'
+    mgmt.delete_predictor('7')
+
+
+def test_paused_verified(app):
+    """
+    test paused models are loaded and verified by default, so a broken model is rejected right away
+    """
+
+    payload = get_sklearn_payload(1)
+    mgmt.update_predictor(DeployedModel(model_id='7', **dict(payload, status='paused')))
+    assert not isinstance(mgmt.predictors['7'], PausedPredictor)
+    assert os.path.isfile(mgmt.get_model_dict('7')['local_path'])
+    with pytest.raises(ModelNotActive):
+        mgmt.predict('7', [payload['example']])
+    mgmt.delete_predictor('7')
+
+    with pytest.raises(Exception) as e:
+        mgmt.update_predictor(DeployedModel(model_id='7', **dict(payload, status='paused', remote_path='blrg:///a.b')))
+    assert str(e.value).startswith('unknown transfer protocol blrg')
+    assert '7' not in mgmt.get_model_ids()
+
+
+def test_prefetch_paused(app, monkeypatch):
+    """
+    test paused model files can be copied in the background
+    """
+
+    monkeypatch.setitem(app.config, 'LAZY_PAUSED', True)
+    monkeypatch.setitem(app.config, 'PREFETCH_PAUSED', True)
+
+    mgmt.update_predictor(DeployedModel(model_id='8', **dict(get_sklearn_payload(1), status='paused')))
+    mgmt.finish_prefetch('8')
+    assert os.path.isfile(mgmt.get_model_dict('8')['local_path'])
+    assert isinstance(mgmt.predictors['8'], PausedPredictor)
+
+    mgmt.delete_predictor('8')
+    assert '8' not in mgmt.get_model_ids()
+
+
+def test_model_store(app, monkeypatch):
+    """
+    test unchanged model files, or files copied for the same remote path and version if they cannot be checked, are
+    linked from the store instead of copied
+    """
+
+    payload = get_sklearn_payload(1)
+    first = mgmt.load_model_file(model_id='20', remote_path=payload['remote_path'], version=1)
+
+    def fail(self, local_path):
+        raise AssertionError('model file copied')
+
+    monkeypatch.setattr(BaseTransfer, 'fetch', fail)
+    second = mgmt.load_model_file(model_id='21', remote_path=payload['remote_path'], version=1)
+    assert os.path.samefile(first, second)
+
+    # the remote file is unchanged for a new version
+    third = mgmt.load_model_file(model_id='22', remote_path=payload['remote_path'], version=2)
+    assert os.path.samefile(first, third)
+
+    # without remote metadata only the same version is linked
+    monkeypatch.setattr(LocalTransfer, 'stat', lambda self, previous=None: None)
+    assert os.path.samefile(first, mgmt.load_model_file(model_id='22', remote_path=payload['remote_path'], version=1))
+    with pytest.raises(ApiException):
+        mgmt.load_model_file(model_id='22', remote_path=payload['remote_path'], version=3)
+
+    # files of models not in the database are removed at startup
+    mgmt.prune_model_dir()
+    assert not os.path.exists(os.path.dirname(first))
+    assert not os.path.exists(os.path.dirname(second))
+    assert not os.path.exists(os.path.dirname(third))
+
+
+def test_conditional_fetch(app, tmpdir, monkeypatch):
+    """
+    test unchanged remote files are not copied again for a new version, and unchanged models are not reloaded
+    """
+
+    src = tmpdir.join('sklearn.model')
+    shutil.copy(get_sklearn_payload(1)['local_path'], str(src))
+    payload = dict(get_sklearn_payload(1), remote_path='local://{}'.format(src), timestamp=1)
+    mgmt.update_predictor(DeployedModel(model_id='23', **payload))
+    first = mgmt.get_model_dict('23')['local_path']
+
+    copies = []
+    fetch = BaseTransfer.fetch
+
+    def counted_fetch(self, local_path):
+        copies.append(local_path)
+        return fetch(self, local_path=local_path)
+
+    monkeypatch.setattr(BaseTransfer, 'fetch', counted_fetch)
+
+    # a new version of the same file is linked from the store
+    mgmt.update_predictor(DeployedModel(model_id='23', **dict(payload, timestamp=2)))
+    assert copies == []
+    assert os.path.samefile(first, mgmt.get_model_dict('23')['local_path'])
+
+    # unchanged models are kept by reload
+    predictor = mgmt.predictors['23']
+    mgmt.reload_predictor('23')
+    assert mgmt.predictors['23'] is predictor
+
+    # changed files are copied and loaded
+    os.utime(str(src), (1, 1))
+    mgmt.reload_predictor('23')
+    assert len(copies) == 1
+    assert mgmt.predictors['23'] is not predictor
+
+    mgmt.delete_predictor('23')
+
+
+def test_predict_many_trust_input(app):
+    """
+    test examples parsed for a model trusting its input are not shared with models validating their input
+    """
+
+    trusted = get_vw_params(1)
+    trusted['extras'] += ' --agent_trust_input'
+    mgmt.create_predictor(DeployedModel(model_id='27', **trusted))
+    mgmt.create_predictor(DeployedModel(model_id='28', **get_vw_params(1)))
+    assert mgmt.predictors['27'].parse_key() != mgmt.predictors['28'].parse_key()
+
+    prediction = mgmt.predict_many(model_ids=['27', '28'], example=[trusted['example']])
+    assert precision_compare(prediction['27'][0], prediction['28'][0])
+
+    # the trusted model is parsed first, the invalid example must still be rejected for the other model
+    with pytest.raises(Exception) as e:
+        mgmt.predict_many(model_ids=['27', '28'], example=['a'])
+    assert 'invalid input' in str(e.value)
+
+    mgmt.delete_predictor('27')
+    mgmt.delete_predictor('28')
+
+
+def test_update_predictors(app):
+    """
+    test several predictors are replaced together and a model that fails to load is left as it was
+    """
+
+    payload = get_sklearn_payload(1)
+    mgmt.create_predictor(model=DeployedModel(model_id='25', **payload))
+    mgmt.create_predictor(model=DeployedModel(model_id='26', **payload))
+    old = mgmt.predictors['25']
+
+    reports = mgmt.update_predictors(models=[DeployedModel(model_id='25', **dict(payload, timestamp=2)),
+                                             DeployedModel(model_id='26', **dict(payload, remote_path='blrg:///a.b'))])
+    assert [report['error'] is None for report in reports] == [True, False]
+    assert 'predictor' not in reports[0] and reports[0]['total'] >= reports[0]['load']
+
+    assert mgmt.predictors['25'] is not old
+    assert mgmt.get_model_dict('25')['timestamp'] == 2
+    assert DeployedModel.query.filter_by(model_id='25').one().timestamp == 2
+    assert mgmt.get_model_dict('26')['remote_path'] == payload['remote_path']
+    assert DeployedModel.query.filter_by(model_id='26').one().remote_path == payload['remote_path']
+
+    mgmt.delete_predictor('25')
+    mgmt.delete_predictor('26')
+
+
+def test_prune_weights_dir(app):
+    """
+    test sidecars of model files no longer in the store are removed
+    """
+
+    mgmt.create_predictor(model=DeployedModel(model_id='29', **get_sklearn_payload(1)))
+    weights_dir = app.config['WEIGHTS_DIR']
+    digest = file_sha1(mgmt.get_model('29').local_path)
+    assert digest in mgmt.get_store().digests() and os.path.isdir(os.path.join(weights_dir, digest))
+
+    os.mkdir(os.path.join(weights_dir, 'abc'))
+    mgmt.prune_weights_dir()
+    assert os.path.isdir(os.path.join(weights_dir, digest)) and not os.path.exists(os.path.join(weights_dir, 'abc'))
+
+    # the store removes the sidecar of a file it evicts
+    mgmt.evict_weights(digest)
+    assert not os.path.exists(os.path.join(weights_dir, digest))
+
+    mgmt.delete_predictor('29')
+
+
+def test_stored_in_use(app, tmpdir, monkeypatch):
+    """
+    test stored files copied to model files (the store is on another file system) are in use while a model has them
+    """
+
+    def cross_device(source, link_name):
+        raise OSError(errno.EXDEV, 'Invalid cross-device link')
+
+    monkeypatch.setattr(os, 'link', cross_device)
+
+    mgmt.create_predictor(model=DeployedModel(model_id='34', **get_sklearn_payload(1)))
+    local_path = mgmt.get_model('34').local_path
+    digest = file_sha1(local_path)
+    assert os.stat(local_path).st_nlink == 1
+    assert mgmt.get_store().in_use == mgmt.stored_in_use
+    assert mgmt.stored_in_use(digest)
+
+    # a stored file without a model
+    unused = tmpdir.join('unused.model')
+    unused.write('no model has these contents')
+    stored = mgmt.get_store().add(str(unused))
+    unused.remove()
+    assert not mgmt.stored_in_use(os.path.basename(stored))
+
+    mgmt.delete_predictor('34')
+
+
+def test_jobs(app):
+    """
+    test jobs for the same model run in order and swap in their predictors once loaded
+    """
+
+    payload = get_sklearn_payload(1)
+    first = mgmt.submit_job(action='update', model=DeployedModel(model_id='24', **dict(payload, timestamp=1)))
+    second = mgmt.submit_job(action='update', model=DeployedModel(model_id='24', **dict(payload, timestamp=2)))
+    assert first.status == second.status == JobStatus.pending
+    assert '24' not in mgmt.get_model_ids()
+
+    assert second.wait(timeout=60)
+    assert first.status == second.status == JobStatus.done
+    assert first.model['timestamp'] == 1 and second.model['timestamp'] == 2
+    assert mgmt.get_model_dict('24')['timestamp'] == 2
+    assert DeployedModel.query.filter_by(model_id='24').one().timestamp == 2
+    assert mgmt.get_job_dict(second.job_id)['status'] == JobStatus.done
+
+    with pytest.raises(JobNotFoundException):
+        mgmt.get_job_dict('missing')
+
+    # a synchronous change waits for the running job of the model
+    third = mgmt.submit_job(action='update', model=DeployedModel(model_id='24', **dict(payload, timestamp=3)))
+    gevent.sleep(0)
+    assert third.status == JobStatus.running
+    mgmt.update_predictor(DeployedModel(model_id='24', **dict(payload, timestamp=4)))
+    assert third.status == JobStatus.done
+    assert mgmt.get_model_dict('24')['timestamp'] == 4
+
+    mgmt.delete_predictor('24')
+
+
+def test_bulk_locks(app, monkeypatch):
+    """
+    test bulk updates wait for running jobs, skip model ids reserved by create jobs, and keep the files of lazy
+    models until they are stored
+    """
+
+    payload = get_sklearn_payload(1)
+
+    # a running job finishes before the bulk update replaces its model
+    job = mgmt.submit_job(action='update', model=DeployedModel(model_id='43', **dict(payload, timestamp=1)))
+    gevent.sleep(0)
+    assert job.status == JobStatus.running
+    reports = mgmt.update_predictors([DeployedModel(model_id='43', **dict(payload, timestamp=2))])
+    assert job.status == JobStatus.done
+    assert reports[0]['error'] is None
+    assert mgmt.get_model_dict('43')['timestamp'] == 2
+
+    # a model id reserved by a create job is reported, the other models are loaded
+    db.session.add(ModelJob(job_id='bulk', model_id='44', action='create', status=JobStatus.pending, created=time(),
+                            creates='44', worker='otherhost:1'))
+    db.session.commit()
+    reports = mgmt.update_predictors([DeployedModel(model_id='44', **payload),
+                                      DeployedModel(model_id='43', **dict(payload, timestamp=3))])
+    assert [report['model_id'] for report in reports] == ['44', '43']
+    assert reports[0]['error'] == 'model 44 is being created by job bulk'
+    assert reports[1]['error'] is None
+    assert '44' not in mgmt.get_model_ids()
+    db.session.delete(ModelJob.query.get('bulk'))
+    db.session.commit()
+
+    # the file of the loaded model is kept if storing its lazy replacement fails
+    monkeypatch.setitem(app.config, 'LAZY_PAUSED', True)
+    local_path = mgmt.get_model_dict('43')['local_path']
+
+    def fail():
+        raise IOError('database gone')
+
+    monkeypatch.setattr(db.session, 'commit', fail)
+    with pytest.raises(IOError):
+        mgmt.update_predictors([DeployedModel(model_id='43', **dict(payload, status=ModelStatus.paused))])
+    monkeypatch.undo()
+    assert os.path.isfile(local_path)
+    assert mgmt.get_model_dict('43')['timestamp'] == 3
+
+    mgmt.delete_predictor('43')
+
+
+def test_job_records(app):
+    """
+    test jobs are looked up in the database, and jobs of workers that died are failed and release their models
+    """
+
+    # a job run by another worker
+    db.session.add(ModelJob(job_id='other', model_id='32', action='create', status=JobStatus.running, created=time(),
+                            creates='32', worker='otherhost:1'))
+
+    # a job run by a worker of this host that died
+    process = subprocess.Popen(['true'])
+    process.wait()
+    db.session.add(ModelJob(job_id='orphan', model_id='33', action='create', status=JobStatus.running,
+                            created=time(), creates='33', worker='{}:{}'.format(socket.gethostname(), process.pid)))
+    db.session.commit()
+
+    assert mgmt.get_job_dict('other')['status'] == JobStatus.running
+    for model_id in ['32', '33']:
+        with pytest.raises(ModelExistsException):
+            mgmt.check_new(model_id)
+
+    mgmt.fail_orphan_jobs()
+    assert mgmt.get_job_dict('other')['status'] == JobStatus.running
+    job = mgmt.get_job_dict('orphan')
+    assert job['status'] == JobStatus.failed and job['error'].startswith('worker process')
+    mgmt.check_new('33')
+    with pytest.raises(ModelExistsException):
+        mgmt.check_new('32')
+
+    for record in ModelJob.query.filter(ModelJob.job_id.in_(['other', 'orphan'])).all():
+        db.session.delete(record)
+    db.session.commit()
+
+
 def test_shutdown(app):
     """
     test that models are not accessible after shutdown
@@ -8,6 +8,7 @@ from predict.predictors.predictor_factory import make_predictor
 from predict.models.deployed_model import DeployedModel
 from predict.predictors.vw_predictor import VWPredictor
 from predict.predictors.sklearn_predictor import SKLearnPredictor
+from predict.predictors.paused_predictor import PausedPredictor
 from predict.exceptions import ApiException
 from tests.predict.conftest import get_vw_payload, get_sklearn_payload
 import pytest
@@ -41,3 +42,19 @@ def test_factory(app, model, predictor, error_type, error_msg):
             make_predictor(model=model)
         assert e.value.message.startswith(error_msg)
 
+
+
+def test_factory_paused(app, monkeypatch):
+    """
+    test paused models are loaded unless lazy loading is on
+    """
+
+    model = DeployedModel(**get_sklearn_payload(1))
+    model.status = 'paused'
+    assert isinstance(make_predictor(model=model), SKLearnPredictor)
+
+    monkeypatch.setitem(app.config, 'LAZY_PAUSED', True)
+    predictor = make_predictor(model=model)
+    assert isinstance(predictor, PausedPredictor)
+    assert not predictor.is_active()
+    assert predictor.get_model().to_dict() == model.to_dict()
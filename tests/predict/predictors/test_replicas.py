@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+Test replica pools
+"""
+
+import time
+import gevent
+from predict.predictors.replicas import ReplicaPool
+
+
+class FakeProcess(object):
+    """
+    stands in for a model process, records how many threads use it at once
+    """
+
+    def __init__(self):
+        self.active = 0
+        self.max_active = 0
+        self.calls = 0
+
+    def score(self, example):
+        """
+        fake scoring that takes a little while
+
+        Args:
+            example (list(int)): examples
+
+        Returns:
+            list(int): doubled examples
+        """
+
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        self.calls += 1
+        time.sleep(0.01)
+        self.active -= 1
+
+        return [x * 2 for x in example]
+
+
+def score(process, example):
+    """
+    score examples with a fake process
+    """
+
+    return process.score(example)
+
+
+def test_least_busy():
+    """
+    test concurrent requests are spread across replicas and each replica is used by one thread at a time
+    """
+
+    processes = [FakeProcess() for _ in range(3)]
+    pool = ReplicaPool(processes)
+
+    jobs = [gevent.spawn(pool.run, score, [i]) for i in range(9)]
+    gevent.joinall(jobs)
+
+    assert [job.value for job in jobs] == [[i * 2] for i in range(9)]
+    assert [p.calls for p in processes] == [3, 3, 3]
+    assert all(p.max_active == 1 for p in processes)
+    assert pool.busy == [0, 0, 0]
+
+
+def test_error():
+    """
+    test errors are raised to the caller and the replica is released
+    """
+
+    pool = ReplicaPool([FakeProcess()])
+
+    job = gevent.spawn(pool.run, score, None)
+    gevent.joinall([job])
+
+    assert isinstance(job.exception, TypeError)
+    assert pool.busy == [0]
+    assert pool.run(score, [1]) == [2]
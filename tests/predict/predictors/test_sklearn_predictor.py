@@ -5,6 +5,13 @@ Test scikit-learn model support
 """
 
 import pytest
+import numpy as np
+import pickle
+from scipy.sparse import isspmatrix_csr
+from sklearn.linear_model import Ridge
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import MinMaxScaler, StandardScaler
+from sklearn.tree import DecisionTreeRegressor
 from predict.predictors.sklearn_predictor import SKLearnPredictor
 from predict.models.deployed_model import DeployedModel
 from tests.predict.conftest import get_sklearn_payload, generic_predictor
@@ -94,6 +101,152 @@ def test_sklearn_invalid_predict(predictor):
     assert e.value.message.startswith('prediction failed')
 
 
+def test_sklearn_parse_examples(predictor, sklearn_data):
+    """
+    confirm batches are parsed into one contiguous 2-d array
+    """
+
+    features = predictor.parse_examples(sklearn_data['examples'])
+    assert features.shape == (len(sklearn_data['examples']), predictor.n_features)
+    assert features.flags['C_CONTIGUOUS']
+
+    # a short row must not be hidden by a long row in the same batch
+    long_row = '{},1'.format(sklearn_data['examples'][0].strip())
+    short_row = sklearn_data['examples'][1].strip().rsplit(',', 1)[0]
+    with pytest.raises(Exception) as e:
+        predictor.parse_examples([long_row, short_row])
+    assert e.value.message.startswith('invalid input')
+
+
+def to_sparse(example):
+    """
+    write a dense feature string as index:value pairs of its non-zero features
+
+    Args:
+        example (str): comma separated features
+
+    Returns:
+        str: sparse feature string
+    """
+
+    features = np.fromstring(example, sep=',')
+
+    return ' '.join('{}:{!r}'.format(i, x) for i, x in enumerate(features) if x != 0)
+
+
+def test_sklearn_sparse(predictor, sklearn_data):
+    """
+    confirm sparse examples are parsed into one CSR matrix and predict like dense examples
+    """
+
+    examples = [to_sparse(x) for x in sklearn_data['examples']] + ['']
+
+    features = predictor.parse_examples(examples)
+    assert isspmatrix_csr(features)
+    assert features.shape == (len(examples), predictor.n_features)
+    dense = predictor.parse_examples(sklearn_data['examples'])
+    assert np.array_equal(features.toarray(), np.vstack([dense, np.zeros(predictor.n_features)]))
+    assert features.nnz == np.count_nonzero(dense)
+
+    for pair in zip(sklearn_data['predictions'], predictor.predict(example=examples)):
+        assert precision_compare(*pair)
+    for pair in zip(sklearn_data['predictions'], predictor.predict(example=features[:-1])):
+        assert precision_compare(*pair)
+
+    invalid = ['0:1 1', '0:1,1:2', '0:1:2', '-1:1', '0.5:1', '{}:1'.format(predictor.n_features), 'a:1']
+    for example in invalid:
+        with pytest.raises(Exception) as e:
+            predictor.parse_examples(['0:1', example])
+        assert e.value.message.startswith('invalid input')
+
+    # a row without pairs cannot take values from the row before it
+    with pytest.raises(Exception) as e:
+        predictor.parse_examples(['0:1 2', '3'])
+    assert e.value.message.startswith('invalid input')
+
+
+def test_sklearn_compiled(predictor, sklearn_data):
+    """
+    confirm linear models are compiled and predict like scikit-learn
+    """
+
+    assert predictor.linear is not None
+
+    features = predictor.parse_examples(sklearn_data['examples'])
+    assert np.allclose(predictor.predict_parsed(features), predictor.process.predict(features))
+
+
+def make_model(tmpdir, process, extras=''):
+    """
+    pickle a scikit-learn model and build a deployed model for it
+
+    Args:
+        tmpdir (LocalPath): directory to write the model file in
+        process (object): fitted scikit-learn model
+        extras (str): model extras
+
+    Returns:
+        DeployedModel: model
+    """
+
+    local_path = str(tmpdir.join('model.pkl'))
+    with open(local_path, 'wb') as f:
+        pickle.dump(process, f)
+
+    example = np.arange(4) / 4.0
+    payload = get_sklearn_payload(1)
+    payload.update(local_path=local_path, remote_path='local://{}'.format(local_path), extras=extras,
+                   example=','.join(repr(x) for x in example), output=process.predict(example.reshape(1, -1))[0])
+
+    return DeployedModel(**payload)
+
+
+@pytest.mark.parametrize('steps, compiled', [([StandardScaler(), Ridge()], True),
+                                             ([StandardScaler(with_mean=False), MinMaxScaler(), Ridge()], True),
+                                             ([DecisionTreeRegressor()], False)])
+def test_sklearn_compile_pipeline(tmpdir, steps, compiled):
+    """
+    confirm scaler pipelines are folded into one linear scorer and other models are scored by scikit-learn
+    """
+
+    rng = np.random.RandomState(1)
+    features = rng.randn(50, 4) * [1, 10, 100, 1000] + [0, 5, -5, 50]
+    process = make_pipeline(*steps).fit(features, features.dot([1, -2, 3, 0.5]) + rng.randn(50))
+
+    predictor = SKLearnPredictor(model=make_model(tmpdir, process))
+    assert (predictor.linear is not None) == compiled
+
+    examples = [','.join(repr(x) for x in row) for row in rng.randn(10, 4)]
+    assert np.allclose(predictor.predict(examples), process.predict(predictor.parse_examples(examples)))
+
+    # compiling can be turned off
+    predictor = SKLearnPredictor(model=make_model(tmpdir, process, extras='--agent_compile=false'))
+    assert predictor.linear is None
+
+
+def test_sklearn_mmap(tmpdir):
+    """
+    confirm models loaded with a weights directory score with memory-mapped coefficients
+    """
+
+    rng = np.random.RandomState(1)
+    features = rng.randn(50, 4)
+    process = Ridge().fit(features, features.dot([1, -2, 3, 0.5]))
+    weights_dir = str(tmpdir.join('weights'))
+
+    predictor = SKLearnPredictor(model=make_model(tmpdir, process), weights_dir=weights_dir)
+    assert isinstance(predictor.process.coef_, np.memmap)
+    assert np.may_share_memory(predictor.linear[0], predictor.process.coef_)
+
+    examples = [','.join(repr(x) for x in row) for row in rng.randn(10, 4)]
+    assert np.allclose(predictor.predict(examples), process.predict(predictor.parse_examples(examples)))
+
+    # memory mapping can be turned off
+    predictor = SKLearnPredictor(model=make_model(tmpdir, process, extras='--agent_mmap=false'),
+                                 weights_dir=weights_dir)
+    assert not isinstance(predictor.process.coef_, np.memmap)
+
+
 def test_sklearn_invalid_verify(app):
     """
     confirm predictor initialization fails if verification does not match
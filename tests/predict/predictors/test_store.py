@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""
+Test the content addressed model store
+"""
+
+import errno
+import os
+import time
+from predict.predictors.store import ModelStore, link
+
+
+def write(path, data):
+    """
+    write a file
+
+    Args:
+        path (LocalPath): file
+        data (str): contents
+
+    Returns:
+        str: path
+    """
+
+    path.write(data)
+
+    return str(path)
+
+
+def test_store(tmpdir):
+    """
+    test files are found by key and files with the same contents are stored once
+    """
+
+    store = ModelStore(str(tmpdir.join('store')))
+    first = write(tmpdir.join('first'), 'model')
+    second = write(tmpdir.join('second'), 'model')
+
+    assert store.lookup('a#1') is None
+
+    stored = store.add(first, key='a#1')
+    assert store.add(second, key='b#1') == stored
+    assert store.lookup('a#1') == stored
+    assert store.lookup('b#1') == stored
+
+    # both files are links to the stored file
+    assert os.path.samefile(first, stored) and os.path.samefile(second, stored)
+    assert os.stat(stored).st_nlink == 3
+
+    # a new file is linked to the stored file
+    third = str(tmpdir.join('third'))
+    link(stored, third)
+    link(stored, third)
+    assert os.path.samefile(third, stored)
+    assert sorted(os.listdir(str(tmpdir))) == ['first', 'second', 'store', 'third']
+
+
+def test_evict(tmpdir):
+    """
+    test files no model links to are removed least recently used first to stay within the size limit
+    """
+
+    evicted = []
+    store = ModelStore(str(tmpdir.join('store')), max_bytes=10, on_evict=evicted.append)
+
+    paths = [write(tmpdir.join(str(i)), str(i) * 4) for i in range(3)]
+    store.add(paths[0], key='0')
+    store.add(paths[1], key='1')
+    os.remove(paths[0])
+    os.remove(paths[1])
+
+    # 0 is used more recently than 1
+    past = time.time() - 10
+    os.utime(store.lookup('1'), (past, past))
+    store.lookup('0')
+
+    # 2 is still linked to by its model file and stays
+    digest = os.path.basename(store.lookup('1'))
+    store.add(paths[2], key='2')
+    assert store.lookup('1') is None
+    assert evicted == [digest]
+    assert digest not in store.digests() and len(store.digests()) == 2
+    assert store.lookup('0') is not None
+    assert store.lookup('2') is not None
+
+    # only the least recently used file is removed to make room
+    os.remove(paths[2])
+    os.utime(store.lookup('0'), (past, past))
+    store.add(write(tmpdir.join('3'), '3' * 4), key='3')
+    assert store.lookup('0') is None
+    assert store.lookup('2') is not None
+    assert store.lookup('3') is not None
+
+
+def test_evict_copies(tmpdir, monkeypatch):
+    """
+    test a store on another file system keeps copies, and only removes copies no model uses
+    """
+
+    def cross_device(source, link_name):
+        raise OSError(errno.EXDEV, 'Invalid cross-device link')
+
+    monkeypatch.setattr(os, 'link', cross_device)
+
+    used = set()
+    evicted = []
+    store = ModelStore(str(tmpdir.join('store')), max_bytes=10, on_evict=evicted.append, in_use=used.__contains__)
+
+    paths = [write(tmpdir.join(str(i)), str(i) * 4) for i in range(4)]
+    stored = [store.add(path, key=str(i)) for i, path in enumerate(paths[:2])]
+    assert all(os.stat(path).st_nlink == 1 for path in stored)
+    assert not os.path.samefile(paths[0], stored[0])
+
+    past = time.time() - 10
+    os.utime(stored[0], (past - 10, past - 10))
+    os.utime(stored[1], (past, past))
+
+    # 0 is the least recently used but a model uses its copy
+    used.add(os.path.basename(stored[0]))
+    store.add(paths[2], key='2')
+    assert evicted == [os.path.basename(stored[1])]
+    assert store.lookup('0') is not None and store.lookup('2') is not None
+
+    # once unused it is removed, the file just stored is kept
+    used.clear()
+    store.add(paths[3], key='3')
+    assert evicted[1:] == [os.path.basename(stored[0])]
+    assert store.lookup('3') is not None
+
+
+def test_remote(tmpdir):
+    """
+    test the metadata of copied remote files is recorded and stored files are found by contents
+    """
+
+    store = ModelStore(str(tmpdir.join('store')))
+    stored = store.add(write(tmpdir.join('first'), 'model'))
+
+    assert store.remote('local:///first') is None
+    store.record('local:///first', dict(size=5, mtime=1.5, etag=None, sha1=os.path.basename(stored)))
+    assert store.remote('local:///first') == dict(size=5, mtime=1.5, etag=None, sha1=os.path.basename(stored))
+
+    assert store.get(os.path.basename(stored)) == stored
+    assert store.get('0' * 40) is None
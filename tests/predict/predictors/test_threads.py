@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+"""
+Test native thread pool helpers
+"""
+
+import pytest
+from predict.predictors.threads import spawn
+
+
+def fail(message):
+    """
+    raise an error with message
+    """
+
+    raise ValueError(message)
+
+
+def test_spawn():
+    """
+    test results and errors come back from the thread
+    """
+
+    assert spawn(sum, [1, 2]).get() == 3
+
+    with pytest.raises(ValueError) as e:
+        spawn(fail, 'thread failed').get()
+    assert e.value.message == 'thread failed'
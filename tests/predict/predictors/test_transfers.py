@@ -0,0 +1,462 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=redefined-outer-name
+"""
+Test model file transfers against a local http server
+"""
+
+import BaseHTTPServer
+import SocketServer
+import hashlib
+import json
+import os
+import pytest
+import threading
+import urlparse
+from predict.predictors.transfers import make_transfer, clear_pools, same_remote, BaseTransfer, LocalTransfer, \
+    TransferError
+
+
+DATA = ''.join(chr(i % 251) for i in range(100000))
+LAST_MODIFIED = 'Sun, 19 Apr 2015 12:35:26 GMT'
+
+
+class ModelHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """
+    serves server.data at /model with range requests and keep-alive, the server's settings change its behavior
+    """
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        """
+        serve /model, /moved redirects to it
+        """
+
+        server = self.server
+        server.requests.append((self.path, self.headers.get('range'), self.headers.get('if-range'),
+                                self.client_address))
+
+        if self.path == '/moved':
+            self.send_response(302)
+            self.send_header('Location', '/model')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        if self.path != '/model':
+            self.send_error(404)
+            return
+
+        data = server.data
+        start = 0
+        # the range is ignored if the file changed since If-Range
+        if self.headers.get('range') and server.ranges and self.headers.get('if-range') in (server.etag, LAST_MODIFIED):
+            start = int(self.headers['range'].split('=')[1].rstrip('-'))
+            self.send_response(206)
+            self.send_header('Content-Range', 'bytes {}-{}/{}'.format(start, len(data) - 1, len(data)))
+        else:
+            self.send_response(200)
+        self.send_header('Content-Length', str(len(data) - start))
+        if server.etag is not None:
+            self.send_header('ETag', server.etag)
+        self.send_header('Last-Modified', LAST_MODIFIED)
+        self.end_headers()
+
+        # drop the connection part way through the first responses
+        if server.drops:
+            server.drops -= 1
+            self.wfile.write(data[start:start + 1000])
+            self.close_connection = 1
+            if server.changes:
+                server.data, server.etag = server.changes
+                server.changes = None
+            return
+
+        self.wfile.write(data[start:])
+
+    def do_HEAD(self):  # pylint: disable=invalid-name
+        """
+        headers of /model, 304 if the request is conditional on its etag
+        """
+
+        self.server.requests.append((self.path, self.headers.get('if-none-match'), self.client_address))
+
+        if self.headers.get('if-none-match') == self.server.etag:
+            self.send_response(304)
+        else:
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(DATA)))
+        self.send_header('ETag', self.server.etag)
+        self.send_header('Last-Modified', LAST_MODIFIED)
+        self.end_headers()
+
+    def log_message(self, *args):  # pylint: disable=arguments-differ
+        pass
+
+
+class WebHDFSHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """
+    fake WebHDFS namenode (redirecting reads to its datanode) and datanode serving DATA at /user/test/a.model and
+    /user/test/models/a.model
+    """
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        """
+        serve GETHOMEDIRECTORY, GETFILESTATUS and OPEN
+        """
+
+        server = self.server
+        url = urlparse.urlsplit(self.path)
+        query = dict(urlparse.parse_qsl(url.query))
+        server.requests.append((query, self.client_address))
+
+        if query['op'] == 'GETHOMEDIRECTORY' and url.path == '/webhdfs/v1/':
+            body = json.dumps({'Path': '/user/{}'.format(query.get('user.name', 'hdfs'))})
+        elif url.path not in ('/webhdfs/v1/user/test/a.model', '/webhdfs/v1/user/test/models/a.model'):
+            self.send_error(404)
+            return
+        elif query['op'] == 'GETFILESTATUS':
+            body = json.dumps({'FileStatus': {'type': 'FILE', 'length': len(DATA), 'blockSize': server.block,
+                                              'modificationTime': 1429446926000}})
+        elif server.datanode is not None:
+            self.send_response(307)
+            self.send_header('Location', 'http://127.0.0.1:{port}{path}'.format(port=server.datanode.server_address[1],
+                                                                               path=self.path))
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        else:
+            start = int(query.get('offset', 0))
+            body = DATA[start:start + int(query.get('length', len(DATA)))]
+
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+
+        # drop the connection part way through the first responses
+        if server.drops:
+            server.drops -= 1
+            self.wfile.write(body[:1000])
+            self.close_connection = 1
+            return
+
+        self.wfile.write(body)
+
+    def log_message(self, *args):  # pylint: disable=arguments-differ
+        pass
+
+
+class ModelServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """
+    local stand-in for a model file server
+    """
+
+    daemon_threads = True
+
+
+@pytest.yield_fixture
+def server():
+    """
+    test fixture for a local http server
+
+    Returns:
+        ModelServer: running server
+    """
+
+    httpd = ModelServer(('127.0.0.1', 0), ModelHandler)
+    httpd.requests = []
+    httpd.ranges = True
+    httpd.drops = 0
+    httpd.etag = '"1"'
+    httpd.data = DATA
+    httpd.changes = None
+    thread = threading.Thread(target=httpd.serve_forever)
+    thread.daemon = True
+    thread.start()
+
+    yield httpd
+
+    clear_pools()
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.yield_fixture
+def namenode():
+    """
+    test fixture for a fake WebHDFS namenode and its datanode
+
+    Returns:
+        ModelServer: running namenode, its datanode is namenode.datanode
+    """
+
+    servers = []
+    for _ in range(2):
+        httpd = ModelServer(('127.0.0.1', 0), WebHDFSHandler)
+        httpd.requests = []
+        httpd.block = len(DATA)
+        httpd.drops = 0
+        httpd.datanode = servers[0] if servers else None
+        thread = threading.Thread(target=httpd.serve_forever)
+        thread.daemon = True
+        thread.start()
+        servers.append(httpd)
+
+    yield servers[1]
+
+    clear_pools()
+    for httpd in servers:
+        httpd.shutdown()
+        httpd.server_close()
+
+
+def remote(server, path='/model'):
+    """
+    remote path of a file on the test server
+    """
+
+    return 'http://127.0.0.1:{port}{path}'.format(port=server.server_address[1], path=path)
+
+
+def test_make_transfer():
+    """
+    test transfers are built for each protocol
+    """
+
+    assert isinstance(make_transfer('local:///tmp/a.model'), LocalTransfer)
+    assert make_transfer('local:///tmp/a.model').source == '/tmp/a.model'
+    assert make_transfer('hdfs:///user/a.model', hadoop='/bin/hadoop').hadoop == '/bin/hadoop'
+    assert make_transfer('http://host/a.model', hadoop='/bin/hadoop', retries=1).retries == 1
+
+    for remote_path, error in [('', 'invalid remote path'), ('blarg', 'invalid remote path'),
+                               ('blrg:///a.model', 'unknown transfer protocol blrg')]:
+        with pytest.raises(TransferError) as e:
+            make_transfer(remote_path)
+        assert e.value.message.startswith(error)
+
+    # transfers either stream with read or copy with copy
+    assert make_transfer('http://host/a.model').streaming and not make_transfer('scp://host:a.model').streaming
+    for method, args in [('read', (0, None)), ('copy', ('/tmp/a.model',))]:
+        with pytest.raises(Exception) as e:
+            getattr(BaseTransfer('a.model'), method)(*args)
+        assert e.value.message == 'cannot call abstract {} method in base transfer class'.format(method)
+
+
+def test_local_transfer(tmpdir):
+    """
+    test local files are copied and hashed, a failed copy leaves the previous file
+    """
+
+    src = tmpdir.join('src.model')
+    src.write(DATA, mode='wb')
+    dest = str(tmpdir.mkdir('models').join('a.model'))
+
+    digest = make_transfer('local://{}'.format(src), chunk_bytes=4096).fetch(local_path=dest)
+    assert digest == hashlib.sha1(DATA).hexdigest()
+    with open(dest, 'rb') as f:
+        assert f.read() == DATA
+
+    with pytest.raises(IOError):
+        make_transfer('local://{}'.format(tmpdir.join('missing.model'))).fetch(local_path=dest)
+    with open(dest, 'rb') as f:
+        assert f.read() == DATA
+    assert os.listdir(os.path.dirname(dest)) == ['a.model']
+
+
+def test_http_transfer(server, tmpdir):
+    """
+    test http downloads stream the file, follow redirects and reuse connections
+    """
+
+    dest = str(tmpdir.join('a.model'))
+    for path in ['/model', '/moved']:
+        assert make_transfer(remote(server, path), chunk_bytes=4096).fetch(local_path=dest) == \
+            hashlib.sha1(DATA).hexdigest()
+        with open(dest, 'rb') as f:
+            assert f.read() == DATA
+
+    # one connection for all requests
+    assert [r[0] for r in server.requests] == ['/model', '/moved', '/model']
+    assert len(set(r[-1] for r in server.requests)) == 1
+
+    with pytest.raises(TransferError) as e:
+        make_transfer(remote(server, '/missing')).fetch(local_path=dest)
+    assert e.value.message.startswith('http status 404')
+    with open(dest, 'rb') as f:
+        assert f.read() == DATA
+
+
+def test_http_resume(server, tmpdir):
+    """
+    test interrupted http downloads are resumed with range requests, or restarted if ranges are not supported or
+    the file changed
+    """
+
+    dest = str(tmpdir.join('a.model'))
+
+    server.drops = 2
+    assert make_transfer(remote(server), chunk_bytes=512).fetch(local_path=dest) == hashlib.sha1(DATA).hexdigest()
+    assert [r[1] for r in server.requests] == [None, 'bytes=1000-', 'bytes=2000-']
+
+    # the file changes while the connection is dropped, it is read again instead of being spliced
+    server.requests = []
+    server.drops = 1
+    server.changes = (DATA[::-1], '"2"')
+    assert make_transfer(remote(server), chunk_bytes=512).fetch(local_path=dest) == \
+        hashlib.sha1(DATA[::-1]).hexdigest()
+    with open(dest, 'rb') as f:
+        assert f.read() == DATA[::-1]
+    assert [r[1:3] for r in server.requests] == [(None, None), ('bytes=1000-', '"1"'), (None, None)]
+
+    # without an etag ranges are conditional on Last-Modified
+    server.requests = []
+    server.drops = 1
+    server.etag = None
+    assert make_transfer(remote(server), chunk_bytes=512).fetch(local_path=dest) == \
+        hashlib.sha1(DATA[::-1]).hexdigest()
+    assert [r[1:3] for r in server.requests] == [(None, None), ('bytes=1000-', LAST_MODIFIED)]
+    server.data = DATA
+    server.etag = '"1"'
+
+    server.ranges = False
+    server.drops = 1
+    assert make_transfer(remote(server), chunk_bytes=512).fetch(local_path=dest) == hashlib.sha1(DATA).hexdigest()
+    with open(dest, 'rb') as f:
+        assert f.read() == DATA
+
+    # the whole file responding to the range is dropped unread, the restart is dropped again
+    server.drops = 3
+    with pytest.raises(TransferError) as e:
+        make_transfer(remote(server), retries=1).fetch(local_path=dest)
+    assert e.value.message.startswith('transfer interrupted after 1000 bytes and 1 retries')
+
+
+def test_hadoop_transfer(tmpdir):
+    """
+    test transfers run by a command copy next to the model file and hash it
+    """
+
+    src = tmpdir.join('src.model')
+    src.write(DATA, mode='wb')
+    dest = str(tmpdir.mkdir('models').join('a.model'))
+
+    # stand-in for hadoop fs -copyToLocal src dest
+    hadoop = tmpdir.join('hadoop')
+    hadoop.write('#!/bin/sh\ncp "$3" "$4"\n')
+    hadoop.chmod(0o755)
+
+    transfer = make_transfer('hdfs://{}'.format(src), hadoop=str(hadoop))
+    assert transfer.fetch(local_path=dest) == hashlib.sha1(DATA).hexdigest()
+    with open(dest, 'rb') as f:
+        assert f.read() == DATA
+
+    with pytest.raises(Exception):
+        make_transfer('hdfs://{}'.format(tmpdir.join('missing.model')), hadoop=str(hadoop)).fetch(local_path=dest)
+    assert os.listdir(os.path.dirname(dest)) == ['a.model']
+
+
+def test_webhdfs_transfer(namenode, tmpdir):
+    """
+    test hdfs files are downloaded from datanodes, large files in parallel blocks
+    """
+
+    dest = str(tmpdir.join('a.model'))
+    webhdfs = 'http://127.0.0.1:{}'.format(namenode.server_address[1])
+    datanode = namenode.datanode
+
+    transfer = make_transfer('hdfs:///user/test/a.model', webhdfs=webhdfs, user='test', hadoop=None)
+    assert transfer.fetch(local_path=dest) == hashlib.sha1(DATA).hexdigest()
+    assert [q for q, _ in datanode.requests] == [{'op': 'OPEN', 'user.name': 'test'}]
+
+    datanode.requests = []
+    namenode.block = 16384
+    transfer = make_transfer('hdfs://namenode:8020/user/test/a.model', webhdfs=webhdfs, parts=3, chunk_bytes=4096)
+    assert transfer.fetch(local_path=dest) == hashlib.sha1(DATA).hexdigest()
+    with open(dest, 'rb') as f:
+        assert f.read() == DATA
+
+    # one request per block on at most one connection per thread
+    assert sorted(int(q['offset']) for q, _ in datanode.requests) == range(0, len(DATA), 16384)
+    assert set(int(q['length']) for q, _ in datanode.requests) == {16384, len(DATA) % 16384}
+    assert len(set(address for _, address in datanode.requests)) <= 3
+
+    # interrupted blocks are resumed
+    datanode.requests = []
+    datanode.drops = 1
+    namenode.block = 65536
+    assert make_transfer('hdfs:///user/test/a.model', webhdfs=webhdfs, parts=1).fetch(local_path=dest) == \
+        hashlib.sha1(DATA).hexdigest()
+    assert [q.get('offset') for q, _ in datanode.requests] == [None, '1000']
+
+    # relative paths are in the user's home directory
+    namenode.requests = []
+    namenode.block = len(DATA)
+    transfer = make_transfer('hdfs://models/a.model', webhdfs=webhdfs, user='test', hadoop=None)
+    assert transfer.fetch(local_path=dest) == hashlib.sha1(DATA).hexdigest()
+    assert transfer.path() == '/user/test/models/a.model'
+    assert [q['op'] for q, _ in namenode.requests] == ['GETHOMEDIRECTORY', 'GETFILESTATUS', 'OPEN']
+
+    with pytest.raises(TransferError) as e:
+        make_transfer('hdfs:///user/test/missing.model', webhdfs=webhdfs, hadoop=None).fetch(local_path=dest)
+    assert e.value.message.startswith('http status 404')
+
+
+def test_webhdfs_fallback(namenode, tmpdir):
+    """
+    test hdfs files are copied with the hadoop command line tool if WebHDFS fails
+    """
+
+    src = tmpdir.join('src.model')
+    src.write(DATA, mode='wb')
+    dest = str(tmpdir.join('a.model'))
+
+    hadoop = tmpdir.join('hadoop')
+    hadoop.write('#!/bin/sh\ncp "$3" "$4"\n')
+    hadoop.chmod(0o755)
+
+    webhdfs = 'http://127.0.0.1:{}'.format(namenode.server_address[1])
+    transfer = make_transfer('hdfs://{}'.format(src), webhdfs=webhdfs, hadoop=str(hadoop))
+    assert transfer.fetch(local_path=dest) == hashlib.sha1(DATA).hexdigest()
+
+    with pytest.raises(TransferError) as e:
+        make_transfer('hdfs:///missing.model', webhdfs=webhdfs, hadoop=str(hadoop)).fetch(local_path=dest)
+    assert e.value.message.startswith('webhdfs: http status 404')
+
+
+def test_stat(server, namenode, tmpdir):
+    """
+    test remote file metadata, http requests are conditional on the copied file's etag
+    """
+
+    src = tmpdir.join('src.model')
+    src.write(DATA, mode='wb')
+    local = make_transfer('local://{}'.format(src)).stat()
+    assert local == dict(size=len(DATA), mtime=os.stat(str(src)).st_mtime, etag=None)
+
+    http = make_transfer(remote(server)).stat()
+    assert http == dict(size=len(DATA), mtime='Sun, 19 Apr 2015 12:35:26 GMT', etag='"1"')
+    assert make_transfer(remote(server)).stat(previous=http) == http
+    server.etag = '"2"'
+    assert not same_remote(http, make_transfer(remote(server)).stat(previous=http))
+
+    # conditional requests on one connection
+    assert [r[1] for r in server.requests] == [None, '"1"', '"1"']
+    assert len(set(r[2] for r in server.requests)) == 1
+
+    webhdfs = 'http://127.0.0.1:{}'.format(namenode.server_address[1])
+    assert make_transfer('hdfs:///user/test/a.model', webhdfs=webhdfs).stat() == \
+        dict(size=len(DATA), mtime=1429446926000, etag=None)
+    assert make_transfer('hdfs:///user/test/a.model').stat() is None
+
+
+def test_same_remote():
+    """
+    test remote files are unchanged only if their modification time or etag is known and matches
+    """
+
+    assert same_remote(dict(size=1, mtime=2, etag=None), dict(size=1, mtime=2, etag=None))
+    assert not same_remote(dict(size=1, mtime=2, etag=None), dict(size=3, mtime=2, etag=None))
+    assert not same_remote(dict(size=1, mtime=None, etag=None), dict(size=1, mtime=None, etag=None))
+    assert not same_remote(None, dict(size=1, mtime=2, etag=None))
+    assert not same_remote(dict(size=1, mtime=2, etag=None), None)
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""
+Test numpy scoring of linear vowpal wabbit models
+"""
+
+import struct
+import pytest
+from predict.predictors.vw_linear import LinearVW, UnsupportedModel, murmurhash3_32, read_regressor, parse_options, \
+    parity_examples
+from predict.predictors.vw_predictor import parse_namespaces
+from tests.predict.conftest import get_vw_namespaces
+from tools.general import precision_compare
+
+
+@pytest.fixture(scope='module')
+def linear(vw_data):
+    """
+    test fixture for a numpy scorer of the test vw model
+
+    Returns:
+        LinearVW: numpy scorer
+    """
+
+    return LinearVW(vw_data['local_path'], extras=vw_data['extras'])
+
+
+def test_murmurhash():
+    """
+    test murmurhash3 matches reference values
+    """
+
+    assert murmurhash3_32('', 0) == 0
+    assert murmurhash3_32('', 1) == 0x514e28b7
+    assert murmurhash3_32('hello', 0) == 0x248bfa47
+    assert murmurhash3_32('Hello, world!', 1234) == 0xfaf6cdb3
+
+
+def test_hash(linear):
+    """
+    test names of digits hash to their number plus the seed, others hash with murmurhash3
+    """
+
+    assert linear.hash('123', 7) == 130
+    assert linear.hash(' abc ', 7) == murmurhash3_32('abc', 7)
+    assert linear.hash('1a', 7) == murmurhash3_32('1a', 7)
+
+
+def test_linear_predict(linear, vw_data):
+    """
+    test the numpy scorer matches vw predictions for text and structured examples
+    """
+
+    examples = [x.strip() for x in vw_data['examples']]
+    for pair in zip(vw_data['predictions'], linear.predict(examples)):
+        assert precision_compare(*pair)
+
+    examples = [parse_namespaces(get_vw_namespaces(x)) for x in examples]
+    for pair in zip(vw_data['predictions'], linear.predict(examples)):
+        assert precision_compare(*pair)
+
+    assert linear.predict([]).tolist() == []
+    assert linear.predict(['1 |', '| unknown_feature']).tolist() == [0.0, 0.0]
+
+
+def test_parity_examples():
+    """
+    test parity examples check each namespace and feature values
+    """
+
+    assert parity_examples("1 'tag| a:2 b |ns:3 c") == ["1 'tag| a:2 b |ns:3 c", '| a:2 b ', '|ns:3 c',
+                                                          '| a:1.0 b:0.5|ns:3 c:0.5']
+
+
+def test_unsupported(vw_data, tmpdir):
+    """
+    test models that are not plain linear models are rejected
+    """
+
+    with pytest.raises(UnsupportedModel):
+        LinearVW(vw_data['local_path'], extras='--loss_function=logistic -q ab')
+    with pytest.raises(UnsupportedModel):
+        LinearVW(vw_data['local_path'], extras='--link=poisson')
+
+    with open(vw_data['local_path'], 'rb') as f:
+        data = f.read()
+    with pytest.raises(UnsupportedModel):
+        read_regressor(data[:-3])
+    with pytest.raises(UnsupportedModel):
+        read_regressor('x' + data[1:])
+
+    # saved with --save_resume
+    header, indices, _ = read_regressor(data)
+    offset = len(data) - 8 * indices.size - 1
+    with pytest.raises(UnsupportedModel):
+        read_regressor(data[:offset] + struct.pack('<B', 1) + data[offset + 1:])
+
+
+def test_parse_options():
+    """
+    test vw command line arguments are split into options
+    """
+
+    assert parse_options('-i a.model --quiet --min_prediction -2 --link=logistic') == \
+        {'i': 'a.model', 'quiet': True, 'min_prediction': '-2', 'link': 'logistic'}
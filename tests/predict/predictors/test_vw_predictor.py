@@ -4,12 +4,15 @@
 Test vowpal wabbit model support
 """
 
+import itertools
 import math
+import os
+import resource
 import pytest
-from predict.predictors.vw_predictor import VWPredictor
+from predict.predictors.vw_predictor import VWPredictor, valid_regex, validate_example, parse_namespaces
 from predict.models.deployed_model import DeployedModel
 from predict.enums import ModelStatus
-from tests.predict.conftest import generic_predictor, get_vw_payload
+from tests.predict.conftest import generic_predictor, get_vw_payload, get_vw_namespaces
 from tools.general import precision_compare
 
 
@@ -67,6 +70,39 @@ def test_vw_predict(predictor, vw_data):
         assert precision_compare(pair[0], predictor.predict(example=[pair[1]])[0])
 
 
+def test_vw_structured_predict(predictor, vw_data):
+    """
+    test structured examples give the same predictions as vw input format strings
+    """
+
+    examples = [get_vw_namespaces(x) for x in vw_data['examples']]
+    for pair in zip(vw_data['predictions'], predictor.predict(example=examples)):
+        assert precision_compare(*pair)
+
+    # namespaces longer than one character are hashed by name
+    text = ['|ab x:2 y |b z', '|abc x:-1 |a y']
+    structured = [get_vw_namespaces(x) for x in text]
+    for pair in zip(predictor.predict(example=text), predictor.predict(example=structured)):
+        assert precision_compare(*pair)
+
+
+def test_parse_namespaces():
+    """
+    test structured examples are checked and converted
+    """
+
+    parsed = parse_namespaces({u'': {u'a': 1, 'b': 0.5}, 'ns': {}})
+    assert sorted(parsed['']) == [('a', 1.), ('b', 0.5)]
+    assert parsed['ns'] == []
+    assert all(isinstance(name, str) for name in parsed)
+    assert all(isinstance(f, str) for f, _ in parsed[''])
+
+    for example in [{'': ['a']}, {1: {'a': 1}}, {'': {'a': 'x'}}, {'': {'a': True}}, {'a b': {'a': 1}}]:
+        with pytest.raises(Exception) as e:
+            parse_namespaces(example)
+        assert e.value.message.startswith('invalid input')
+
+
 def test_vw_logit_predict():
     """
     confirm using link function gives the right prediction
@@ -78,6 +114,36 @@ def test_vw_logit_predict():
     generic_predictor(model=DeployedModel(**payload)).next()
 
 
+def test_vw_numpy_engine(vw_data):
+    """
+    confirm the numpy scorer is used for linear models with --agent_engine=numpy and gives vw's predictions
+    """
+
+    payload = get_vw_payload(1)
+    payload['extras'] += ' --agent_engine=numpy --link=logistic'
+    payload['output'] = 1. / (1. + math.exp(-payload['output']))
+    predictor = generic_predictor(model=DeployedModel(**payload)).next()
+    assert predictor.linear is not None
+
+    expected = [1. / (1. + math.exp(-x)) for x in vw_data['predictions']]
+    for pair in zip(expected, predictor.predict(example=vw_data['examples'])):
+        assert precision_compare(*pair)
+
+    examples = [get_vw_namespaces(x) for x in vw_data['examples']]
+    for pair in zip(expected, predictor.predict(example=examples)):
+        assert precision_compare(*pair)
+
+    # interactions are not supported, vw scores the model
+    payload = get_vw_payload(1)
+    payload['extras'] += ' --agent_engine=numpy -q ab'
+    assert generic_predictor(model=DeployedModel(**payload)).next().linear is None
+
+    payload['extras'] = '--agent_engine=fast'
+    with pytest.raises(Exception) as e:
+        VWPredictor(model=DeployedModel(**payload))
+    assert e.value.message.startswith('unknown engine')
+
+
 def test_vw_invalid_predict(predictor):
     """
     confirm predictor predicts as expected
@@ -102,6 +168,122 @@ def test_vw_invalid_predict(predictor):
     assert e.value.message.startswith('invalid input')
 
 
+def test_vw_trust_input(predictor):
+    """
+    confirm validation is skipped for trusted input
+    """
+
+    predictor.trust_input = True
+    assert predictor.parse_examples(example=[' a ']) == ['a']
+
+    predictor.trust_input = False
+    with pytest.raises(Exception) as e:
+        predictor.parse_examples(example=['a'])
+    assert e.value.message.startswith('invalid input')
+
+
+validate_data = ['', '|', '| a b:1', '1 |a', '1 2 |a', '1 2 3 |a', '1 2 tag|a', "1 2 'tag |a", "1 'tag |a", "'tag |a",
+                 "' |a", "'t|a", 'a|b|c', 'a|b c|d', "'a|b |c", "'a|b c|d", '1 a|b', '1 2 3 a|b', 'a b|c', ' |a',
+                 '1  |a', '1\t|a', 'a\tb|c', '|a\n', '|a\nb', 'a\n|b', '1.5 -2 |a', '1e3 |a', '-. |a', "1 2 'a|b |c",
+                 "1 2 3 'a |b", 'tag |a', '1 tag |a']
+
+
+@pytest.mark.parametrize('example', validate_data)
+def test_vw_validate(example):
+    """
+    confirm validation accepts exactly the strings matched in full by the reference regular expression
+    """
+
+    match = valid_regex.match(example)
+    assert validate_example(example) == bool(match and match.group(0) == example)
+
+
+def test_vw_validate_exhaustive():
+    """
+    compare validation with the reference regular expression on all short strings of the characters that matter
+    """
+
+    for length in range(6):
+        for chars in itertools.product("-1.' |a\t\n", repeat=length):
+            example = ''.join(chars)
+            match = valid_regex.match(example)
+            assert validate_example(example) == bool(match and match.group(0) == example), repr(example)
+
+
+class FakeExample(object):
+    """
+    stands in for a vw example, fails to predict on examples containing 'fail'
+    """
+
+    finished = []
+
+    def __init__(self, row):
+        self.row = row
+
+    def set_test_only(self, test_only):
+        pass
+
+    def learn(self):
+        if 'fail' in self.row:
+            raise Exception('learn failed')
+
+    def get_simplelabel_prediction(self):
+        return 1.
+
+    def finish(self):
+        self.finished.append(self.row)
+
+
+class FakeProcess(object):
+    """
+    stands in for a vw process
+    """
+
+    example = FakeExample
+
+
+def test_vw_example_finish(predictor):
+    """
+    confirm every example is finished after predicting, including failed predictions
+    """
+
+    process = predictor.process
+    predictor.process = FakeProcess()
+    del FakeExample.finished[:]
+
+    assert predictor.predict_parsed(example=['|a', '|b']) == [1., 1.]
+    assert FakeExample.finished == ['|a', '|b']
+
+    with pytest.raises(Exception) as e:
+        predictor.predict_parsed(example=['|fail'])
+    assert e.value.message.startswith('prediction failed')
+    assert FakeExample.finished == ['|a', '|b', '|fail']
+
+    predictor.process = process
+
+
+@pytest.mark.skipif(not os.environ.get('ML_AGENT_SOAK_PREDICTIONS'),
+                    reason='set ML_AGENT_SOAK_PREDICTIONS to the number of predictions to run')
+def test_vw_memory_soak(predictor, vw_data):
+    """
+    confirm memory does not grow over many predictions (peak resident set size in kilobytes)
+    """
+
+    n_predictions = int(os.environ['ML_AGENT_SOAK_PREDICTIONS'])
+    examples = vw_data['examples']
+
+    # warm up so allocations that happen once are not counted
+    for _ in range(10000 // len(examples) + 1):
+        predictor.predict(example=examples)
+    start = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    for _ in range(n_predictions // len(examples) + 1):
+        predictor.predict(example=examples)
+    end = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    assert end - start < 10 * 1024
+
+
 def test_vw_process_failure(predictor):
     """
     confirm exception occurs if process is corrupted
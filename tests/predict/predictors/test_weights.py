@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""
+Test memory-mapped model weights
+"""
+
+import os
+import pickle
+import numpy as np
+from sklearn.linear_model import Ridge
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import StandardScaler
+from predict.predictors import weights
+from predict.predictors.weights import load_model, save_weights, prune_weights, file_sha1
+
+
+def make_model_file(tmpdir):
+    """
+    pickle a scaler and linear model pipeline
+
+    Args:
+        tmpdir (LocalPath): directory to write the model file in
+
+    Returns:
+        (object, str): model and model file
+    """
+
+    rng = np.random.RandomState(0)
+    features = rng.randn(20, 3)
+    process = make_pipeline(StandardScaler(), Ridge()).fit(features, features.dot([1, 2, 3]))
+
+    path = str(tmpdir.join('model.pkl'))
+    with open(path, 'wb') as f:
+        pickle.dump(process, f)
+
+    return process, path
+
+
+def test_load_model(tmpdir, monkeypatch):
+    """
+    test models are loaded with read-only memory-mapped arrays from a sidecar named by the model file hash
+    """
+
+    process, path = make_model_file(tmpdir)
+    weights_dir = str(tmpdir.join('weights'))
+
+    model = load_model(path, weights_dir)
+    assert os.listdir(weights_dir) == [file_sha1(path)]
+
+    ridge = model.steps[-1][1]
+    assert isinstance(ridge.coef_, np.memmap)
+    assert not ridge.coef_.flags.writeable
+    assert isinstance(model.steps[0][1].mean_, np.memmap)
+
+    features = np.random.RandomState(1).randn(5, 3)
+    assert np.array_equal(model.predict(features), process.predict(features))
+
+    # later loads only read the sidecar
+    def fail(f):
+        raise AssertionError('model file unpickled')
+    monkeypatch.setattr(weights.pickle, 'load', fail)
+    assert np.array_equal(load_model(path, weights_dir).predict(features), process.predict(features))
+
+
+def test_save_weights(tmpdir):
+    """
+    test a sidecar saved by another process first is kept, and no temporary directories are left behind
+    """
+
+    process, path = make_model_file(tmpdir)
+    sidecar = str(tmpdir.join('weights', 'abc'))
+
+    save_weights(process, sidecar)
+    files = sorted(os.listdir(sidecar))
+    save_weights(process, sidecar)
+
+    assert sorted(os.listdir(sidecar)) == files
+    assert os.listdir(str(tmpdir.join('weights'))) == ['abc']
+
+
+def test_prune_weights(tmpdir):
+    """
+    test only the sidecars of kept model files are left, and sidecars being written are not removed
+    """
+
+    process, path = make_model_file(tmpdir)
+    weights_dir = str(tmpdir.join('weights'))
+    load_model(path, weights_dir)
+    save_weights(process, os.path.join(weights_dir, 'abc'))
+    os.mkdir(os.path.join(weights_dir, '.tmpabc'))
+
+    prune_weights(weights_dir, digests={file_sha1(path)})
+    assert sorted(os.listdir(weights_dir)) == ['.tmpabc', file_sha1(path)]
+
+    prune_weights(weights_dir, digests=set())
+    assert os.listdir(weights_dir) == ['.tmpabc']
+
+    prune_weights(str(tmpdir.join('missing')), digests=set())
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=unused-argument
+"""
+Test bulk model api calls
+"""
+
+import json
+from flask import url_for
+from predict import mgmt
+from predict.enums import ModelStatus
+from predict.models.deployed_model import DeployedModel
+from tests.predict.conftest import get_sklearn_payload
+from tools.general import precision_compare
+
+
+def test_bulk_endpoint(accept_json, client):
+    """
+    hit bulk models endpoint and check for response codes
+    """
+
+    res = client.get(url_for('bulk_models'), headers=accept_json)
+    assert res.status_code == 405
+
+    res = client.put(url_for('bulk_models'), data=json.dumps({}), content_type='application/json', headers=accept_json)
+    assert res.status_code == 400
+
+    # every model is checked before any is loaded
+    models = [dict(model_id='40', **get_sklearn_payload(1)), dict(model_id='40', **get_sklearn_payload(2))]
+    res = client.put(url_for('bulk_models'), data=json.dumps({'models': models}), content_type='application/json',
+                     headers=accept_json)
+    assert res.status_code == 400
+    assert 'duplicate model ids: 40' in res.data
+
+    models[1] = dict(get_sklearn_payload(2), model_id='41', model_type='blrg')
+    res = client.put(url_for('bulk_models'), data=json.dumps({'models': models}), content_type='application/json',
+                     headers=accept_json)
+    assert res.status_code == 400
+    assert 'model 41' in res.data
+    assert '40' not in mgmt.get_model_ids()
+
+
+def test_bulk_models(accept_json, app, client, monkeypatch):
+    """
+    test several models are loaded together with one request, paused models are only registered with LAZY_PAUSED
+    """
+
+    monkeypatch.setitem(app.config, 'LAZY_PAUSED', True)
+
+    payloads = [get_sklearn_payload(i) for i in range(3)]
+    models = [dict(model_id='40', **payloads[0]),
+              dict(payloads[1], model_id='41', status=ModelStatus.paused),
+              dict(payloads[2], model_id='42', remote_path='blrg:///foo.bar')]
+
+    res = client.put(url_for('bulk_models'), data=json.dumps({'models': models}), content_type='application/json',
+                     headers=accept_json)
+    assert res.status_code == 200
+    reports = json.loads(res.data)['models']
+    assert [report['model_id'] for report in reports] == ['40', '41', '42']
+    assert reports[0]['error'] is None and not reports[0]['paused']
+    assert reports[1]['error'] is None and reports[1]['paused']
+    assert reports[2]['error'].startswith('unknown transfer protocol blrg')
+
+    assert set(['40', '41']).issubset(mgmt.get_model_ids()) and '42' not in mgmt.get_model_ids()
+    assert sorted(model.model_id for model in DeployedModel.query.filter(
+        DeployedModel.model_id.in_(['40', '41', '42']))) == ['40', '41']
+
+    res = client.post(url_for('predict', model_id=40), data={'example': payloads[0]['example']}, headers=accept_json)
+    assert res.status_code == 200
+    assert precision_compare(payloads[0]['output'], json.loads(res.data)['prediction'])
+
+    res = client.get(url_for('models', model_id=41), headers=accept_json)
+    assert json.loads(res.data)['status'] == ModelStatus.paused
+
+    for model_id in ['40', '41']:
+        res = client.delete(url_for('models', model_id=model_id), headers=accept_json)
+        assert res.status_code == 204
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=unused-argument
+"""
+Test low overhead predict api
+"""
+
+import json
+import pytest
+from flask import url_for
+from predict.exceptions import ApiException
+from predict.resources.v1.fast_predict import parse_body
+from tests.predict.conftest import get_sklearn_payload
+
+
+parse_data = [('', 'could not decode json body'),
+              ('[1]', 'expected a json object'),
+              ('{}', 'missing required argument example'),
+              ('{"example": []}', 'missing required argument example'),
+              ('{"example": ["a"], "x": 1}', 'Unknown arguments: x'),
+              ('{"example": [null]}', 'invalid value for argument example'),
+              ('{"example": [true]}', 'invalid value for argument example'),
+              ('{"example": ["\\u00e9"]}', 'invalid value for argument example')]
+
+
+@pytest.mark.parametrize('data, error', parse_data)
+def test_parse_errors(data, error):
+    """
+    test invalid bodies are rejected as bad requests
+    """
+
+    with pytest.raises(ApiException) as e:
+        parse_body(data)
+    assert e.value.status_code == 400
+    assert e.value.message == error
+
+
+def test_parse():
+    """
+    test examples are always returned as a list of strings
+    """
+
+    assert parse_body('{"example": "| a"}') == {'example': ['| a']}
+    assert parse_body('{"example": ["1,2", 3]}') == {'example': ['1,2', '3']}
+
+
+def test_fast_prediction(accept_json, client, sklearn_data):
+    """
+    test fast predictions and errors match the predict api
+    """
+
+    res = client.post(url_for('fast_predict.fast_predict', model_id=1), data=json.dumps({'example': 'a'}))
+    assert res.status_code == 404
+    assert json.loads(res.data) == '[404 Model Not Found] model 1 could not be found'
+
+    res = client.post(url_for('models', model_id=1), data=get_sklearn_payload(1), headers=accept_json)
+    assert res.status_code == 201
+
+    for data in [{'example': sklearn_data['examples']}, {'example': sklearn_data['examples'][1]}, {'example': ['a']},
+                 {'example': ['a'], 'x': 1}]:
+        fast = client.post(url_for('fast_predict.fast_predict', model_id=1), data=json.dumps(data))
+        res = client.post(url_for('predict', model_id=1), data=json.dumps(data), headers=accept_json,
+                          content_type='application/json')
+        assert fast.status_code == res.status_code
+        assert fast.mimetype == 'application/json'
+        if res.status_code == 200:
+            assert json.loads(fast.data) == json.loads(res.data)
+        else:
+            assert fast.data == res.data
+
+    # delete model
+    res = client.delete(url_for('models', model_id=1), headers=accept_json)
+    assert res.status_code == 204
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=unused-argument
+"""
+Test asynchronous model api calls
+"""
+
+import gevent
+import json
+from flask import url_for
+from predict.enums import JobStatus
+from tests.predict.conftest import get_sklearn_payload
+from time import time
+from tools.general import precision_compare
+
+
+def wait_for_job(client, accept_json, job_id, timeout=60):
+    """
+    poll the jobs endpoint until a job is finished, the job runs while the test sleeps
+
+    Returns:
+        dict: finished job
+    """
+
+    deadline = time() + timeout
+    while time() < deadline:
+        job = json.loads(client.get(url_for('jobs', job_id=job_id), headers=accept_json).data)
+        if job['status'] in (JobStatus.done, JobStatus.failed):
+            return job
+        gevent.sleep(0.05)
+
+    raise AssertionError('job {} not finished after {}s'.format(job_id, timeout))
+
+
+def test_jobs_endpoint(accept_json, client):
+    """
+    hit jobs endpoint and check for response codes
+    """
+
+    res = client.get(url_for('jobs', job_id='0'), headers=accept_json)
+    assert res.status_code == 404
+    assert res.mimetype == 'application/json'
+
+    res = client.post(url_for('jobs', job_id='0'), headers=accept_json)
+    assert res.status_code == 405
+
+
+def test_async_models(accept_json, client):
+    """
+    test models created and patched by background jobs
+    """
+
+    payload = get_sklearn_payload(1)
+
+    # load model 30 in the background
+    res = client.put(url_for('models', model_id=30, async='true'), data=payload, headers=accept_json)
+    assert res.status_code == 202
+    job = json.loads(res.data)
+    assert job['model_id'] == '30' and job['action'] == 'update' and job['status'] == 'pending'
+    assert res.headers['Location'].endswith(url_for('jobs', job_id=job['job_id']))
+
+    job = wait_for_job(client, accept_json, job['job_id'])
+    assert job['status'] == 'done' and job['error'] is None
+    assert job['model']['remote_path'] == payload['remote_path']
+    assert sorted(job['timings']) == ['download', 'load', 'store', 'swap', 'total', 'wait']
+
+    res = client.post(url_for('predict', model_id=30), data={'example': payload['example']}, headers=accept_json)
+    assert res.status_code == 200
+    assert precision_compare(payload['output'], json.loads(res.data)['prediction'])
+
+    # a failed job leaves the model as it was
+    res = client.patch(url_for('models', model_id=30, async='true'), data={'remote_path': 'blrg:///foo.bar'},
+                       headers=accept_json)
+    assert res.status_code == 202
+    job = wait_for_job(client, accept_json, json.loads(res.data)['job_id'])
+    assert job['action'] == 'patch' and job['status'] == 'failed' and job['model'] is None
+    assert job['error'].startswith('unknown transfer protocol blrg')
+
+    res = client.get(url_for('models', model_id=30), headers=accept_json)
+    assert json.loads(res.data)['remote_path'] == payload['remote_path']
+
+    # creating an existing model fails right away
+    res = client.post(url_for('models', model_id=30, async='true'), data=payload, headers=accept_json)
+    assert res.status_code == 500
+
+    res = client.delete(url_for('models', model_id=30), headers=accept_json)
+    assert res.status_code == 204
+
+
+def test_async_create(accept_json, client):
+    """
+    test a model id is reserved by its create job until the job finishes
+    """
+
+    payload = get_sklearn_payload(1)
+
+    res = client.post(url_for('models', model_id=31, async='true'), data=payload, headers=accept_json)
+    assert res.status_code == 202
+    job_id = json.loads(res.data)['job_id']
+
+    # the job is still pending, creating the model again fails whether async or not
+    res = client.post(url_for('models', model_id=31, async='true'), data=payload, headers=accept_json)
+    assert res.status_code == 500
+    assert 'model 31 already exists' in res.data
+    res = client.post(url_for('models', model_id=31), data=payload, headers=accept_json)
+    assert res.status_code == 500
+
+    assert wait_for_job(client, accept_json, job_id)['status'] == JobStatus.done
+    res = client.post(url_for('models', model_id=31, async='true'), data=payload, headers=accept_json)
+    assert res.status_code == 500
+
+    # once deleted the model can be created again
+    res = client.delete(url_for('models', model_id=31), headers=accept_json)
+    assert res.status_code == 204
+    res = client.post(url_for('models', model_id=31), data=payload, headers=accept_json)
+    assert res.status_code == 201
+
+    res = client.delete(url_for('models', model_id=31), headers=accept_json)
+    assert res.status_code == 204
@@ -5,9 +5,13 @@ Test api calls
 """
 
 import json
+import numpy as np
 from flask import url_for
-from tests.predict.conftest import get_vw_payload, get_vw_params
+from predict import mgmt
+from tests.predict.conftest import get_vw_payload, get_vw_params, get_sklearn_payload, get_vw_namespaces
 from tools.general import precision_compare
+from tools.binary_format import NPY_MIMETYPE, NPZ_MIMETYPE, loads_npy, dumps_npy, dumps_sparse
+from scipy.sparse import csr_matrix
 
 
 def test_predict_endpoint(accept_json, client):
@@ -61,3 +65,282 @@ def test_batch_prediction(accept_json, client, vw_data):
     # delete model
     res = client.delete(url_for('models', model_id=1), headers=accept_json)
     assert res.status_code == 204
+
+
+def test_structured_prediction(accept_json, client, vw_data):
+    """
+    test prediction with structured vw examples
+    """
+
+    res = client.post(url_for('models', model_id=1), data=get_vw_payload(1), headers=accept_json)
+    assert res.status_code == 201
+
+    data = json.dumps({'example': [get_vw_namespaces(x) for x in vw_data['examples']]})
+    res = client.post(url_for('predict', model_id=1), data=data, headers=accept_json, content_type='application/json')
+    assert res.status_code == 200
+    for pair in zip(vw_data['predictions'], json.loads(res.data)['prediction']):
+        assert precision_compare(*pair)
+
+    # delete model
+    res = client.delete(url_for('models', model_id=1), headers=accept_json)
+    assert res.status_code == 204
+
+
+def test_binary_prediction(accept_json, client, sklearn_data):
+    """
+    test batch prediction with npy request and response bodies
+    """
+
+    # load sklearn model 1
+    res = client.post(url_for('models', model_id=1), data=get_sklearn_payload(1), headers=accept_json)
+    assert res.status_code == 201
+
+    features = np.array([np.fromstring(x, sep=',') for x in sklearn_data['examples']])
+
+    # npy response
+    res = client.post(url_for('predict', model_id=1), data=dumps_npy(features), content_type=NPY_MIMETYPE,
+                      headers=[('Accept', NPY_MIMETYPE)])
+    assert res.status_code == 200
+    assert res.mimetype == NPY_MIMETYPE
+    for pair in zip(sklearn_data['predictions'], loads_npy(res.data)):
+        assert precision_compare(*pair)
+
+    # json response
+    res = client.post(url_for('predict', model_id=1), data=dumps_npy(features), content_type=NPY_MIMETYPE,
+                      headers=accept_json)
+    assert res.status_code == 200
+    for pair in zip(sklearn_data['predictions'], json.loads(res.data)['prediction']):
+        assert precision_compare(*pair)
+
+    # a single example still gets a list
+    res = client.post(url_for('predict', model_id=1), data=dumps_npy(features[:1]), content_type=NPY_MIMETYPE,
+                      headers=accept_json)
+    assert res.status_code == 200
+    prediction = json.loads(res.data)['prediction']
+    assert len(prediction) == 1 and precision_compare(sklearn_data['predictions'][0], prediction[0])
+
+    # no examples
+    for accept in [NPY_MIMETYPE, 'application/json']:
+        res = client.post(url_for('predict', model_id=1), data=dumps_npy(features[:0]), content_type=NPY_MIMETYPE,
+                          headers=[('Accept', accept)])
+        assert res.status_code == 400
+        assert 'npy body has no examples' in res.data
+
+    # wrong number of features
+    res = client.post(url_for('predict', model_id=1), data=dumps_npy(features[:, 1:]), content_type=NPY_MIMETYPE,
+                      headers=accept_json)
+    assert res.status_code == 500
+
+    # invalid body
+    res = client.post(url_for('predict', model_id=1), data='not npy', content_type=NPY_MIMETYPE, headers=accept_json)
+    assert res.status_code == 400
+
+    # delete model
+    res = client.delete(url_for('models', model_id=1), headers=accept_json)
+    assert res.status_code == 204
+
+
+def test_stream_prediction(accept_json, client, sklearn_data):
+    """
+    test streaming newline delimited predictions
+    """
+
+    # missing model
+    res = client.post(url_for('predict_stream', model_id=1), data='', headers=accept_json)
+    assert res.status_code == 404
+
+    # load sklearn model 1
+    res = client.post(url_for('models', model_id=1), data=get_sklearn_payload(1), headers=accept_json)
+    assert res.status_code == 201
+
+    # stream more examples than fit in one chunk
+    app = client.application
+    chunk_size = app.config['STREAM_CHUNK_SIZE']
+    app.config['STREAM_CHUNK_SIZE'] = 2
+
+    body = ''.join('{}\n'.format(json.dumps(x.strip())) for x in sklearn_data['examples'])
+    res = client.post(url_for('predict_stream', model_id=1), data=body, headers=accept_json)
+    assert res.status_code == 200
+    lines = res.data.splitlines()
+    assert len(lines) == len(sklearn_data['predictions'])
+    for pair in zip(sklearn_data['predictions'], lines):
+        assert precision_compare(pair[0], json.loads(pair[1]))
+
+    # errors part way through are reported on the last line
+    res = client.post(url_for('predict_stream', model_id=1), data=body + '"1,1"\n', headers=accept_json)
+    assert res.status_code == 200
+    assert 'error' in json.loads(res.data.splitlines()[-1])
+
+    app.config['STREAM_CHUNK_SIZE'] = chunk_size
+
+    # delete model
+    res = client.delete(url_for('models', model_id=1), headers=accept_json)
+    assert res.status_code == 204
+
+
+def test_batched_prediction(accept_json, client, sklearn_data):
+    """
+    test predictions for a model with micro-batching enabled
+    """
+
+    payload = get_sklearn_payload(1)
+    payload['extras'] = '--agent_batch_window=0.01 --agent_batch_size=8'
+    res = client.post(url_for('models', model_id=1), data=payload, headers=accept_json)
+    assert res.status_code == 201
+
+    data = {'example': sklearn_data['examples']}
+    res = client.post(url_for('predict', model_id=1), data=data, headers=accept_json)
+    assert res.status_code == 200
+    for pair in zip(sklearn_data['predictions'], json.loads(res.data)['prediction']):
+        assert precision_compare(*pair)
+
+    # delete model
+    res = client.delete(url_for('models', model_id=1), headers=accept_json)
+    assert res.status_code == 204
+
+
+def test_cached_prediction(accept_json, client, sklearn_data):
+    """
+    test repeated examples are served from the cache until the model is replaced
+    """
+
+    payload = get_sklearn_payload(1)
+    payload['extras'] = '--agent_cache_size=100'
+    res = client.post(url_for('models', model_id=1), data=payload, headers=accept_json)
+    assert res.status_code == 201
+
+    data = {'example': sklearn_data['examples']}
+    for _ in range(2):
+        res = client.post(url_for('predict', model_id=1), data=data, headers=accept_json)
+        assert res.status_code == 200
+        for pair in zip(sklearn_data['predictions'], json.loads(res.data)['prediction']):
+            assert precision_compare(*pair)
+
+    n_examples = len(sklearn_data['examples'])
+    stats = mgmt.get_cache_stats(model_id='1')
+    assert (stats['hits'], stats['misses'], stats['entries']) == (n_examples, n_examples, n_examples)
+
+    res = client.get(url_for('model_stats', model_id=1), headers=accept_json)
+    assert res.status_code == 200
+    assert json.loads(res.data) == {'model_id': '1', 'cache': stats}
+
+    # patching the model invalidates its predictions
+    res = client.patch(url_for('models', model_id=1), data={'info': 'patched'}, headers=accept_json)
+    assert res.status_code == 200
+    assert mgmt.get_cache_stats(model_id='1')['entries'] == 0
+
+    res = client.post(url_for('predict', model_id=1), data=data, headers=accept_json)
+    assert res.status_code == 200
+    assert mgmt.get_cache_stats(model_id='1')['misses'] == 2 * n_examples
+
+    # delete model
+    res = client.delete(url_for('models', model_id=1), headers=accept_json)
+    assert res.status_code == 204
+    assert '1' not in mgmt.caches
+
+    res = client.get(url_for('model_stats', model_id=1), headers=accept_json)
+    assert res.status_code == 404
+
+
+def test_sparse_prediction(accept_json, client, sklearn_data):
+    """
+    test batch prediction with sparse text and npz request bodies
+    """
+
+    res = client.post(url_for('models', model_id=1), data=get_sklearn_payload(1), headers=accept_json)
+    assert res.status_code == 201
+
+    features = np.array([np.fromstring(x, sep=',') for x in sklearn_data['examples']])
+    examples = [' '.join('{}:{!r}'.format(i, x) for i, x in enumerate(row) if x != 0) for row in features]
+
+    res = client.post(url_for('predict', model_id=1), data={'example': examples}, headers=accept_json)
+    assert res.status_code == 200
+    for pair in zip(sklearn_data['predictions'], json.loads(res.data)['prediction']):
+        assert precision_compare(*pair)
+
+    res = client.post(url_for('predict', model_id=1), data=dumps_sparse(csr_matrix(features)),
+                      content_type=NPZ_MIMETYPE, headers=[('Accept', NPY_MIMETYPE)])
+    assert res.status_code == 200
+    assert res.mimetype == NPY_MIMETYPE
+    for pair in zip(sklearn_data['predictions'], loads_npy(res.data)):
+        assert precision_compare(*pair)
+
+    res = client.post(url_for('predict', model_id=1), data='not npz', content_type=NPZ_MIMETYPE, headers=accept_json)
+    assert res.status_code == 400
+
+    # delete model
+    res = client.delete(url_for('models', model_id=1), headers=accept_json)
+    assert res.status_code == 204
+
+
+def test_hosted_prediction(accept_json, client, sklearn_data):
+    """
+    test predictions scored in model host processes
+    """
+
+    payload = get_sklearn_payload(1)
+    payload['extras'] = '--agent_hosts=2'
+    res = client.post(url_for('models', model_id=1), data=payload, headers=accept_json)
+    assert res.status_code == 201
+
+    data = {'example': sklearn_data['examples']}
+    res = client.post(url_for('predict', model_id=1), data=data, headers=accept_json)
+    assert res.status_code == 200
+    for pair in zip(sklearn_data['predictions'], json.loads(res.data)['prediction']):
+        assert precision_compare(*pair)
+
+    pool = mgmt.hosts['1']
+    assert len(pool.hosts) == 2
+
+    res = client.post(url_for('predict', model_id=1), data={'example': 'not features'}, headers=accept_json)
+    assert res.status_code == 500
+
+    # patching the model replaces its hosts
+    res = client.patch(url_for('models', model_id=1), data={'info': 'patched'}, headers=accept_json)
+    assert res.status_code == 200
+    assert '1' not in mgmt.hosts
+    assert all(host.closed for host in pool.hosts)
+
+    res = client.post(url_for('predict', model_id=1), data=data, headers=accept_json)
+    assert res.status_code == 200
+    assert mgmt.hosts['1'] is not pool
+
+    # delete model
+    res = client.delete(url_for('models', model_id=1), headers=accept_json)
+    assert res.status_code == 204
+    assert '1' not in mgmt.hosts
+
+
+def test_predict_many(accept_json, client, sklearn_data):
+    """
+    test predictions from several models for the same examples
+    """
+
+    for model_id in [1, 2]:
+        res = client.post(url_for('models', model_id=model_id), data=get_sklearn_payload(1), headers=accept_json)
+        assert res.status_code == 201
+
+    # batch of examples
+    data = {'model_id': ['1', '2'], 'example': sklearn_data['examples']}
+    res = client.post(url_for('predict_many'), data=data, headers=accept_json)
+    assert res.status_code == 200
+    prediction = json.loads(res.data)['prediction']
+    assert sorted(prediction.keys()) == ['1', '2']
+    for model_id in ['1', '2']:
+        for pair in zip(sklearn_data['predictions'], prediction[model_id]):
+            assert precision_compare(*pair)
+
+    # single example
+    data = {'model_id': ['1', '2'], 'example': sklearn_data['examples'][1]}
+    res = client.post(url_for('predict_many'), data=data, headers=accept_json)
+    assert res.status_code == 200
+    assert precision_compare(sklearn_data['predictions'][1], json.loads(res.data)['prediction']['2'])
+
+    # missing model
+    data = {'model_id': ['1', '3'], 'example': sklearn_data['examples']}
+    res = client.post(url_for('predict_many'), data=data, headers=accept_json)
+    assert res.status_code == 404
+
+    for model_id in [1, 2]:
+        res = client.delete(url_for('models', model_id=model_id), headers=accept_json)
+        assert res.status_code == 204
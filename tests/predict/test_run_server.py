@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=redefined-outer-name
+"""
+Test pre-fork serving with several worker processes
+"""
+
+import json
+import os
+import pytest
+import signal
+import time
+import urllib2
+from gevent.wsgi import WSGIServer
+import run_server
+from tests.predict.conftest import get_sklearn_payload
+from tools.general import precision_compare
+
+
+def get_children(pid):
+    """
+    list the child processes of a process
+
+    Args:
+        pid (int): process id
+
+    Returns:
+        list(int): process ids of the children
+    """
+
+    with open('/proc/{0}/task/{0}/children'.format(pid), 'r') as f:
+        return sorted(int(child) for child in f.read().split())
+
+
+def is_running(pid):
+    """
+    check a process is running (exited processes not yet reaped are not)
+
+    Args:
+        pid (int): process id
+
+    Returns:
+        bool: True if the process is running
+    """
+
+    try:
+        with open('/proc/{}/status'.format(pid), 'r') as f:
+            return 'State:\tZ' not in f.read()
+    except IOError:
+        return False
+
+
+def wait_for(condition, timeout=10):
+    """
+    wait for a condition to hold
+
+    Args:
+        condition (function): returns a true value once the condition holds
+        timeout (float): seconds to wait
+
+    Returns:
+        object: value of the condition
+    """
+
+    end = time.time() + timeout
+    while time.time() < end:
+        value = condition()
+        if value:
+            return value
+        time.sleep(0.05)
+
+    raise AssertionError('condition not met after {}s'.format(timeout))
+
+
+def request(url, method='GET', data=None):
+    """
+    send a json request
+
+    Args:
+        url (str): url
+        method (str): http method
+        data (dict): json body
+
+    Returns:
+        (int, object): status code and json response
+    """
+
+    req = urllib2.Request(url, data=None if data is None else json.dumps(data),
+                          headers={'Content-Type': 'application/json', 'Accept': 'application/json'})
+    req.get_method = lambda: method
+    try:
+        res = urllib2.urlopen(req, timeout=10)
+    except urllib2.HTTPError as e:
+        return e.code, None
+
+    return res.getcode(), json.loads(res.read() or 'null')
+
+
+def only(worker, workers, url, method='GET', data=None):
+    """
+    send a request that only the given worker can accept, the other workers are paused meanwhile
+
+    Args:
+        worker (int): process id of the worker to serve the request
+        workers (list(int)): process ids of all workers
+        url (str): url
+        method (str): http method
+        data (dict): json body
+
+    Returns:
+        (int, object): status code and json response
+    """
+
+    others = [pid for pid in workers if pid != worker]
+    for pid in others:
+        os.kill(pid, signal.SIGSTOP)
+    try:
+        return request(url, method=method, data=data)
+    finally:
+        for pid in others:
+            os.kill(pid, signal.SIGCONT)
+
+
+@pytest.yield_fixture
+def master(app):
+    """
+    test fixture running a pre-fork master with two workers in a child process
+
+    Returns:
+        (int, str): process id of the master and base url of the server
+    """
+
+    server = WSGIServer(listener=('127.0.0.1', 0), application=app, log=None)
+    server.init_socket()
+
+    pid = os.fork()
+    if pid == 0:
+        try:
+            run_server.prefork(app=app, server=server, n_workers=2)
+        finally:
+            os._exit(0)  # pylint: disable=protected-access
+    server.socket.close()
+
+    url = 'http://127.0.0.1:{}/v1'.format(server.address[1])
+    workers = wait_for(lambda: len(get_children(pid)) == 2 and get_children(pid))
+    for worker in workers:
+        # wait until each worker is serving
+        wait_for(lambda: only(worker, workers, '{}/models'.format(url))[0] == 200)
+
+    yield pid, url
+
+    try:
+        os.kill(pid, signal.SIGTERM)
+    except OSError:
+        pass
+    os.waitpid(pid, 0)
+
+
+def test_prefork(master):
+    """
+    test a model created in one worker is served by the others, including workers restarted after dying
+    """
+
+    pid, url = master
+    workers = get_children(pid)
+    payload = get_sklearn_payload(1)
+    predict_url = '{}/predict/50'.format(url)
+
+    # create the model in the first worker only
+    status, _ = only(workers[0], workers, '{}/models/50'.format(url), method='PUT', data=payload)
+    assert status == 200
+
+    # the master passes the change on to the second worker
+    def predict(worker):
+        """
+        predict with model 50 in one worker
+        """
+
+        status, data = only(worker, workers, predict_url, method='POST', data={'example': payload['example']})
+        return status == 200 and data['prediction']
+
+    assert precision_compare(payload['output'], wait_for(lambda: predict(workers[1])))
+
+    # a worker that dies is replaced by a worker serving the current models
+    os.kill(workers[0], signal.SIGKILL)
+    workers = wait_for(lambda: len(get_children(pid)) == 2 and workers[0] not in get_children(pid) and
+                       get_children(pid))
+    for worker in workers:
+        assert precision_compare(payload['output'], wait_for(lambda: predict(worker)))
+
+    status, _ = request('{}/models/50'.format(url), method='DELETE')
+    assert status == 204
+    for worker in workers:
+        wait_for(lambda: only(worker, workers, '{}/models/50'.format(url))[0] == 404)
+
+
+def test_master_death(master):
+    """
+    test workers stop once their master has died
+    """
+
+    pid, _ = master
+    workers = get_children(pid)
+
+    os.kill(pid, signal.SIGKILL)
+
+    for worker in workers:
+        wait_for(lambda: not is_running(worker), timeout=5 * run_server.MASTER_CHECK_INTERVAL)
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+
+"""
+Test binary request and response bodies
+"""
+
+import pytest
+import numpy as np
+from io import BytesIO
+from scipy.sparse import csr_matrix
+from tools.binary_format import loads_npy, dumps_npy, loads_sparse, dumps_sparse
+
+
+def test_npy_round_trip():
+    """
+    test arrays survive writing and reading npy documents
+    """
+
+    for array in [np.arange(12, dtype='<f8').reshape(3, 4),
+                  np.arange(12, dtype='<f4').reshape(3, 4),
+                  np.asfortranarray(np.arange(12, dtype='<f8').reshape(3, 4))]:
+        result = loads_npy(dumps_npy(array))
+        assert result.dtype == array.dtype
+        assert np.array_equal(result, array)
+
+
+def test_npy_no_copy():
+    """
+    test the array is a read-only view onto the document
+    """
+
+    result = loads_npy(dumps_npy(np.ones((2, 3))))
+    assert not result.flags['OWNDATA']
+    assert not result.flags['WRITEABLE']
+
+
+def test_sparse_round_trip():
+    """
+    test sparse matrices survive writing and reading npz documents
+    """
+
+    matrix = csr_matrix(np.array([[0, 1.5, 0], [0, 0, 0], [2, 0, 3]]))
+    result = loads_sparse(dumps_sparse(matrix))
+    assert result.shape == matrix.shape
+    assert np.array_equal(result.toarray(), matrix.toarray())
+
+
+def test_sparse_invalid():
+    """
+    test object arrays and inconsistent CSR arrays are refused
+    """
+
+    fp = BytesIO()
+    np.savez(fp, data=np.array([object()]), indices=np.array([0]), indptr=np.array([0, 1]), shape=np.array([1, 1]))
+    with pytest.raises(Exception):
+        loads_sparse(fp.getvalue())
+
+    fp = BytesIO()
+    np.savez(fp, data=np.array([1.0]), indices=np.array([5]), indptr=np.array([0, 1]), shape=np.array([1, 1]))
+    with pytest.raises(Exception):
+        loads_sparse(fp.getvalue())
@@ -4,7 +4,7 @@
 Test general utils
 """
 
-from tools.general import precision_compare
+from tools.general import precision_compare, chunks
 
 
 def test_precision_compare():
@@ -19,3 +19,13 @@ def test_precision_compare():
     assert not precision_compare(1.12345, 1.123)
 
     assert not precision_compare(1.123, 2.123)
+
+
+def test_chunks():
+    """
+    test splitting iterables into fixed size lists
+    """
+
+    assert list(chunks(xrange(5), 2)) == [[0, 1], [2, 3], [4]]
+
+    assert list(chunks(iter([]), 2)) == []
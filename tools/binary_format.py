@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=no-member
+
+"""
+Binary request and response bodies\n
+Feature matrices and predictions are exchanged as numpy .npy documents (a small header describing dtype and shape
+followed by the raw array bytes), see http://docs.scipy.org/doc/numpy/neps/npy-format.html\n
+Sparse feature matrices are exchanged as .npz archives of the CSR arrays (data, indices, indptr and shape), the layout
+written by scipy.sparse.save_npz
+"""
+
+from ast import literal_eval
+from io import BytesIO
+from scipy.sparse import csr_matrix
+from zipfile import ZipFile
+import struct
+import numpy as np
+
+
+NPY_MIMETYPE = 'application/x-npy'
+NPZ_MIMETYPE = 'application/x-npz'
+
+
+def loads_npy(data):
+    """
+    wrap the array stored in a .npy document without copying its data
+
+    Args:
+        data (str): bytes of a .npy document
+
+    Returns:
+        ndarray: read-only array backed by data
+    """
+
+    major, _ = np.lib.format.read_magic(BytesIO(data[:8]))
+    if major == 1:
+        start = 10
+        offset = start + struct.unpack('<H', data[8:10])[0]
+    elif major == 2:
+        start = 12
+        offset = start + struct.unpack('<I', data[8:12])[0]
+    else:
+        raise Exception('unsupported npy format version {}'.format(major))
+
+    # only the header is copied for parsing, the array itself is a view onto the request body
+    header = literal_eval(data[start:offset].decode('latin1'))
+    dtype = np.dtype(header['descr'])
+    shape = tuple(header['shape'])
+    fortran_order = header['fortran_order']
+
+    if dtype.hasobject:
+        raise Exception('npy arrays of objects are not supported')
+
+    count = int(np.prod(shape))
+    array = np.frombuffer(data, dtype=dtype, count=count, offset=offset)
+
+    return array.reshape(shape, order='F' if fortran_order else 'C')
+
+
+def dumps_npy(array):
+    """
+    write an array as a .npy document
+
+    Args:
+        array (arraylike): array to write
+
+    Returns:
+        str: bytes of the .npy document
+    """
+
+    fp = BytesIO()
+    np.save(fp, np.asarray(array))
+
+    return fp.getvalue()
+
+
+def loads_sparse(data):
+    """
+    read a CSR matrix stored in a .npz document.
+    each array is read with loads_npy rather than numpy.load, so arrays of (pickled) objects are refused
+
+    Args:
+        data (str): bytes of a .npz document
+
+    Returns:
+        csr_matrix: sparse matrix
+    """
+
+    archive = ZipFile(BytesIO(data))
+    arrays = dict((name, loads_npy(archive.read('{}.npy'.format(name))))
+                  for name in ['data', 'indices', 'indptr', 'shape'])
+
+    matrix = csr_matrix((arrays['data'], arrays['indices'], arrays['indptr']), shape=tuple(arrays['shape']))
+    matrix.check_format(full_check=True)
+
+    return matrix
+
+
+def dumps_sparse(matrix):
+    """
+    write a sparse matrix as a .npz document of its CSR arrays
+
+    Args:
+        matrix (spmatrix): matrix to write
+
+    Returns:
+        str: bytes of the .npz document
+    """
+
+    matrix = csr_matrix(matrix)
+
+    fp = BytesIO()
+    np.savez(fp, data=matrix.data, indices=matrix.indices, indptr=matrix.indptr, shape=np.array(matrix.shape),
+             format='csr')
+
+    return fp.getvalue()
@@ -6,29 +6,37 @@ Capture miscellaneous utilities
 """
 
 from subprocess import Popen, PIPE
-import inspect
+from itertools import islice
+import hashlib
+import sys
 from numpy import isclose
 
 
+# bytes read at a time when hashing files
+HASH_CHUNK_BYTES = 1024 * 1024
+
+
 def run_process(command, logger=None):
     """
-    run_process executes a shell command and returns any output
+    run_process executes a command and returns any output, a string is run by the shell while a list of arguments
+    is executed directly
 
     WARNING:
-        there is no protection against executing malicious code here so be careful
+        there is no protection against executing malicious code in shell commands so be careful
 
     Args:
-        command (str or arraylike(str)): shell command to execute
+        command (str or arraylike(str)): shell command or arguments of the command to execute
         logger (object): logger object
 
     Returns:
         (object): stdout from shell command is returned
     """
 
-    caller = inspect.stack()[1][3]
+    # only the calling function's name is needed, inspect.stack reads the source of every frame
+    caller = sys._getframe(1).f_code.co_name  # pylint: disable=protected-access
     if logger is not None:
         logger.debug("(%s) command: %s", caller, command)
-    p = Popen(args=command, shell=True, stdout=PIPE, stderr=PIPE)
+    p = Popen(args=command, shell=isinstance(command, basestring), stdout=PIPE, stderr=PIPE)
     out, err = p.communicate()
     if logger is not None:
         if err:
@@ -59,3 +67,41 @@ def precision_compare(x, y):
     digits = str(x).split('.')
     tol = 10 ** -len(digits[1]) if len(digits) > 1 else 1
     return isclose(x, y, atol=tol)
+
+
+def chunks(iterable, size):
+    """
+    split an iterable into lists of a fixed size (the last list may be shorter), consuming it lazily
+
+    Args:
+        iterable (iterable): items to split
+        size (int): number of items per list
+
+    Returns:
+        generator(list): lists of items
+    """
+
+    iterator = iter(iterable)
+    chunk = list(islice(iterator, size))
+    while chunk:
+        yield chunk
+        chunk = list(islice(iterator, size))
+
+
+def file_sha1(path):
+    """
+    hash the contents of a file
+
+    Args:
+        path (str): file
+
+    Returns:
+        str: hex sha1 digest
+    """
+
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_BYTES), ''):
+            digest.update(chunk)
+
+    return digest.hexdigest()